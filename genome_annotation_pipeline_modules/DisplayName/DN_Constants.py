@@ -1,18 +1,25 @@
-# by Guna 10/2015
-"""Constants from DisplayName"""
-
-DN_ANALYSIS_NAME = 'displayName'
-
-# Production instances
-GAIA_ASSEMBLY_API = 'http://lxjh210.phibred.com:7020/assemblies/'
-SPECIESCODE_TAXON_API = 'http://bioprod.phibred.com:8082/SpeciesCode/wsgi/getcode/internalid/'
-SPECIESCODE_SCINAME_API = 'http://bioprod.phibred.com:8082/SpeciesCode/wsgi/getcode/sciname/'
-
-# Gene numbering starts from 100, 110, 120, ...
-GENE_COUNTER_START = 100
-GENE_COUNTER_STEP = 10
-
-DP_PREFIX = 'dp'
-SOURCE_COLUMN = 'GSAP'
-GFF_HEADER ='##gff-version 3'
-
+# by Guna 10/2015
+"""Constants from DisplayName"""
+
+DN_ANALYSIS_NAME = 'displayName'
+
+# Production instances
+GAIA_ASSEMBLY_API = 'http://lxjh210.phibred.com:7020/assemblies/'
+SPECIESCODE_TAXON_API = 'http://bioprod.phibred.com:8082/SpeciesCode/wsgi/getcode/internalid/'
+SPECIESCODE_SCINAME_API = 'http://bioprod.phibred.com:8082/SpeciesCode/wsgi/getcode/sciname/'
+
+# species code lookups: on-disk cache (see speciescache), entries looked up again after 30 days
+SPECIESCODE_CACHE_FILE = '~/.displayName_speciescode.json'
+SPECIESCODE_CACHE_TTL = 30 * 24 * 3600
+# seconds per service request, and retries after a timeout or connection error
+SERVICE_TIMEOUT = 30
+SERVICE_RETRIES = 3
+
+# Gene numbering starts from 100, 110, 120, ...
+GENE_COUNTER_START = 100
+GENE_COUNTER_STEP = 10
+
+DP_PREFIX = 'dp'
+SOURCE_COLUMN = 'GSAP'
+GFF_HEADER ='##gff-version 3'
+
@@ -1,538 +1,1471 @@
-# -- coding: utf-8 --
-
-# by Guna on 10/2015
-
-# import some modules
-import os
-import sys
-import argparse
-import textwrap
-import re
-import json
-import urllib2
-import gzip
-from operator import itemgetter
-from collections import OrderedDict
-# other Pioneer developed modules and constants
-import phi.Logger
-from .gff3parser import parse_GFF3
-from .DN_Constants import DN_ANALYSIS_NAME, \
-    GAIA_ASSEMBLY_API, SPECIESCODE_TAXON_API, \
-    SPECIESCODE_SCINAME_API, GENE_COUNTER_START, \
-    GENE_COUNTER_STEP, DP_PREFIX, SOURCE_COLUMN, \
-    GFF_HEADER
-
-
-# this read the json data into a dict and convert unicode to ascii
-# convert array data
-# copied from internet.
-def byteify(input):
-    if isinstance(input, dict):
-        return {byteify(key):byteify(value) for key,value in input.iteritems()}
-    elif isinstance(input, list):
-        return [byteify(element) for element in input]
-    elif isinstance(input, unicode):
-        return input.encode('utf-8')
-    else:
-        return input
-
-
-class DisplayName(object):
-    """class for creating display names for genes and mRNA/tRNA features in gff3"""
-
-    def __init__(
-            self,
-            inputFile='',
-            outputFile='',
-            gsapRunId='',
-            seqIdRegex='',
-            assemblyId=None,
-            taxonId=None,
-            scientificName=None,
-            logger=None
-        ):
-        
-        self.inputFile = inputFile # input gff3 file
-        self.outputFile = outputFile # output gff3 file with display names created
-        self.gsapRunId = gsapRunId
-        self.seqIdRegex = seqIdRegex # regex in the format 'ZmChr(?P<num>\d+)v2' for ZmChr01v2
-        # parse seqid func matching the regex => group('num') gives the chr/contig number
-        self.parse_seqid = re.compile(r'{}'.format(seqIdRegex)).match
-        # One of the 3: assemblyId, taxonId, sciname is required to get species code
-        # look up Genome Repo based on assemblyId, to get taxonId
-        self.assemblyId = assemblyId
-        # Else, either internal taxon ID or scientific name is required to get species code
-        self.taxonId = taxonId
-        self.scientificName = scientificName
-        self.logger = logger
-        
-        
-        self.speciesCode = ''
-        # data structures to create
-        # array of all GFF3 records
-        self.records = []
-        # dict of all seqid-->chr# in gff3
-        self.seqidDict = {}
-        # temp bin to hold non-matching sequence IDs
-        self.nomatch_seqid_bin = []
-        # array of all gene features: {seqid, start, id, name, children=[{id, name}], records=[]}
-        # children only upto transcript-level mRNA or tRNA
-        self.geneFeatureArr = []
-        # final id-->displayname map
-        self.id2nameMap = OrderedDict()
-        
-        self.outputDir = os.path.dirname(self.outputFile)
-        self.id2nameOutputFile = self.outputFile + '_id2nameMap'
-        self.seqidOutputFile = self.outputFile + '_seqidMap'
-        
-    
-    def check(self):
-        """check inputs"""
-        # check on input file - required
-        if not self.inputFile or not os.path.exists(self.inputFile):
-            self.logger.error("Input GFF3 file not set or does not exist: %s" % self.inputFile)
-            raise Exception("Input GFF3 file not set or does not exist: %s" % self.inputFile)
-        self.inputFile = os.path.abspath(self.inputFile)
-        
-        # check on outputDir
-        if not os.path.exists(self.outputDir):
-            self.logger.error("Output dir does not exist: %s" % self.outputDir)
-            raise Exception("Output dir does not exist: %s" % self.outputDir)
-
-        if not os.access(self.outputDir, os.W_OK) or not os.access(self.outputDir, os.X_OK):
-            self.logger.error("Output dir %s is either not writable or executable. \
-I need both to be able to write to it" % self.outputDir)
-            raise Exception("Output dir %s is either not writable or executable. \
-I need both to be able to write to it" % self.outputDir)
-        
-        # check on ids required for species code
-        if not self.assemblyId and not self.taxonId and not self.scientificName:
-            self.logger.error("Need either: assembly_id, taxon_id or scientific_name to get species_code for display name")
-            raise Exception("Need either: assembly_id, taxon_id or scientific_name to get species_code for display name")
-        
-        # get species code
-        if self.assemblyId is not None:
-            self.speciesCode = self.speciescode_by_assemblyid(self.assemblyId)
-            self.logger.info("Retrieved species code: {0} using assembly id: {1}".format(self.speciesCode, self.assemblyId))
-        elif self.taxonId is not None:
-            self.speciesCode = self.speciescode_by_taxonid(self.taxonId)
-            self.logger.info("Retrieved species code: {0} using taxon id: {1}".format(self.speciesCode, self.taxonId))
-        elif self.scientificName is not None:
-            self.speciesCode = self.speciescode_by_sciname(self.scientificName)
-            self.logger.info("Retrieved species code: {0} using scientific name: {1}".format(self.speciesCode, self.scientificName))
-
-
-    def parseGff3FixDupIDs(self):
-        """parse input GFF3 file and uniquify any duplicate IDs for gene, mRNA/tRNA features
-           Important Assumption: gene structure is in order and grouped, parents coming first"""
-           
-        self.check()
-        self.logger.info("Parsing input gff3 file and checking for duplicate IDs in gene, mRNA features: %s..." % self.inputFile)
-        records = parse_GFF3(self.inputFile)
-        # serializing entire GFF3 file as I/O is more expensive than RAM memory
-        self.records = list(records)
-        uniqueIdSet = {}  # gene, mRNA ID set - dictionary {ID: True} 
-        renameIdMap = {}  # dictionary of IDs that have been renamed - {Old ID: new ID}
-        dupCount = 0
-        for record in self.records:
-            # checking duplicate IDs
-            if record.type in ['gene', 'mRNA', 'tRNA']:
-                # only these features are main parents
-                if 'ID' in record.attributes:
-                    if record.attributes['ID'] in uniqueIdSet:
-                        # found duplicate ID
-                        dupCount += 1
-                        newId = record.attributes['ID'] + '.' + str(dupCount) + 'd'
-                        renameIdMap[record.attributes['ID']] = newId
-                        self.logger.warn("Duplicate ID: {0} found. Assigning new ID: {1}".format(record.attributes['ID'], newId))
-                        record.attributes['ID'] = newId
-                        uniqueIdSet[record.attributes['ID']] = True
-                    else:
-                        # ID is unique - add to uniqueIdSet
-                        uniqueIdSet[record.attributes['ID']] = True
-                else:
-                    self.logger.error("ID attribute missing in gff3 record: {}".format(record))
-                    raise Exception("ID attribute missing in gff3 record: {}".format(record))
-            else:
-                # other child features follow and will be made unique
-                # assumed format: parentId.exon1, parentId.cds1, parentId.utr5p1, parentId.utr3p1 etc
-                if 'ID' in record.attributes:
-                    parts = record.attributes['ID'].split('.')
-                    parentId = '.'.join(parts[:-1])
-                    if parentId in renameIdMap:
-                        # parentId was renamed - update child ID accordingly
-                        record.attributes['ID'] = '.'.join([renameIdMap[parentId], parts[-1]])
-                else:
-                    self.logger.error("ID attribute missing in gff3 record: {}".format(record))
-                    raise Exception("ID attribute missing in gff3 record: {}".format(record))
-                
-            # Updating Parents if present - checks every record    
-            if 'Parent' in record.attributes:
-                # Parent attribute could have multiple CSVs
-                new_parents = []
-                for parent in record.attributes['Parent'].split(','):
-                    if parent in renameIdMap:
-                        new_parents.append(renameIdMap[parent])
-                    else:
-                        new_parents.append(parent)
-                record.attributes['Parent'] = ','.join(new_parents)
-                        
-        self.logger.info("Parsed a total of {0} records. Found and fixed {1} duplicate IDs in gene/mRNA features.".format(len(self.records), dupCount))    
-        
-        
-        
-    def buildGeneSet(self):
-        """create gene feature array"""
-        self.parseGff3FixDupIDs()
-        self.logger.info("Building gene features dict...")
-        for record in self.records:
-            if record.type == 'gene':
-                # create seqidDict - parsing only gene features will be enough
-                # parse and store the seqid<-->num if not already in seqidDict
-                seqid = record.seqid
-                if (seqid not in self.seqidDict) and (seqid not in self.nomatch_seqid_bin):
-                    # new seqid
-                    seqid_match = self.parse_seqid(seqid)
-                    if seqid_match and 'num' in seqid_match.groupdict():
-                        # match - store in seqidDict
-                        self.seqidDict[seqid] = int(seqid_match.group('num'))
-                    else:
-                        # no match - we will get to them later
-                        self.logger.warn("given regex '{0}' does not help extract number from seqid '{1}'. Please match (?P<num>\d+) group with number part if possible. Assigning automatic numbering, check seqidMap file: {2}".format(self.seqIdRegex, seqid, self.seqidOutputFile))
-                        self.nomatch_seqid_bin.append(seqid)
-                    
-                # create geneDict
-                # expecting validated GFF files - every gene feature has unique ID attribute
-                geneDict = {'seqid': record.seqid,
-                            'start': record.start,
-                            'ID': record.attributes['ID'],
-                            'Name': '', # display name
-                            'children': [], # mRNA/tRNA features
-                            'records': [] # all gff3 records comprising a gene
-                            }
-                # adding gene feature record
-                geneDict['records'].append(record)
-                self.geneFeatureArr.append(geneDict)
-            elif record.type in ['mRNA', 'tRNA']:
-                if not 'Parent' in record.attributes:
-                    self.logger.error("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
-                    raise Exception("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
-                parents = record.attributes['Parent'].split(',') # Parent attribute could have multiple CSVs
-                # expecting ordered structure within gene, although genes can be out of order across GFF file
-                if self.geneFeatureArr[-1]['ID'] in parents:
-                    childDict = {'ID': record.attributes['ID'],
-                                 'Name': '' # display name with isoform number
-                                 }
-                    self.geneFeatureArr[-1]['children'].append(childDict)
-                    # adding mRNA/tRNA feature record
-                    self.geneFeatureArr[-1]['records'].append(record)
-                else:
-                    self.logger.error("gene: {0} structure unordered or unresolved parents found in gff3 record: {1}".format(self.geneFeatureArr[-1]['ID'], record))
-                    raise Exception("gene: {0} structure unordered or unresolved parents found in gff3 record: {1}".format(self.geneFeatureArr[-1]['ID'], record))
-            else:
-                # other grand-child features
-                if not 'Parent' in record.attributes:
-                    self.logger.error("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
-                    raise Exception("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
-                parents = record.attributes['Parent'].split(',')
-                if self.geneFeatureArr[-1]['children'][-1]['ID'] in parents:
-                    # adding grand-child feature record
-                    self.geneFeatureArr[-1]['records'].append(record)
-                else:
-                    self.logger.error("gene: {0} structure unordered or unresolved parents found in gff3 record: {1}".format(self.geneFeatureArr[-1]['ID'], record))
-                    raise Exception("gene: {0} structure unordered or unresolved parents found in gff3 record: {1}".format(self.geneFeatureArr[-1]['ID'], record))
-        
-        
-        # Now let's check the nomatch_seqids and assign auto numbering (starting after the max in seqidDict) & add them to seqidDict
-        if self.nomatch_seqid_bin:
-            # Get current max
-            if self.seqidDict:
-                max_seqnum = max(v for k, v in self.seqidDict.items())
-            else:
-                # may be nothing matched
-                max_seqnum = 0
-            # Add nomatch_seqids to seqidDict
-            for num, nomatch_seqid in enumerate(sorted(self.nomatch_seqid_bin), start=max_seqnum+1):
-                self.seqidDict[nomatch_seqid] = num
-            
-        
-        # Update seqid in geneDict with just the number - so sorting happens correctly later
-        # There are reasons this is done after parsing all records - seqidDict might be incomplete - see above step
-        for geneDict in self.geneFeatureArr:
-            geneDict['seqid'] = self.seqidDict[geneDict['seqid']]
-                
-        self.logger.info("Parsed a total of {0} genes.".format(len(self.geneFeatureArr)))
-                
-    
-    def createDisplayName(self):
-        """sort genes and create display names for gene, mRNA/tRNA features"""
-        self.buildGeneSet()
-        self.logger.info("Creating new display names and the ID<->Name map...")
-        # sorting
-        sorted_geneFeatureArr = sorted(self.geneFeatureArr, key=itemgetter('seqid', 'start'))
-        # seqnum in display name
-        max_seqnum = max(v for k, v in self.seqidDict.items())
-        seqid_width = len(str(max_seqnum))
-        # gene numbering starts from 100, 110, 120
-        max_genenum = GENE_COUNTER_START + (len(sorted_geneFeatureArr) - 1)*GENE_COUNTER_STEP
-        genenum_width = len(str(max_genenum))
-        
-        # loop through the sorted gene array
-        for geneCounter, geneDict in enumerate(sorted_geneFeatureArr):
-            seqnum = geneDict['seqid']
-            genenum = GENE_COUNTER_START + GENE_COUNTER_STEP*geneCounter 
-            # create the display name for gene feature
-            # dpzm01g00100.xx
-            geneDict['Name'] = "{0}{1}{2}g{3}.{4}".format(DP_PREFIX,
-                                                          self.speciesCode.lower(),
-                                                          str(seqnum).zfill(seqid_width),
-                                                          str(genenum).zfill(genenum_width),
-                                                          self.gsapRunId)
-            #debug
-            if geneDict['ID'] in self.id2nameMap:
-                self.logger.debug("Duplicate ID: {0} feature found. Old name: {1}, New name: {2}".format(geneDict['ID'],
-                                                                                             self.id2nameMap[geneDict['ID']],
-                                                                                             geneDict['Name']))
-            self.id2nameMap[geneDict['ID']] = geneDict['Name']
-            # create the display name for child mRNA/tRNA features
-            # dpzm01g00100.xx.1 - check for isoforms
-            if len(geneDict['children']) == 1:
-                # Only one isoform
-                geneDict['children'][0]['Name'] = "{0}.{1}".format(geneDict['Name'], 1)
-                #debug
-                if geneDict['children'][0]['ID'] in self.id2nameMap:
-                    self.logger.debug("Duplicate ID: {0} feature found. Old name: {1}, New name: {2}".format(geneDict['children'][0]['ID'],
-                                                                                                 self.id2nameMap[geneDict['children'][0]['ID']],
-                                                                                                 geneDict['children'][0]['Name']))
-                self.id2nameMap[geneDict['children'][0]['ID']] = geneDict['children'][0]['Name']
-            elif len(geneDict['children']) > 1:
-                # More than one isoforms
-                # sort them by ID & assign isoform number in increasing order
-                sorted_children = sorted(geneDict['children'], key=lambda x: (len(x['ID']), x['ID']))
-                for i, childDict in enumerate(sorted_children):
-                    childDict['Name'] = "{0}.{1}".format(geneDict['Name'], i+1)
-                    #debug
-                    if childDict['ID'] in self.id2nameMap:
-                        self.logger.debug("Duplicate ID: {0} feature found. Old name: {1}, New name: {2}".format(childDict['ID'],
-                                                                                                     self.id2nameMap[childDict['ID']],
-                                                                                                     childDict['Name']))
-                    self.id2nameMap[childDict['ID']] = childDict['Name']
-        
-        self.logger.info("Created a total of {0} ID <-> display name mappings.".format(len(self.id2nameMap)))
-        
-    
-    def writeGff3(self):
-        """writes the final output sorted gff3 file with new IDs, display names and another ID<->Name mapping file"""
-        self.createDisplayName()
-        # writing output gff3 file
-        self.logger.info("Writing gff3 records with new IDs & display names to output file: %s..." % self.outputFile)
-        outputfile = open(self.outputFile, 'w')
-        outputfile.write(GFF_HEADER + '\n')
-        record_count = 0
-        # loop through the sorted gene array - will preserve the gene structure
-        for geneDict in sorted(self.geneFeatureArr, key=itemgetter('seqid', 'start')):
-            for record in geneDict['records']:
-                #Update source column
-                record.source = SOURCE_COLUMN
-                #Update display name & ID
-                if record.type in ['gene', 'mRNA', 'tRNA']:
-                    if 'ID' in record.attributes and record.attributes['ID'] in self.id2nameMap:
-                        record.attributes['Name'] = self.id2nameMap[record.attributes['ID']]
-                        record.attributes['ID'] = record.attributes['Name']
-                    # debug
-                    else:
-                        self.logger.debug("found gff3 feature whose ID is missing or has not been mapped to name: {}\n".format(record))
-                else:
-                    #Update ID only - other child features
-                    #format: parentId.exon1, parentId.cds1, parentId.utr5p1, parentId.utr3p1 etc
-                    if 'ID' in record.attributes:
-                        parts = record.attributes['ID'].split('.')
-                        parentId = '.'.join(parts[:-1])
-                        if parentId in self.id2nameMap:
-                            record.attributes['ID'] = '.'.join([self.id2nameMap[parentId], parts[-1]])
-                        # debug
-                        else:
-                            self.logger.debug("found gff3 feature whose parent ID {0} has not been mapped to name: {1}\n".format(parentId, record))
-                #Update Parents    
-                if 'Parent' in record.attributes:
-                    # Parent attribute could have multiple CSVs
-                    new_parents = []
-                    for parent in record.attributes['Parent'].split(','):
-                        if parent in self.id2nameMap:
-                            new_parents.append(self.id2nameMap[parent])
-                        # debug
-                        else:
-                            new_parents.append(parent)
-                            self.logger.debug("found gff3 feature whose parent ID {0} has not been mapped to name: {1}\n".format(parent, record))
-                    record.attributes['Parent'] = ','.join(new_parents)
-                outputfile.write(str(record) + '\n')
-                record_count += 1
-            #outputfile.write('###\n')
-        outputfile.close()
-        self.logger.info("{0} records written to output gff3 file: {1}".format(record_count, self.outputFile))
-        
-        # writing seqid<->num mapping file
-        #self.logger.info("Writing seqid<->num mappings to output file: %s..." % self.seqidOutputFile)
-        outputfile = open(self.seqidOutputFile, 'w')
-        for k, v in sorted(self.seqidDict.items(), key=itemgetter(1)):
-            outputfile.write("{0}\t{1}\n".format(k, v))
-        outputfile.close()
-        self.logger.info("{0} seqid<-> num mappings written to output file: {1}".format(len(self.seqidDict), self.seqidOutputFile))
-        
-        # writing ID<->Name mapping file
-        #self.logger.info("Writing ID<->Name mappings to output file: %s..." % self.id2nameOutputFile)
-        outputfile = open(self.id2nameOutputFile, 'w')
-        for k, v in self.id2nameMap.items():
-            outputfile.write("{0}\t{1}\n".format(k, v))
-        outputfile.close()
-        self.logger.info("{0} ID<->Name mappings written to output file: {1}".format(len(self.id2nameMap), self.id2nameOutputFile))
-        self.logger.info("Analysis all well done.")
-        
-    
-    def speciescode_by_assemblyid(self, assemblyId):
-        """ returns species code given assembly id """
-        url = GAIA_ASSEMBLY_API + str(assemblyId)
-        req = urllib2.Request(url)
-        try:
-            response = urllib2.urlopen(req)
-            resultUnicode = json.loads(response.read().decode())
-            result = byteify(resultUnicode)
-            #print (json.dumps(resultUnicode, indent=2))
-        except urllib2.HTTPError as e:
-            self.logger.error("GAIA Genome Repo unreachable or couldn't fulfill the request: {0}. Error Code: {1}. Reason: {2}".format(url, e.code, e.reason))
-            raise Exception("GAIA Genome Repo unreachable or couldn't fulfill the request: {0}. Error Code: {1}. Reason: {2}".format(url, e.code, e.reason))
-        
-        # get taxon_id and then call species code service
-        if (not result) or ('taxon_id' not in result):
-            self.logger.error("GAIA Genome Repo request: {0} came back empty: {1}".format(url, result))
-            raise Exception("GAIA Genome Repo request: {0} came back empty: {1}".format(url, result))
-        else:
-            # print result['taxon_id']
-            self.taxonId = result['taxon_id']
-            return self.speciescode_by_taxonid(self.taxonId)
-
-    def speciescode_by_taxonid(self, taxonId):
-        """ returns species code given internal taxon id """
-        url = SPECIESCODE_TAXON_API + str(taxonId)
-        req = urllib2.Request(url)
-        try:
-            response = urllib2.urlopen(req)
-            resultUnicode = json.loads(response.read().decode())
-            result = byteify(resultUnicode)
-            #print (json.dumps(resultUnicode, indent=2))
-        except urllib2.HTTPError as e:
-            self.logger.error("Species code service unreachable or couldn't fulfill the request: {0}. Error Code: {1}. Reason: {2}".format(url, e.code, e.reason))
-            raise Exception("Species code service unreachable or couldn't fulfill the request: {0}. Error Code: {1}. Reason: {2}".format(url, e.code, e.reason))
-        
-        # get species code and return
-        if (not result) or ('SpeciesCode' not in result):
-            self.logger.error("Species code request: {0} came back empty: {1}".format(url, result))
-            raise Exception("Species code request: {0} came back empty: {1}".format(url, result))
-        elif not result['SpeciesCode']:
-            self.logger.error(result['Message'])
-            raise Exception(result['Message'])
-        else:
-            # print result['SpeciesCode']
-            return result['SpeciesCode']
-        
-    
-    def speciescode_by_sciname(self, sciname):
-        """ returns species code given scientific name """
-        url = urllib2.quote(SPECIESCODE_SCINAME_API + sciname, safe=":/")
-        #print url
-        req = urllib2.Request(url)
-        try:
-            response = urllib2.urlopen(req)
-            resultUnicode = json.loads(response.read().decode())
-            result = byteify(resultUnicode)
-            #print (json.dumps(resultUnicode, indent=2))
-        except urllib2.HTTPError as e:
-            self.logger.error("Species code service unreachable or couldn't fulfill the request: {0}. Error Code: {1}. Reason: {2}".format(url, e.code, e.reason))
-            raise Exception("Species code service unreachable or couldn't fulfill the request: {0}. Error Code: {1}. Reason: {2}".format(url, e.code, e.reason))
-        
-        # get species code and return
-        if (not result) or ('SpeciesCode' not in result):
-            self.logger.error("Species code request: {0} came back empty: {1}".format(url, result))
-            raise Exception("Species code request: {0} came back empty: {1}".format(url, result))
-        elif not result['SpeciesCode']:
-            self.logger.error(result['Message'])
-            raise Exception(result['Message'])
-        else:
-            # print result['SpeciesCode']
-            return result['SpeciesCode']
-
-
-
-def run():
-    """run the analysis"""
-
-    parser = argparse.ArgumentParser(
-        description="Command line tool to create display names for gene and mRNA/tRNA features in GFF3",
-        epilog=textwrap.dedent('''\
-                                  
-Example:
-python %(prog)s -i input.gff3 -o /temp/output.gff3 -r 20 \
---seqid 'ZmChr(?P<num>\d+)v2' -a 219 -l /temp/log.txt \
-'''),
-        formatter_class=argparse.RawTextHelpFormatter)
-
-    # Mandatory arguments
-    parser.add_argument(
-        '-i', dest='inputFile', required=True, help="REQUIRED: input gff3 file.")
-    parser.add_argument(
-        '-o', dest='outputFile', required=True, help="REQUIRED: output gff3 file. Full path.")
-    parser.add_argument(
-        '-r', dest='gsapRunId', required=True, help="REQUIRED: GSAP run_id.")
-    parser.add_argument(
-        '--seqid', dest='seqIdRegex', required=True,
-        help="REQUIRED: Regex to match the seqid and extract the sequence number. \
-Ex: 'ZmChr(?P<num>\d+)v2' for ZmChr01v2. \
-Match the (?P<num>\d+) group, as is, with where the seq numbers appear in seqid.")
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument(
-        '-a', dest='assemblyId', type=int, help='Assembly ID from GAIA Genome Repo.')
-    group.add_argument(
-        '-t', dest='taxonId', type=int, help='Internal Taxon ID from Taxon Repo.')
-    group.add_argument(
-        '-s', dest='sciName', type=str, help='exact Scientific name. One of {-a, -t, -s} REQUIRED.')
-    parser.add_argument(
-        '-l', dest='logFile', help="log file, full path. Default: stderr.")
-
-   
-    args = parser.parse_args()
-
-    # open log file first
-    logFh = None
-    if not args.logFile:
-        logFh = sys.stderr
-    else:
-        logFh = open(args.logFile, 'a', 0) # no buffering.
-    logger = phi.Logger.Logger(DN_ANALYSIS_NAME, logFh)
-
-    # parsing options
-    inputFile = args.inputFile
-    outputFile = args.outputFile
-
-    if outputFile[0] != '/':
-        logger.error("output file %s in not in full path" % outputFile)
-        sys.stderr.write("output file %s in not in full path\n" % outputFile)
-        exit(1)
-
-    
-    # running command
-    logger.info("The command is as below (quotes might have been removed \
-when restoring the command):\n%s" % ' '.join(sys.argv))
-
-    try:
-        analysisObj = DisplayName(inputFile, outputFile, args.gsapRunId,
-            args.seqIdRegex, args.assemblyId, args.taxonId, args.sciName, logger)
-        analysisObj.writeGff3()
-
-    except:
-        import traceback
-        stackTrace = traceback.format_exc()  # + any additional info.
-        # log the error
-        logger.error(stackTrace)
-
-        raise
-
+# -- coding: utf-8 --
+
+# by Guna on 10/2015
+
+# import some modules
+import os
+import sys
+import argparse
+import textwrap
+import re
+import json
+import urllib2
+import socket
+import gzip
+import heapq
+import tempfile
+import cPickle
+import functools
+from multiprocessing import Pool
+from operator import itemgetter, attrgetter
+from collections import OrderedDict
+# other Pioneer developed modules and constants
+import phi.Logger
+from .gff3parser import parse_GFF3, parse_GFF3_line, GFF3Writer, get_GFF_attribute
+from .gff3table import GFF3Table
+from .gff3cache import cachedTable
+from .gff3parallel import parse_GFF3_parallel
+from .gff3hierarchy import GFF3Hierarchy
+from .gff3index import openForIndex
+from .speciescache import SpeciesCodeCache, fetchJson
+from .namestore import NameStore, GENE_NAME_PATTERN
+from .phasemetrics import PhaseMetrics
+from .DN_Constants import DN_ANALYSIS_NAME, \
+    GAIA_ASSEMBLY_API, SPECIESCODE_TAXON_API, \
+    SPECIESCODE_SCINAME_API, GENE_COUNTER_START, \
+    GENE_COUNTER_STEP, DP_PREFIX, SOURCE_COLUMN, \
+    GFF_HEADER, SPECIESCODE_CACHE_FILE, SPECIESCODE_CACHE_TTL, \
+    SERVICE_TIMEOUT, SERVICE_RETRIES
+
+
+# this read the json data into a dict and convert unicode to ascii
+# convert array data
+# copied from internet.
+def byteify(input):
+    if isinstance(input, dict):
+        return {byteify(key):byteify(value) for key,value in input.iteritems()}
+    elif isinstance(input, list):
+        return [byteify(element) for element in input]
+    elif isinstance(input, unicode):
+        return input.encode('utf-8')
+    else:
+        return input
+
+
+def timedPhase(name):
+    """method decorator: run the method as phase name of self.metrics (see phasemetrics).
+       The metrics file, if any, is written when the outermost phase ends."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.phase(name):
+                result = method(self, *args, **kwargs)
+            if self.metricsFile and not self.metrics.running:
+                self.metrics.writeJson(self.metricsFile)
+                self.logger.info("Phase metrics written to: {0}".format(self.metricsFile))
+            return result
+        return wrapper
+    return decorate
+
+
+class Transcript(object):
+    """an mRNA/tRNA feature directly under a gene"""
+    __slots__ = ('ID', 'Name')
+
+    def __init__(self, ID):
+        self.ID = ID
+        self.Name = '' # display name with isoform number
+
+
+class Gene(object):
+    """a gene feature with its mRNA/tRNA features and records. One per gene - slots keep it small."""
+    __slots__ = ('seqid', 'start', 'ID', 'Name', 'children', 'records', 'offset', 'end', 'fixes', 'status')
+
+    def __init__(self, seqid, start, ID, children=None, records=None, offset=None):
+        self.seqid = seqid # seqid, its number once numberSeqids ran
+        self.start = start
+        self.ID = ID
+        self.Name = '' # display name
+        self.children = [] if children is None else children # Transcripts, in file order
+        self.records = records # all gff3 records comprising a gene, None when streaming
+        self.offset = offset # streaming: file offset of the gene line
+        self.end = None # streaming: file offset of the next gene line, None for the last gene
+        self.fixes = None # streaming: records changed by fixDupID, by position in the block
+        self.status = None # incremental: unchanged, changed or added
+
+
+class DisplayName(object):
+    """class for creating display names for genes and mRNA/tRNA features in gff3"""
+
+    def __init__(
+            self,
+            inputFile='',
+            outputFile='',
+            gsapRunId='',
+            seqIdRegex='',
+            assemblyId=None,
+            taxonId=None,
+            scientificName=None,
+            logger=None,
+            useTable=False,
+            useCache=False,
+            workers=1,
+            speciesCacheFile=SPECIESCODE_CACHE_FILE,
+            speciesCacheTtl=SPECIESCODE_CACHE_TTL,
+            serviceTimeout=SERVICE_TIMEOUT,
+            serviceRetries=SERVICE_RETRIES,
+            offline=False,
+            assemblyApi=GAIA_ASSEMBLY_API,
+            taxonApi=SPECIESCODE_TAXON_API,
+            scinameApi=SPECIESCODE_SCINAME_API,
+            speciesCode=None,
+            nameStore=None,
+            metrics=False,
+            profileDir=None
+        ):
+        
+        self.inputFile = inputFile # input gff3 file
+        self.outputFile = outputFile # output gff3 file with display names created
+        self.gsapRunId = gsapRunId
+        self.seqIdRegex = seqIdRegex # regex in the format 'ZmChr(?P<num>\d+)v2' for ZmChr01v2
+        # parse seqid func matching the regex => group('num') gives the chr/contig number
+        self.parse_seqid = re.compile(r'{}'.format(seqIdRegex)).match
+        # One of the 3: assemblyId, taxonId, sciname is required to get species code
+        # look up Genome Repo based on assemblyId, to get taxonId
+        self.assemblyId = assemblyId
+        # Else, either internal taxon ID or scientific name is required to get species code
+        self.taxonId = taxonId
+        self.scientificName = scientificName
+        self.logger = logger
+        # keep parsed records in a columnar GFF3Table instead of a list of GFF3Records - much less memory
+        self.useTable = useTable
+        # reuse/write a binary parse cache next to the input file (see gff3cache)
+        self.useCache = useCache
+        # parse the input in this many processes (uncompressed or BGZF input, see gff3parallel)
+        self.workers = workers
+        # species code lookups: cached in speciesCacheFile (None: no cache) for speciesCacheTtl seconds
+        self.speciesCache = None if not speciesCacheFile else SpeciesCodeCache(speciesCacheFile, speciesCacheTtl)
+        self.serviceTimeout = serviceTimeout
+        self.serviceRetries = serviceRetries
+        # offline: never call the services, species code must come from the cache
+        self.offline = offline
+        self.assemblyApi = assemblyApi
+        self.taxonApi = taxonApi
+        self.scinameApi = scinameApi
+        
+        
+        # species code already known (e.g. looked up once for a whole batch): no lookup
+        self.speciesCode = speciesCode or ''
+        # SQLite ID<->Name store (see namestore) the mappings are also loaded into, as run gsapRunId
+        self.nameStore = nameStore
+        # per-phase time, memory and rates - logged, and written as JSON next to the ID<->Name map if metrics
+        # profileDir: cProfile each phase into <profileDir>/<phase>.prof
+        self.metrics = PhaseMetrics(logger, profileDir)
+        # data structures to create
+        # array of all GFF3 records
+        self.records = []
+        # dict of all seqid-->chr# in gff3
+        self.seqidDict = {}
+        # temp bin to hold non-matching sequence IDs
+        self.nomatch_seqid_bin = []
+        # array of all gene features (Gene), in file order
+        # children only upto transcript-level mRNA or tRNA
+        self.geneFeatureArr = []
+        # geneFeatureArr in output order - see sortGenes
+        self.sortedGenes = []
+        # final id-->displayname map
+        self.id2nameMap = OrderedDict()
+        # duplicate ID fixing state - see fixDupID
+        self.uniqueIdSet = {}
+        self.renameIdMap = {}
+        self.dupCount = 0
+        # output counts, for batch summaries
+        self.recordsWritten = 0
+        self.namesWritten = 0
+        
+        self.outputDir = os.path.dirname(self.outputFile)
+        self.id2nameOutputFile = self.outputFile + '_id2nameMap'
+        self.seqidOutputFile = self.outputFile + '_seqidMap'
+        self.metricsFile = self.outputFile + '_metrics.json' if metrics else None
+        
+    
+    @timedPhase('check')
+    def check(self):
+        """check inputs"""
+        # check on input file - required
+        if not self.inputFile or not os.path.exists(self.inputFile):
+            self.logger.error("Input GFF3 file not set or does not exist: %s" % self.inputFile)
+            raise Exception("Input GFF3 file not set or does not exist: %s" % self.inputFile)
+        self.inputFile = os.path.abspath(self.inputFile)
+        
+        # check on outputDir
+        if not os.path.exists(self.outputDir):
+            self.logger.error("Output dir does not exist: %s" % self.outputDir)
+            raise Exception("Output dir does not exist: %s" % self.outputDir)
+
+        if not os.access(self.outputDir, os.W_OK) or not os.access(self.outputDir, os.X_OK):
+            self.logger.error("Output dir %s is either not writable or executable. \
+I need both to be able to write to it" % self.outputDir)
+            raise Exception("Output dir %s is either not writable or executable. \
+I need both to be able to write to it" % self.outputDir)
+        
+        if self.speciesCode:
+            self.logger.info("Using species code: {0}".format(self.speciesCode))
+            return
+        
+        # check on ids required for species code
+        if not self.assemblyId and not self.taxonId and not self.scientificName:
+            self.logger.error("Need either: assembly_id, taxon_id or scientific_name to get species_code for display name")
+            raise Exception("Need either: assembly_id, taxon_id or scientific_name to get species_code for display name")
+        
+        # get species code
+        if self.assemblyId is not None:
+            self.speciesCode = self.speciescode_by_assemblyid(self.assemblyId)
+            self.logger.info("Retrieved species code: {0} using assembly id: {1}".format(self.speciesCode, self.assemblyId))
+        elif self.taxonId is not None:
+            self.speciesCode = self.speciescode_by_taxonid(self.taxonId)
+            self.logger.info("Retrieved species code: {0} using taxon id: {1}".format(self.speciesCode, self.taxonId))
+        elif self.scientificName is not None:
+            self.speciesCode = self.speciescode_by_sciname(self.scientificName)
+            self.logger.info("Retrieved species code: {0} using scientific name: {1}".format(self.speciesCode, self.scientificName))
+
+
+    @timedPhase('parse')
+    def parseGff3FixDupIDs(self):
+        """parse input GFF3 file and uniquify any duplicate IDs for gene, mRNA/tRNA features
+           Features referring to a duplicate ID after it was renamed are moved to the new ID,
+           so duplicates are only resolved correctly when children follow their own parent"""
+           
+        self.check()
+        self.logger.info("Parsing input gff3 file and checking for duplicate IDs in gene, mRNA features: %s..." % self.inputFile)
+        # serializing entire GFF3 file as I/O is more expensive than RAM memory
+        # GFF3Table rows behave like GFF3Records, at a fraction of the memory
+        if self.useTable and self.useCache:
+            self.records = cachedTable(self.inputFile)
+        elif self.useTable and self.workers > 1:
+            self.records = parse_GFF3_parallel(self.inputFile, self.workers, asTables=True)
+        elif self.useTable:
+            self.records = GFF3Table.fromRecords(parse_GFF3(self.inputFile))
+        elif self.workers > 1 and not self.useCache:
+            self.records = list(parse_GFF3_parallel(self.inputFile, self.workers))
+        else:
+            self.records = list(parse_GFF3(self.inputFile, cache=self.useCache))
+        self.uniqueIdSet = {}  # gene, mRNA ID set - dictionary {ID: True} 
+        self.renameIdMap = {}  # dictionary of IDs that have been renamed - {Old ID: new ID}
+        self.dupCount = 0
+        for record in self.records:
+            self.fixDupID(record)
+        self.metrics.count('records', len(self.records))
+                        
+        self.logger.info("Parsed a total of {0} records. Found and fixed {1} duplicate IDs in gene/mRNA features.".format(len(self.records), self.dupCount))    
+        
+        
+    def fixDupID(self, record):
+        """uniquify the ID of one record (in file order) and follow earlier renames in its ID and Parent.
+           Returns True if the record was changed."""
+        changed = False
+        # attributes are only decoded when a record needs changing - plain lookups read the raw column
+        recordId = record.getAttribute('ID')
+        # checking duplicate IDs
+        if record.type in ['gene', 'mRNA', 'tRNA']:
+            # only these features are main parents
+            if recordId is not None:
+                if recordId in self.uniqueIdSet:
+                    # found duplicate ID
+                    self.dupCount += 1
+                    newId = recordId + '.' + str(self.dupCount) + 'd'
+                    self.renameIdMap[recordId] = newId
+                    self.logger.warn("Duplicate ID: {0} found. Assigning new ID: {1}".format(recordId, newId))
+                    record.attributes['ID'] = newId
+                    self.uniqueIdSet[newId] = True
+                    changed = True
+                else:
+                    # ID is unique - add to uniqueIdSet
+                    self.uniqueIdSet[recordId] = True
+            else:
+                self.logger.error("ID attribute missing in gff3 record: {}".format(record))
+                raise Exception("ID attribute missing in gff3 record: {}".format(record))
+        else:
+            # other child features follow and will be made unique
+            # assumed format: parentId.exon1, parentId.cds1, parentId.utr5p1, parentId.utr3p1 etc
+            if recordId is not None:
+                parts = recordId.split('.')
+                parentId = '.'.join(parts[:-1])
+                if parentId in self.renameIdMap:
+                    # parentId was renamed - update child ID accordingly
+                    record.attributes['ID'] = '.'.join([self.renameIdMap[parentId], parts[-1]])
+                    changed = True
+            else:
+                self.logger.error("ID attribute missing in gff3 record: {}".format(record))
+                raise Exception("ID attribute missing in gff3 record: {}".format(record))
+            
+        # Updating Parents if present - checks every record    
+        parentAttr = record.getAttribute('Parent')
+        if parentAttr is not None and self.renameIdMap:
+            # Parent attribute could have multiple CSVs
+            new_parents = []
+            for parent in parentAttr.split(','):
+                if parent in self.renameIdMap:
+                    new_parents.append(self.renameIdMap[parent])
+                else:
+                    new_parents.append(parent)
+            new_parentAttr = ','.join(new_parents)
+            # only touch the attributes when a parent was actually renamed
+            if new_parentAttr != parentAttr:
+                record.attributes['Parent'] = new_parentAttr
+                changed = True
+        return changed
+        
+        
+    @timedPhase('buildGeneSet')
+    def buildGeneSet(self):
+        """create gene feature array"""
+        self.parseGff3FixDupIDs()
+        self.logger.info("Building gene features...")
+        # parent/child index - children may come anywhere in the file, before or after their parents
+        hierarchy = GFF3Hierarchy(self.records)
+        for row in hierarchy.unresolvedRows():
+            record = self.records[row]
+            self.logger.error("unresolved parents {0} found in gff3 record: {1}".format(record.getAttribute('Parent'), record))
+            raise Exception("unresolved parents {0} found in gff3 record: {1}".format(record.getAttribute('Parent'), record))
+        for row in hierarchy.roots:
+            record = self.records[row]
+            if record.type != 'gene':
+                self.logger.error("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
+                raise Exception("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
+        recordCount = 0
+        for row in hierarchy.rowsOfType('gene'):
+            record = self.records[row]
+            # create seqidDict - parsing only gene features will be enough
+            self.addSeqid(record.seqid)
+            # create gene
+            # expecting validated GFF files - every gene feature has unique ID attribute
+            # gene feature record first, then all its descendants - parents before children
+            gene = Gene(record.seqid, record.start, hierarchy.ids[row], records=[record])
+            # mRNA/tRNA features directly under the gene, in file order
+            for childRow in hierarchy.childRows(gene.ID):
+                if self.records[childRow].type in ['mRNA', 'tRNA']:
+                    gene.children.append(Transcript(hierarchy.ids[childRow]))
+            for descendantRow in hierarchy.descendantRows(row):
+                gene.records.append(self.records[descendantRow])
+            recordCount += len(gene.records)
+            self.geneFeatureArr.append(gene)
+        # every record must belong to exactly one gene
+        if recordCount != len(self.records):
+            self.logger.error("{0} gff3 records found but {1} placed under genes: features shared between genes, nested genes or Parent cycles".format(len(self.records), recordCount))
+            raise Exception("{0} gff3 records found but {1} placed under genes: features shared between genes, nested genes or Parent cycles".format(len(self.records), recordCount))
+        self.numberSeqids()
+        self.metrics.count('genes', len(self.geneFeatureArr))
+        self.logger.info("Parsed a total of {0} genes.".format(len(self.geneFeatureArr)))
+                
+    
+    def addSeqid(self, seqid):
+        """parse and store the seqid<-->num if not already in seqidDict"""
+        if (seqid not in self.seqidDict) and (seqid not in self.nomatch_seqid_bin):
+            # new seqid
+            seqid_match = self.parse_seqid(seqid)
+            if seqid_match and 'num' in seqid_match.groupdict():
+                # match - store in seqidDict
+                self.seqidDict[seqid] = int(seqid_match.group('num'))
+            else:
+                # no match - we will get to them later
+                self.logger.warn("given regex '{0}' does not help extract number from seqid '{1}'. Please match (?P<num>\d+) group with number part if possible. Assigning automatic numbering, check seqidMap file: {2}".format(self.seqIdRegex, seqid, self.seqidOutputFile))
+                self.nomatch_seqid_bin.append(seqid)
+    
+    
+    def numberSeqids(self):
+        """number the seqids the regex did not match and put the seq numbers in geneFeatureArr"""
+        # Now let's check the nomatch_seqids and assign auto numbering (starting after the max in seqidDict) & add them to seqidDict
+        if self.nomatch_seqid_bin:
+            # Get current max
+            if self.seqidDict:
+                max_seqnum = max(v for k, v in self.seqidDict.items())
+            else:
+                # may be nothing matched
+                max_seqnum = 0
+            # Add nomatch_seqids to seqidDict
+            for num, nomatch_seqid in enumerate(sorted(self.nomatch_seqid_bin), start=max_seqnum+1):
+                self.seqidDict[nomatch_seqid] = num
+            
+        
+        # Update seqid in gene with just the number - so sorting happens correctly later
+        # There are reasons this is done after parsing all records - seqidDict might be incomplete - see above step
+        for gene in self.geneFeatureArr:
+            gene.seqid = self.seqidDict[gene.seqid]
+                
+    
+    @timedPhase('sort')
+    def sortGenes(self):
+        """genes in output order: by seqid number, then start. Sorted once, for naming and writing."""
+        self.sortedGenes = sorted(self.geneFeatureArr, key=attrgetter('seqid', 'start'))
+        
+    
+    @timedPhase('name')
+    def createDisplayName(self):
+        """sort genes and create display names for gene, mRNA/tRNA features"""
+        self.buildGeneSet()
+        self.logger.info("Creating new display names and the ID<->Name map...")
+        self.sortGenes()
+        # seqnum in display name
+        max_seqnum = max(v for k, v in self.seqidDict.items())
+        seqid_width = len(str(max_seqnum))
+        # gene numbering starts from 100, 110, 120
+        max_genenum = GENE_COUNTER_START + (len(self.sortedGenes) - 1)*GENE_COUNTER_STEP
+        genenum_width = len(str(max_genenum))
+        
+        # loop through the sorted gene array
+        for geneCounter, gene in enumerate(self.sortedGenes):
+            self.nameGene(gene, geneCounter, seqid_width, genenum_width)
+        
+        self.metrics.count('names', len(self.id2nameMap))
+        self.logger.info("Created a total of {0} ID <-> display name mappings.".format(len(self.id2nameMap)))
+        
+    
+    def formatGeneName(self, seqnum, genenum, seqid_width, genenum_width):
+        """display name of a gene: dpzm01g00100.xx"""
+        return "{0}{1}{2}g{3}.{4}".format(DP_PREFIX,
+                                          self.speciesCode.lower(),
+                                          str(seqnum).zfill(seqid_width),
+                                          str(genenum).zfill(genenum_width),
+                                          self.gsapRunId)
+        
+    
+    def nameGene(self, gene, geneCounter, seqid_width, genenum_width):
+        """create the display names of a gene and its mRNA/tRNA features, geneCounter-th in sorted order"""
+        seqnum = gene.seqid
+        genenum = GENE_COUNTER_START + GENE_COUNTER_STEP*geneCounter 
+        # create the display name for gene feature
+        # dpzm01g00100.xx
+        gene.Name = self.formatGeneName(seqnum, genenum, seqid_width, genenum_width)
+        #debug
+        if gene.ID in self.id2nameMap:
+            self.logger.debug("Duplicate ID: {0} feature found. Old name: {1}, New name: {2}".format(gene.ID,
+                                                                                                     self.id2nameMap[gene.ID],
+                                                                                                     gene.Name))
+        self.id2nameMap[gene.ID] = gene.Name
+        # create the display name for child mRNA/tRNA features
+        # dpzm01g00100.xx.1 - check for isoforms
+        if len(gene.children) == 1:
+            # Only one isoform
+            gene.children[0].Name = "{0}.{1}".format(gene.Name, 1)
+            #debug
+            if gene.children[0].ID in self.id2nameMap:
+                self.logger.debug("Duplicate ID: {0} feature found. Old name: {1}, New name: {2}".format(gene.children[0].ID,
+                                                                                                         self.id2nameMap[gene.children[0].ID],
+                                                                                                         gene.children[0].Name))
+            self.id2nameMap[gene.children[0].ID] = gene.children[0].Name
+        elif len(gene.children) > 1:
+            # More than one isoforms
+            # sort them by ID & assign isoform number in increasing order
+            sorted_children = sorted(gene.children, key=lambda x: (len(x.ID), x.ID))
+            for i, transcript in enumerate(sorted_children):
+                transcript.Name = "{0}.{1}".format(gene.Name, i+1)
+                #debug
+                if transcript.ID in self.id2nameMap:
+                    self.logger.debug("Duplicate ID: {0} feature found. Old name: {1}, New name: {2}".format(transcript.ID,
+                                                                                                             self.id2nameMap[transcript.ID],
+                                                                                                             transcript.Name))
+                self.id2nameMap[transcript.ID] = transcript.Name
+        
+    
+    @timedPhase('write')
+    def writeGff3(self):
+        """writes the final output sorted gff3 file with new IDs, display names and another ID<->Name mapping file"""
+        self.createDisplayName()
+        # writing output gff3 file
+        self.logger.info("Writing gff3 records with new IDs & display names to output file: %s..." % self.outputFile)
+        # batched writes; .gz output is BGZF compressed in background threads
+        outputfile = GFF3Writer(self.outputFile)
+        outputfile.write(GFF_HEADER + '\n')
+        # loop through the sorted gene array - will preserve the gene structure
+        for gene in self.sortedGenes:
+            for record in gene.records:
+                self.renameRecord(record)
+                outputfile.writeRecord(record)
+            #outputfile.write('###\n')
+        outputfile.close()
+        self.recordsWritten = outputfile.recordCount
+        self.metrics.count('records', outputfile.recordCount)
+        self.logger.info("{0} records written to output gff3 file: {1}".format(outputfile.recordCount, self.outputFile))
+        self.writeMaps()
+        
+    
+    def renameRecord(self, record):
+        """put the new IDs, display names and parents from id2nameMap into one record"""
+        #Update source column
+        record.source = SOURCE_COLUMN
+        # most attribute columns are rewritten as text - decoding them into a dict and back
+        # costs more than the renaming itself. Changed, escaped, repeated or malformed attributes are decoded.
+        raw = record.unchangedAttributes
+        pairs = None if raw is None or '%' in raw else [attribute.partition('=') for attribute in raw.split(';')]
+        if pairs and all(sep and '=' not in value for key, sep, value in pairs):
+            keys = [key for key, sep, value in pairs]
+            attributes = dict((key, value) for key, sep, value in pairs)
+            if len(attributes) == len(keys):
+                self.renameAttributes(record, attributes)
+                if len(attributes) > len(keys):
+                    # Name added
+                    keys.append('Name')
+                record.attributes = ';'.join([key + '=' + attributes[key] for key in keys])
+                return
+        self.renameAttributes(record, record.attributes)
+        
+    
+    def renameAttributes(self, record, attributes):
+        """rename ID, Name and Parent in the attributes dict of record.
+           id2nameMap is the rename plan: it maps every gene and mRNA/tRNA ID to its display name,
+           which is also the new ID prefix of the features under it - one lookup per ID or parent."""
+        #Update display name & ID
+        if record.type in ['gene', 'mRNA', 'tRNA']:
+            name = self.id2nameMap.get(attributes.get('ID'))
+            if name is not None:
+                attributes['Name'] = name
+                attributes['ID'] = name
+            # debug
+            else:
+                self.logger.debug("found gff3 feature whose ID is missing or has not been mapped to name: {}\n".format(record))
+        else:
+            #Update ID only - other child features
+            #format: parentId.exon1, parentId.cds1, parentId.utr5p1, parentId.utr3p1 etc
+            if 'ID' in attributes:
+                parentId, dot, suffix = attributes['ID'].rpartition('.')
+                name = self.id2nameMap.get(parentId)
+                if name is not None:
+                    attributes['ID'] = name + '.' + suffix
+                # debug
+                else:
+                    self.logger.debug("found gff3 feature whose parent ID {0} has not been mapped to name: {1}\n".format(parentId, record))
+        #Update Parents    
+        if 'Parent' in attributes:
+            parentAttr = attributes['Parent']
+            name = self.id2nameMap.get(parentAttr)
+            if name is not None:
+                attributes['Parent'] = name
+                return
+            # Parent attribute could have multiple CSVs
+            new_parents = []
+            for parent in parentAttr.split(','):
+                if parent in self.id2nameMap:
+                    new_parents.append(self.id2nameMap[parent])
+                # debug
+                else:
+                    new_parents.append(parent)
+                    self.logger.debug("found gff3 feature whose parent ID {0} has not been mapped to name: {1}\n".format(parent, record))
+            attributes['Parent'] = ','.join(new_parents)
+        
+    
+    @timedPhase('writeMaps')
+    def writeMaps(self):
+        """writes the seqid<->num and ID<->Name mapping files"""
+        self.writeSeqidMap()
+        
+        # writing ID<->Name mapping file
+        #self.logger.info("Writing ID<->Name mappings to output file: %s..." % self.id2nameOutputFile)
+        outputfile = open(self.id2nameOutputFile, 'w')
+        for k, v in self.id2nameMap.items():
+            outputfile.write("{0}\t{1}\n".format(k, v))
+        outputfile.close()
+        self.namesWritten = len(self.id2nameMap)
+        self.metrics.count('names', self.namesWritten)
+        self.logger.info("{0} ID<->Name mappings written to output file: {1}".format(len(self.id2nameMap), self.id2nameOutputFile))
+        self.storeNames()
+        self.logger.info("Analysis all well done.")
+        
+    
+    @timedPhase('storeNames')
+    def storeNames(self):
+        """load the ID<->Name mapping file into nameStore, if set"""
+        if not self.nameStore:
+            return
+        with NameStore(self.nameStore) as store:
+            count = store.loadMapFile(self.gsapRunId, self.id2nameOutputFile)
+        self.logger.info("{0} ID<->Name mappings stored as run {1} in: {2}".format(count, self.gsapRunId, self.nameStore))
+        
+    
+    def writeSeqidMap(self):
+        """writes the seqid<->num mapping file"""
+        # writing seqid<->num mapping file
+        #self.logger.info("Writing seqid<->num mappings to output file: %s..." % self.seqidOutputFile)
+        outputfile = open(self.seqidOutputFile, 'w')
+        for k, v in sorted(self.seqidDict.items(), key=itemgetter(1)):
+            outputfile.write("{0}\t{1}\n".format(k, v))
+        outputfile.close()
+        self.logger.info("{0} seqid<-> num mappings written to output file: {1}".format(len(self.seqidDict), self.seqidOutputFile))
+        
+    
+    def speciescode_by_assemblyid(self, assemblyId):
+        """ returns species code given assembly id """
+        url = self.assemblyApi + str(assemblyId)
+        # get taxon_id and then call species code service
+        self.taxonId = self.lookupService('assembly', assemblyId, url, "GAIA Genome Repo", self.checkAssemblyResult)
+        return self.speciescode_by_taxonid(self.taxonId)
+
+    def speciescode_by_taxonid(self, taxonId):
+        """ returns species code given internal taxon id """
+        url = self.taxonApi + str(taxonId)
+        return self.lookupService('taxon', taxonId, url, "Species code service", self.checkSpeciesCodeResult)
+        
+    
+    def speciescode_by_sciname(self, sciname):
+        """ returns species code given scientific name """
+        url = urllib2.quote(self.scinameApi + sciname, safe=":/")
+        return self.lookupService('sciname', sciname, url, "Species code service", self.checkSpeciesCodeResult)
+
+
+    def lookupService(self, kind, key, url, serviceName, checkResult):
+        """value for key from the species code cache, else from the service at url and then cached.
+           checkResult(url, result) picks the value out of the service's answer.
+           A stale cache entry is used if the service cannot be reached, or in offline mode."""
+        stale = None
+        if self.speciesCache is not None:
+            value = self.speciesCache.get(kind, key)
+            if value is not None:
+                self.logger.info("Using cached {0} lookup: {1} -> {2}".format(kind, key, value))
+                return value
+            stale = self.speciesCache.get(kind, key, allowStale=True)
+        if self.offline:
+            if stale is not None:
+                self.logger.warn("Offline: using expired cached {0} lookup: {1} -> {2}".format(kind, key, stale))
+                return stale
+            self.logger.error("Offline and no cached {0} lookup for: {1} in species code cache: {2}".format(
+                kind, key, self.speciesCache.filename if self.speciesCache is not None else None))
+            raise Exception("Offline and no cached {0} lookup for: {1} in species code cache: {2}".format(
+                kind, key, self.speciesCache.filename if self.speciesCache is not None else None))
+        try:
+            result = byteify(fetchJson(url, self.serviceTimeout, self.serviceRetries, logger=self.logger))
+            #print (json.dumps(result, indent=2))
+        except (urllib2.URLError, socket.error) as e:
+            if isinstance(e, urllib2.HTTPError):
+                message = "{0} unreachable or couldn't fulfill the request: {1}. Error Code: {2}. Reason: {3}".format(
+                    serviceName, url, e.code, e.reason)
+            else:
+                message = "{0} unreachable: {1}. Reason: {2}".format(serviceName, url, getattr(e, 'reason', e))
+            if stale is not None:
+                self.logger.warn("{0}. Using expired cached {1} lookup: {2} -> {3}".format(message, kind, key, stale))
+                return stale
+            self.logger.error(message)
+            raise Exception(message)
+        value = checkResult(url, result)
+        if self.speciesCache is not None and not self.speciesCache.put(kind, key, value):
+            self.logger.warn("Could not write species code cache: {0}".format(self.speciesCache.filename))
+        return value
+
+    def checkAssemblyResult(self, url, result):
+        """taxon_id from a GAIA Genome Repo answer"""
+        if (not result) or ('taxon_id' not in result):
+            self.logger.error("GAIA Genome Repo request: {0} came back empty: {1}".format(url, result))
+            raise Exception("GAIA Genome Repo request: {0} came back empty: {1}".format(url, result))
+        return result['taxon_id']
+
+    def checkSpeciesCodeResult(self, url, result):
+        """SpeciesCode from a species code service answer"""
+        if (not result) or ('SpeciesCode' not in result):
+            self.logger.error("Species code request: {0} came back empty: {1}".format(url, result))
+            raise Exception("Species code request: {0} came back empty: {1}".format(url, result))
+        elif not result['SpeciesCode']:
+            self.logger.error(result['Message'])
+            raise Exception(result['Message'])
+        return result['SpeciesCode']
+
+
+
+class StreamingDisplayName(DisplayName):
+    """DisplayName for annotations too large to hold in memory - memory grows with genes, not records.
+       Pass one reads the input once and keeps, per gene, only the seqid, start, ID, the file offsets
+       of its block of lines and its mRNA/tRNA IDs. Pass two seeks to each gene block in sorted order
+       and rewrites its records as they are read.
+       Important Assumption: each gene's features follow it, before the next gene.
+       Input must be uncompressed or BGZF (bgzip) so it can be seeked into."""
+
+    @timedPhase('buildGeneSet')
+    def buildGeneSet(self):
+        """pass one: gene blocks, seqid numbers and duplicate ID fixes"""
+        self.check()
+        self.logger.info("Indexing gene blocks and checking for duplicate IDs in gene, mRNA features: %s..." % self.inputFile)
+        for gene, blockRecords in self.iterGeneBlocks():
+            # only records changed by fixDupID are kept, to be put back in pass two
+            fixes = dict((i, item.attributes) for i, item in enumerate(blockRecords) if not isinstance(item, basestring))
+            gene.fixes = fixes or None
+            self.geneFeatureArr.append(gene)
+        self.numberSeqids()
+        self.metrics.count('genes', len(self.geneFeatureArr))
+        self.logger.info("Parsed a total of {0} genes.".format(len(self.geneFeatureArr)))
+        
+    
+    def iterGeneBlocks(self):
+        """reads the input once, fixing duplicate IDs and checking gene structure.
+           Yields (gene, blockRecords) for each gene in file order: blockRecords has the
+           gene's feature lines, with the records changed by fixDupID in place of their lines.
+           gene has the file offsets of the block: offset of the gene line and end
+           of the next gene line (None for the last gene)."""
+        self.uniqueIdSet = {}
+        self.renameIdMap = {}
+        self.dupCount = 0
+        inputfile = self.openInput()
+        recordCount = 0
+        gene = None
+        blockRecords = []
+        try:
+            while True:
+                offset = inputfile.tell()
+                line = inputfile.readline()
+                if not line:
+                    break
+                record = parse_GFF3_line(line)
+                if record is None:
+                    continue
+                changed = self.fixDupID(record)
+                if record.type == 'gene':
+                    if gene is not None:
+                        gene.end = offset
+                        yield gene, blockRecords
+                    self.addSeqid(record.seqid)
+                    gene = Gene(record.seqid, record.start, record.getAttribute('ID'), offset=offset)
+                    blockIds = set([gene.ID])
+                    blockRecords = []
+                else:
+                    parentAttr = record.getAttribute('Parent')
+                    if parentAttr is None:
+                        self.logger.error("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
+                        raise Exception("found gff3 feature with missing Parent attribute. Need parents for child features: {0}\n".format(record))
+                    parents = parentAttr.split(',') # Parent attribute could have multiple CSVs
+                    if record.type in ['mRNA', 'tRNA']:
+                        resolved = gene is not None and gene.ID in parents
+                    else:
+                        resolved = gene is not None and not blockIds.isdisjoint(parents)
+                    if not resolved:
+                        self.logger.error("gene structure unordered or unresolved parents found in gff3 record: {0}. Streaming needs each gene's features right after it".format(record))
+                        raise Exception("gene structure unordered or unresolved parents found in gff3 record: {0}. Streaming needs each gene's features right after it".format(record))
+                    if record.type in ['mRNA', 'tRNA']:
+                        gene.children.append(Transcript(record.getAttribute('ID')))
+                    blockIds.add(record.getAttribute('ID'))
+                blockRecords.append(record if changed else line)
+                recordCount += 1
+            if gene is not None:
+                yield gene, blockRecords
+        finally:
+            inputfile.close()
+        self.metrics.count('records', recordCount)
+        self.logger.info("Parsed a total of {0} records. Found and fixed {1} duplicate IDs in gene/mRNA features.".format(recordCount, self.dupCount))
+        
+    
+    @timedPhase('write')
+    def writeGff3(self):
+        """pass two: write the gene blocks in sorted order, renaming records as they are read"""
+        self.createDisplayName()
+        self.logger.info("Writing gff3 records with new IDs & display names to output file: %s..." % self.outputFile)
+        outputfile = GFF3Writer(self.outputFile)
+        outputfile.write(GFF_HEADER + '\n')
+        inputfile = self.openInput()
+        try:
+            for gene in self.sortedGenes:
+                fixes = gene.fixes or {}
+                inputfile.seek(gene.offset)
+                blockIndex = 0
+                while gene.end is None or inputfile.tell() < gene.end:
+                    line = inputfile.readline()
+                    if not line:
+                        break
+                    record = parse_GFF3_line(line)
+                    if record is None:
+                        continue
+                    if blockIndex in fixes:
+                        record.attributes = fixes[blockIndex]
+                    blockIndex += 1
+                    self.renameRecord(record)
+                    outputfile.writeRecord(record)
+        finally:
+            inputfile.close()
+            outputfile.close()
+        self.recordsWritten = outputfile.recordCount
+        self.metrics.count('records', outputfile.recordCount)
+        self.logger.info("{0} records written to output gff3 file: {1}".format(outputfile.recordCount, self.outputFile))
+        self.writeMaps()
+        
+    
+    def openInput(self):
+        """input file with tell/seek usable across passes"""
+        try:
+            return openForIndex(self.inputFile)
+        except ValueError as e:
+            self.logger.error("Streaming mode cannot read input: {0}".format(e))
+            raise Exception("Streaming mode cannot read input: {0}".format(e))
+
+
+
+class ExternalSortDisplayName(StreamingDisplayName):
+    """DisplayName with an out-of-core gene sort, for assemblies whose genes do not fit in memory.
+       Gene blocks (the gene's lines plus its sort key and mRNA/tRNA IDs) are collected up to
+       memoryBudget MB, sorted and spilled to temp files as runs. The runs are k-way merged while
+       the output is written: display names are created as the genes come out of the merge, and
+       the ID<->Name map is written as it goes.
+       Same input needs as StreamingDisplayName, except that regular gzip input works too."""
+
+    # most runs merged at once
+    mergeFanIn = 64
+
+    def __init__(self, *args, **kwargs):
+        self.memoryBudget = kwargs.pop('memoryBudget', 512) # MB of gene blocks held before spilling a run
+        self.tempDir = kwargs.pop('tempDir', None) # dir for the runs, default: output dir
+        DisplayName.__init__(self, *args, **kwargs)
+        self.runFiles = []
+        self.geneCount = 0
+        
+        
+    @timedPhase('buildGeneSet')
+    def buildGeneSet(self):
+        """pass one: gene blocks into sorted runs on disk"""
+        self.check()
+        self.logger.info("Sorting gene blocks in runs of up to {0} MB: {1}...".format(self.memoryBudget, self.inputFile))
+        budget = self.memoryBudget * 1024 * 1024
+        blocks = []
+        blockBytes = 0
+        for gene, blockRecords in self.iterGeneBlocks():
+            seqid = gene.seqid
+            # seqids the regex does not match are numbered after all others, in name order
+            seqKey = (0, self.seqidDict[seqid]) if seqid in self.seqidDict else (1, seqid)
+            # file order breaks ties, as the stable in-memory sort does
+            blocks.append((seqKey, gene.start, self.geneCount, gene.ID,
+                           [transcript.ID for transcript in gene.children], blockRecords))
+            self.geneCount += 1
+            # rough size: the lines plus per-gene and per-line object overhead
+            blockBytes += 512 + sum(len(item) + 64 if isinstance(item, basestring) else 1024 for item in blockRecords)
+            if blockBytes >= budget:
+                self.spillRun(blocks)
+                blocks = []
+                blockBytes = 0
+        if blocks:
+            self.spillRun(blocks)
+        self.numberSeqids()
+        self.metrics.count('genes', self.geneCount)
+        self.logger.info("Parsed a total of {0} genes into {1} sorted runs.".format(self.geneCount, len(self.runFiles)))
+        
+    
+    def spillRun(self, blocks):
+        """sort blocks and write them to a new run file"""
+        blocks.sort()
+        self.runFiles.append(self.writeRun(blocks))
+        
+    
+    @timedPhase('mergeRuns')
+    def mergeRuns(self):
+        """merge runs in groups until at most mergeFanIn are left, so the final merge has few files open"""
+        while len(self.runFiles) > self.mergeFanIn:
+            group = self.runFiles[:self.mergeFanIn]
+            runFile = self.writeRun(heapq.merge(*[self.iterRun(groupFile) for groupFile in group]))
+            self.runFiles = self.runFiles[self.mergeFanIn:] + [runFile]
+            for groupFile in group:
+                os.remove(groupFile)
+        
+    
+    def writeRun(self, blocks):
+        """write sorted blocks to a new run file, returns its path"""
+        fd, runFile = tempfile.mkstemp(prefix='displayName_run', suffix='.pkl', dir=self.tempDir or self.outputDir)
+        with os.fdopen(fd, 'wb') as fh:
+            pickler = cPickle.Pickler(fh, cPickle.HIGHEST_PROTOCOL)
+            for block in blocks:
+                pickler.dump(block)
+                # the pickler would otherwise keep a reference to every block
+                pickler.clear_memo()
+        return runFile
+        
+    
+    def iterRun(self, runFile):
+        with open(runFile, 'rb') as fh:
+            unpickler = cPickle.Unpickler(fh)
+            while True:
+                try:
+                    yield unpickler.load()
+                except EOFError:
+                    return
+        
+    
+    def openInput(self):
+        """input is read once, front to back - any gzip will do"""
+        openFunc = gzip.open if self.inputFile.endswith('.gz') else open
+        return openFunc(self.inputFile, 'rb')
+        
+    
+    def createDisplayName(self):
+        """names are created during the merge - see writeGff3"""
+        self.buildGeneSet()
+        
+    
+    @timedPhase('write')
+    def writeGff3(self):
+        """merge the sorted runs, creating display names and writing records gene by gene"""
+        try:
+            self.createDisplayName()
+            if not self.geneCount:
+                self.logger.error("No gene features found in input gff3 file: {0}".format(self.inputFile))
+                raise Exception("No gene features found in input gff3 file: {0}".format(self.inputFile))
+            self.logger.info("Merging sorted runs, writing gff3 records with new IDs & display names to output file: %s..." % self.outputFile)
+            # seqnum in display name
+            max_seqnum = max(v for k, v in self.seqidDict.items())
+            seqid_width = len(str(max_seqnum))
+            # gene numbering starts from 100, 110, 120
+            max_genenum = GENE_COUNTER_START + (self.geneCount - 1)*GENE_COUNTER_STEP
+            genenum_width = len(str(max_genenum))
+            self.mergeRuns()
+            outputfile = GFF3Writer(self.outputFile)
+            outputfile.write(GFF_HEADER + '\n')
+            mapfile = open(self.id2nameOutputFile, 'w')
+            mapCount = 0
+            merged = heapq.merge(*[self.iterRun(runFile) for runFile in self.runFiles])
+            for geneCounter, (seqKey, start, order, geneId, childIds, blockRecords) in enumerate(merged):
+                seqnum = self.seqidDict[seqKey[1]] if seqKey[0] else seqKey[1]
+                gene = Gene(seqnum, start, geneId, [Transcript(childId) for childId in childIds])
+                # names of this gene only - its records do not refer to other genes
+                self.id2nameMap = OrderedDict()
+                self.nameGene(gene, geneCounter, seqid_width, genenum_width)
+                for item in blockRecords:
+                    record = parse_GFF3_line(item) if isinstance(item, basestring) else item
+                    self.renameRecord(record)
+                    outputfile.writeRecord(record)
+                for k, v in self.id2nameMap.items():
+                    mapfile.write("{0}\t{1}\n".format(k, v))
+                mapCount += len(self.id2nameMap)
+            outputfile.close()
+            mapfile.close()
+        finally:
+            for runFile in self.runFiles:
+                if os.path.exists(runFile):
+                    os.remove(runFile)
+        self.recordsWritten = outputfile.recordCount
+        self.metrics.count('records', outputfile.recordCount)
+        self.logger.info("{0} records written to output gff3 file: {1}".format(outputfile.recordCount, self.outputFile))
+        self.namesWritten = mapCount
+        self.metrics.count('names', mapCount)
+        self.logger.info("{0} ID<->Name mappings written to output file: {1}".format(mapCount, self.id2nameOutputFile))
+        self.writeSeqidMap()
+        self.storeNames()
+        self.logger.info("Analysis all well done.")
+
+
+
+# ShardedDisplayName whose shards are being written - set before the pool is forked,
+# so workers see its genes and records without pickling them
+_shardSource = None
+
+
+def _writeShard(task):
+    """worker: name and write one shard of ShardedDisplayName genes to shardFile, plain text.
+       Returns (records written, the shard's ID<->Name mappings in naming order)"""
+    geneStart, geneEnd, shardFile = task
+    source = _shardSource
+    source.id2nameMap = OrderedDict()
+    for geneCounter in xrange(geneStart, geneEnd):
+        source.nameGene(source.sortedGenes[geneCounter], geneCounter, source.seqidWidth, source.genenumWidth)
+    outputfile = GFF3Writer(shardFile, compression=None)
+    for gene in source.sortedGenes[geneStart:geneEnd]:
+        for record in gene.records:
+            source.renameRecord(record)
+            outputfile.writeRecord(record)
+    outputfile.close()
+    return outputfile.recordCount, source.id2nameMap.items()
+
+
+class ShardedDisplayName(DisplayName):
+    """DisplayName that names and writes genes in worker processes, one shard of seqids each.
+       A gene's number only depends on how many genes sort before it, so once genes are sorted
+       each shard (consecutive seqids) starts counting at the number of genes in the shards before
+       it. Workers write their shards to temp files, which are concatenated in order: the output
+       is the same as DisplayName's, byte for byte.
+       Records are renamed using the names of their own shard only - as with fixDupID, a feature
+       must only refer to IDs of its own gene."""
+
+    # shards per worker - smaller shards even out seqids of different sizes
+    shardsPerWorker = 4
+
+    def __init__(self, *args, **kwargs):
+        self.tempDir = kwargs.pop('tempDir', None) # dir for the shard files, default: output dir
+        DisplayName.__init__(self, *args, **kwargs)
+        self.seqidWidth = 0
+        self.genenumWidth = 0
+        
+        
+    @timedPhase('name')
+    def createDisplayName(self):
+        """sort genes and work out the name widths - names themselves are created in the shards"""
+        self.buildGeneSet()
+        self.sortGenes()
+        self.seqidWidth = len(str(max(v for k, v in self.seqidDict.items())))
+        self.genenumWidth = len(str(GENE_COUNTER_START + (len(self.sortedGenes) - 1)*GENE_COUNTER_STEP))
+        
+    
+    def shardRanges(self):
+        """(first gene, end gene) ranges of sortedGenes, split only where the seqid changes"""
+        target = max(len(self.sortedGenes) // max(self.workers * self.shardsPerWorker, 1), 1)
+        ranges = []
+        shardStart = 0
+        for geneCounter in xrange(1, len(self.sortedGenes)):
+            if (geneCounter - shardStart >= target and
+                    self.sortedGenes[geneCounter].seqid != self.sortedGenes[geneCounter - 1].seqid):
+                ranges.append((shardStart, geneCounter))
+                shardStart = geneCounter
+        ranges.append((shardStart, len(self.sortedGenes)))
+        return ranges
+        
+    
+    @timedPhase('write')
+    def writeGff3(self):
+        """name and write the shards in parallel and concatenate them into the output gff3 file"""
+        global _shardSource
+        self.createDisplayName()
+        ranges = self.shardRanges()
+        self.logger.info("Writing gff3 records with new IDs & display names in {0} shards with {1} processes to output file: {2}...".format(
+            len(ranges), self.workers, self.outputFile))
+        tasks = []
+        for geneStart, geneEnd in ranges:
+            fd, shardFile = tempfile.mkstemp(prefix='displayName_shard', suffix='.gff3', dir=self.tempDir or self.outputDir)
+            os.close(fd)
+            tasks.append((geneStart, geneEnd, shardFile))
+        outputfile = GFF3Writer(self.outputFile)
+        _shardSource = self
+        pool = Pool(min(self.workers, len(tasks)))
+        try:
+            outputfile.write(GFF_HEADER + '\n')
+            # imap hands the shards back in order while later ones are still being written
+            for (geneStart, geneEnd, shardFile), (recordCount, names) in zip(tasks, pool.imap(_writeShard, tasks)):
+                # line by line, so compressed output is batched exactly as when written directly
+                with open(shardFile) as shard:
+                    for line in shard:
+                        outputfile.write(line)
+                outputfile.recordCount += recordCount
+                self.id2nameMap.update(names)
+                os.remove(shardFile)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            _shardSource = None
+            outputfile.close()
+            for geneStart, geneEnd, shardFile in tasks:
+                if os.path.exists(shardFile):
+                    os.remove(shardFile)
+        self.metrics.count('names', len(self.id2nameMap))
+        self.logger.info("Created a total of {0} ID <-> display name mappings.".format(len(self.id2nameMap)))
+        self.recordsWritten = outputfile.recordCount
+        self.metrics.count('records', outputfile.recordCount)
+        self.logger.info("{0} records written to output gff3 file: {1}".format(outputfile.recordCount, self.outputFile))
+        self.writeMaps()
+
+
+
+def _renamedIds(recordType, recordId, parentAttr, nameMap):
+    """ID and Parent attribute of a record as renameRecord would set them with nameMap"""
+    if recordId is not None:
+        if recordType in ['gene', 'mRNA', 'tRNA']:
+            recordId = nameMap.get(recordId, recordId)
+        else:
+            parts = recordId.split('.')
+            parentId = '.'.join(parts[:-1])
+            if parentId in nameMap:
+                recordId = '.'.join([nameMap[parentId], parts[-1]])
+    if parentAttr is not None:
+        parentAttr = ','.join([nameMap.get(parent, parent) for parent in parentAttr.split(',')])
+    return recordId, parentAttr
+
+
+def _modelSignature(record, nameMap=None):
+    """what a record must match in the previous output to be unchanged: all columns but source,
+       ID and Parent (renamed with nameMap, if given) and the other attributes, in order"""
+    recordId, parentAttr = record.getAttributeValues(('ID', 'Parent'))
+    if nameMap is not None:
+        recordId, parentAttr = _renamedIds(record.type, recordId, parentAttr, nameMap)
+    renamedKeys = ('ID', 'Name', 'Parent') if record.type in ['gene', 'mRNA', 'tRNA'] else ('ID', 'Parent')
+    others = ';'.join([attribute for attribute in record.rawAttributes.split(';')
+                       if attribute.partition('=')[0] not in renamedKeys])
+    if nameMap is not None and '%' in others:
+        # renamed records are written with decoded attribute values
+        others = urllib2.unquote(others)
+    return (record.seqid, record.type, record.start, record.end, record.score, record.strand,
+            record.phase, recordId, parentAttr, others)
+
+
+class IncrementalDisplayName(DisplayName):
+    """DisplayName that keeps the names of a previous run - previousOutput is its output gff3, with
+       its _id2nameMap and _seqidMap files next to it. Each gene is compared with its block in the
+       previous output: record columns, IDs and Parents (mapped through the previous names) and the
+       other attributes.
+         unchanged: previous records copied as they are
+         changed:   keeps its name and its transcripts theirs (new transcripts get the next isoform
+                    numbers), records renamed again
+         added:     numbered in the gaps GENE_COUNTER_STEP leaves between the genes around it,
+                    with this run's GSAP run id. Genes moved to another seqid are added again.
+         removed:   its names and numbers are not reused
+       Besides the full output, the changes are written to the _id2nameDelta file: one
+       'change ID Name previousName' line per added, removed or renamed mapping and per
+       modified gene model."""
+
+    def __init__(self, *args, **kwargs):
+        self.previousOutput = kwargs.pop('previousOutput') # output gff3 of the previous run
+        DisplayName.__init__(self, *args, **kwargs)
+        self.previousNames = OrderedDict() # ID -> display name, of the previous run
+        self.previousBlocks = {} # gene display name -> that gene's lines in the previous output
+        self.delta = [] # (change, ID, Name, previous Name)
+        self.deltaOutputFile = self.outputFile + '_id2nameDelta'
+        
+    
+    @timedPhase('loadPrevious')
+    def loadPrevious(self):
+        """read the previous run's ID<->Name map, seqid numbers and output gene blocks"""
+        files = [self.previousOutput, self.previousOutput + '_id2nameMap', self.previousOutput + '_seqidMap']
+        for filename in files:
+            if not os.path.exists(filename):
+                self.logger.error("Previous run output file does not exist: {0}".format(filename))
+                raise Exception("Previous run output file does not exist: {0}".format(filename))
+        self.logger.info("Reading previous run output: {0}...".format(self.previousOutput))
+        with open(files[1]) as inputfile:
+            for line in inputfile:
+                featureId, name = line.rstrip('\n').split('\t')
+                self.previousNames[featureId] = name
+        # seqids keep their numbers - new seqids are numbered as usual
+        with open(files[2]) as inputfile:
+            for line in inputfile:
+                seqid, num = line.rstrip('\n').split('\t')
+                self.seqidDict[seqid] = int(num)
+        openFunc = gzip.open if self.previousOutput.endswith('.gz') else open
+        block = None
+        with openFunc(self.previousOutput) as inputfile:
+            for line in inputfile:
+                if line.startswith('#') or not line.strip():
+                    continue
+                columns = line.rstrip('\n').split('\t')
+                if columns[2] == 'gene':
+                    block = self.previousBlocks.setdefault(get_GFF_attribute(columns[8], 'ID'), [])
+                elif block is None:
+                    self.logger.error("Previous run output {0} does not start with a gene feature: {1}".format(self.previousOutput, line))
+                    raise Exception("Previous run output {0} does not start with a gene feature: {1}".format(self.previousOutput, line))
+                block.append(line)
+        self.logger.info("Read {0} ID<->Name mappings and {1} genes of the previous run.".format(len(self.previousNames), len(self.previousBlocks)))
+        
+    
+    def sameModel(self, gene, previousLines):
+        """True if a gene's records, renamed with the previous names, match its previous output lines"""
+        if len(previousLines) != len(gene.records):
+            return False
+        for record, line in zip(gene.records, previousLines):
+            if _modelSignature(record, self.previousNames) != _modelSignature(parse_GFF3_line(line)):
+                return False
+        return True
+        
+    
+    @timedPhase('name')
+    def createDisplayName(self):
+        """compare genes to the previous run, keep the names of the genes still there and name the new ones"""
+        self.loadPrevious()
+        self.buildGeneSet()
+        self.logger.info("Comparing genes to the previous run, creating display names for new genes...")
+        self.sortGenes()
+        seqid_width = len(str(max(v for k, v in self.seqidDict.items())))
+        # numbers in use, including removed genes', and the widths of the previous names
+        usedNumbers = set()
+        genenum_width = len(str(GENE_COUNTER_START + (len(self.sortedGenes) - 1)*GENE_COUNTER_STEP))
+        for name in self.previousBlocks:
+            match = GENE_NAME_PATTERN.match(name)
+            if match:
+                usedNumbers.add(int(match.group(2)))
+                seqid_width = max(seqid_width, len(match.group(1)))
+                genenum_width = len(match.group(2))
+        numbers = []
+        for gene in self.sortedGenes:
+            previousName = self.previousNames.get(gene.ID)
+            match = GENE_NAME_PATTERN.match(previousName) if previousName in self.previousBlocks else None
+            if match is None or int(match.group(1)) != gene.seqid:
+                gene.status = 'added'
+                numbers.append(None)
+            else:
+                gene.status = 'unchanged' if self.sameModel(gene, self.previousBlocks[previousName]) else 'changed'
+                numbers.append(int(match.group(2)))
+        self.numberAddedGenes(numbers, usedNumbers)
+        counts = dict.fromkeys(['unchanged', 'changed', 'added'], 0)
+        for gene, genenum in zip(self.sortedGenes, numbers):
+            counts[gene.status] += 1
+            if gene.status == 'added':
+                name = self.formatGeneName(gene.seqid, genenum, seqid_width, genenum_width)
+            else:
+                name = self.previousNames[gene.ID]
+            self.nameKeptGene(gene, name)
+        # previous mappings gone now
+        for featureId, previousName in self.previousNames.items():
+            if featureId not in self.id2nameMap:
+                self.delta.append(('removed', featureId, '', previousName))
+        self.metrics.count('names', len(self.id2nameMap))
+        self.logger.info("{0} unchanged, {1} changed and {2} new genes, {3} changes in the ID<->Name map.".format(
+            counts['unchanged'], counts['changed'], counts['added'], len(self.delta)))
+        
+    
+    def numberAddedGenes(self, numbers, usedNumbers):
+        """fill in the None gene numbers (in sorted gene order) with unused numbers between the
+           genes around them, spread out evenly. After the last kept gene, GENE_COUNTER_STEP apart."""
+        # lowest kept number from each gene on
+        following = [None] * (len(numbers) + 1)
+        for i in reversed(xrange(len(numbers))):
+            following[i] = following[i + 1]
+            if numbers[i] is not None and (following[i] is None or numbers[i] < following[i]):
+                following[i] = numbers[i]
+        lower = GENE_COUNTER_START - GENE_COUNTER_STEP
+        i = 0
+        while i < len(numbers):
+            if numbers[i] is not None:
+                lower = max(lower, numbers[i])
+                i += 1
+                continue
+            # run of new genes i..j-1
+            j = i
+            while j < len(numbers) and numbers[j] is None:
+                j += 1
+            count = j - i
+            upper = following[j] if following[j] is not None else lower + GENE_COUNTER_STEP*(count + 1)
+            free = [genenum for genenum in xrange(lower + 1, upper) if genenum not in usedNumbers]
+            if len(free) < count:
+                geneId = self.sortedGenes[i].ID
+                self.logger.error("No room for {0} new genes from {1} between gene numbers {2} and {3}. Run without --previous to renumber all genes.".format(count, geneId, lower, upper))
+                raise Exception("No room for {0} new genes from {1} between gene numbers {2} and {3}. Run without --previous to renumber all genes.".format(count, geneId, lower, upper))
+            for k in xrange(count):
+                numbers[i + k] = free[(k + 1)*len(free) // (count + 1)]
+            lower = numbers[j - 1]
+            i = j
+        
+    
+    def nameKeptGene(self, gene, name):
+        """give a gene its display name and its mRNA/tRNA features theirs - previous names where
+           still valid, else the next isoform numbers"""
+        gene.Name = name
+        self.id2nameMap[gene.ID] = name
+        previousName = self.previousNames.get(gene.ID, '')
+        if gene.status == 'added' and previousName:
+            self.delta.append(('renamed', gene.ID, name, previousName))
+        elif gene.status == 'added':
+            self.delta.append(('added', gene.ID, name, ''))
+        elif gene.status == 'changed':
+            self.delta.append(('modified', gene.ID, name, previousName))
+        # isoform numbers used before, of transcripts still there or not
+        isoforms = [0]
+        for line in self.previousBlocks.get(name, []):
+            columns = line.split('\t')
+            if columns[2] in ['mRNA', 'tRNA']:
+                isoform = get_GFF_attribute(columns[8].rstrip('\n'), 'ID', '').rpartition('.')[2]
+                if isoform.isdigit():
+                    isoforms.append(int(isoform))
+        nextIsoform = max(isoforms) + 1
+        for transcript in sorted(gene.children, key=lambda x: (len(x.ID), x.ID)):
+            childName = self.previousNames.get(transcript.ID, '')
+            if gene.status == 'added' or not childName.startswith(name + '.'):
+                transcript.Name = "{0}.{1}".format(name, nextIsoform)
+                nextIsoform += 1
+                self.delta.append(('renamed' if childName else 'added', transcript.ID, transcript.Name, childName))
+            else:
+                transcript.Name = childName
+            self.id2nameMap[transcript.ID] = transcript.Name
+        
+    
+    @timedPhase('write')
+    def writeGff3(self):
+        """writes the output gff3 - unchanged genes as in the previous output - and the ID<->Name delta"""
+        self.createDisplayName()
+        self.logger.info("Writing gff3 records with new IDs & display names to output file: %s..." % self.outputFile)
+        outputfile = GFF3Writer(self.outputFile)
+        outputfile.write(GFF_HEADER + '\n')
+        for gene in self.sortedGenes:
+            if gene.status == 'unchanged':
+                for line in self.previousBlocks[gene.Name]:
+                    outputfile.write(line)
+                outputfile.recordCount += len(gene.records)
+            else:
+                for record in gene.records:
+                    self.renameRecord(record)
+                    outputfile.writeRecord(record)
+        outputfile.close()
+        self.recordsWritten = outputfile.recordCount
+        self.metrics.count('records', outputfile.recordCount)
+        self.logger.info("{0} records written to output gff3 file: {1}".format(outputfile.recordCount, self.outputFile))
+        outputfile = open(self.deltaOutputFile, 'w')
+        for change in self.delta:
+            outputfile.write("\t".join(change) + "\n")
+        outputfile.close()
+        self.logger.info("{0} ID<->Name changes written to output file: {1}".format(len(self.delta), self.deltaOutputFile))
+        self.writeMaps()
+
+
+
+def run():
+    """run the analysis"""
+
+    parser = argparse.ArgumentParser(
+        description="Command line tool to create display names for gene and mRNA/tRNA features in GFF3",
+        epilog=textwrap.dedent('''\
+                                  
+Example:
+python %(prog)s -i input.gff3 -o /temp/output.gff3 -r 20 \
+--seqid 'ZmChr(?P<num>\d+)v2' -a 219 -l /temp/log.txt \
+'''),
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    # Mandatory arguments
+    parser.add_argument(
+        '-i', dest='inputFile', required=True, help="REQUIRED: input gff3 file.")
+    parser.add_argument(
+        '-o', dest='outputFile', required=True, help="REQUIRED: output gff3 file. Full path.")
+    parser.add_argument(
+        '-r', dest='gsapRunId', required=True, help="REQUIRED: GSAP run_id.")
+    parser.add_argument(
+        '--seqid', dest='seqIdRegex', required=True,
+        help="REQUIRED: Regex to match the seqid and extract the sequence number. \
+Ex: 'ZmChr(?P<num>\d+)v2' for ZmChr01v2. \
+Match the (?P<num>\d+) group, as is, with where the seq numbers appear in seqid.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        '-a', dest='assemblyId', type=int, help='Assembly ID from GAIA Genome Repo.')
+    group.add_argument(
+        '-t', dest='taxonId', type=int, help='Internal Taxon ID from Taxon Repo.')
+    group.add_argument(
+        '-s', dest='sciName', type=str, help='exact Scientific name. One of {-a, -t, -s} REQUIRED.')
+    parser.add_argument(
+        '-l', dest='logFile', help="log file, full path. Default: stderr.")
+    parser.add_argument(
+        '--table', dest='useTable', action='store_true',
+        help="keep parsed records in a columnar table (NumPy) instead of one object per line. \
+Much lower memory for large annotations.")
+    parser.add_argument(
+        '--cache', dest='useCache', action='store_true',
+        help="reuse a binary parse cache of the input file (input.gff3.gff3cache), \
+building it on the first run. Rebuilt automatically when the input changes.")
+    parser.add_argument(
+        '-w', dest='workers', type=int, default=1,
+        help="parse the input in this many processes. Input must be uncompressed or BGZF \
+(bgzip); regular gzip is parsed in one process. Default: 1.")
+    # the modes replace each other: at most one of them.
+    modeGroup = parser.add_mutually_exclusive_group()
+    modeGroup.add_argument(
+        '--stream', dest='stream', action='store_true',
+        help="two-pass streaming mode: never holds all records, memory grows with the number of genes. \
+Needs each gene's features right after it, and uncompressed or BGZF input. \
+--table, --cache and -w do not apply.")
+    modeGroup.add_argument(
+        '--external-sort', dest='externalSort', action='store_true',
+        help="out-of-core mode: sort gene blocks in runs on disk and merge them while writing. \
+For assemblies whose genes do not fit in memory. Same input needs as --stream, gzip allowed.")
+    parser.add_argument(
+        '--sort-memory', dest='sortMemory', type=int, default=512,
+        help="--external-sort: MB of gene blocks to hold before spilling a sorted run. Default: 512.")
+    parser.add_argument(
+        '--tmpdir', dest='tempDir',
+        help="--external-sort, --sharded: directory for the sorted runs / shard files. Default: output file dir.")
+    modeGroup.add_argument(
+        '--sharded', dest='sharded', action='store_true',
+        help="name and write genes in -w processes, in shards of seqids, concatenated in order. \
+Same output as without.")
+    modeGroup.add_argument(
+        '--previous', dest='previousOutput',
+        help="incremental mode: output gff3 of a previous run (its _id2nameMap and _seqidMap next to it). \
+Unchanged genes keep their names and records, new genes are numbered in between, \
+changes go to the output _id2nameDelta file.")
+    parser.add_argument(
+        '--name-store', dest='nameStore',
+        help="also load the ID<->Name mappings into this SQLite store (created if missing), \
+as run -r. See namestore for lookups.")
+    parser.add_argument(
+        '--species-cache', dest='speciesCacheFile', default=SPECIESCODE_CACHE_FILE,
+        help="JSON file caching species code lookups between runs. Default: %(default)s.")
+    parser.add_argument(
+        '--no-species-cache', dest='speciesCacheFile', action='store_const', const=None,
+        help="always ask the species code services, do not read or write the cache.")
+    parser.add_argument(
+        '--species-cache-days', dest='speciesCacheDays', type=float, default=SPECIESCODE_CACHE_TTL / 86400.0,
+        help="look cached species codes up again after this many days. Default: %(default)s.")
+    parser.add_argument(
+        '--offline', dest='offline', action='store_true',
+        help="make no network calls: the species code must be in the cache (expired entries are used).")
+    parser.add_argument(
+        '--timeout', dest='serviceTimeout', type=float, default=SERVICE_TIMEOUT,
+        help="seconds to wait for a species code service. Default: %(default)s.")
+    parser.add_argument(
+        '--retries', dest='serviceRetries', type=int, default=SERVICE_RETRIES,
+        help="retries after a service timeout or connection error, with exponential backoff. Default: %(default)s.")
+    parser.add_argument(
+        '--assembly-api', dest='assemblyApi', default=GAIA_ASSEMBLY_API,
+        help="GAIA Genome Repo assemblies URL, assembly id is appended. Default: %(default)s.")
+    parser.add_argument(
+        '--taxon-api', dest='taxonApi', default=SPECIESCODE_TAXON_API,
+        help="species code by taxon id URL, taxon id is appended. Default: %(default)s.")
+    parser.add_argument(
+        '--sciname-api', dest='scinameApi', default=SPECIESCODE_SCINAME_API,
+        help="species code by scientific name URL, name is appended. Default: %(default)s.")
+    parser.add_argument(
+        '--metrics', dest='metrics', action='store_true',
+        help="write per-phase wall/CPU time, peak memory and rates to <output>_metrics.json. \
+The phases are logged either way.")
+    parser.add_argument(
+        '--profile', dest='profileDir',
+        help="cProfile each phase into <phase>.prof files in this dir (slower). Read them with pstats.")
+
+   
+    args = parser.parse_args()
+
+    # open log file first
+    logFh = None
+    if not args.logFile:
+        logFh = sys.stderr
+    else:
+        logFh = open(args.logFile, 'a', 0) # no buffering.
+    logger = phi.Logger.Logger(DN_ANALYSIS_NAME, logFh)
+
+    # parsing options
+    inputFile = args.inputFile
+    outputFile = args.outputFile
+
+    if outputFile[0] != '/':
+        logger.error("output file %s in not in full path" % outputFile)
+        sys.stderr.write("output file %s in not in full path\n" % outputFile)
+        exit(1)
+
+    
+    # running command
+    logger.info("The command is as below (quotes might have been removed \
+when restoring the command):\n%s" % ' '.join(sys.argv))
+
+    # name store and species code lookup options
+    lookupOptions = dict(nameStore=args.nameStore,
+                         metrics=args.metrics,
+                         profileDir=args.profileDir,
+                         speciesCacheFile=args.speciesCacheFile,
+                         speciesCacheTtl=args.speciesCacheDays * 86400,
+                         serviceTimeout=args.serviceTimeout,
+                         serviceRetries=args.serviceRetries,
+                         offline=args.offline,
+                         assemblyApi=args.assemblyApi,
+                         taxonApi=args.taxonApi,
+                         scinameApi=args.scinameApi)
+
+    try:
+        if args.externalSort:
+            analysisObj = ExternalSortDisplayName(inputFile, outputFile, args.gsapRunId,
+                args.seqIdRegex, args.assemblyId, args.taxonId, args.sciName, logger,
+                memoryBudget=args.sortMemory, tempDir=args.tempDir, **lookupOptions)
+        elif args.previousOutput:
+            analysisObj = IncrementalDisplayName(inputFile, outputFile, args.gsapRunId,
+                args.seqIdRegex, args.assemblyId, args.taxonId, args.sciName, logger,
+                args.useTable, args.useCache, args.workers, previousOutput=args.previousOutput, **lookupOptions)
+        elif args.sharded:
+            analysisObj = ShardedDisplayName(inputFile, outputFile, args.gsapRunId,
+                args.seqIdRegex, args.assemblyId, args.taxonId, args.sciName, logger,
+                args.useTable, args.useCache, args.workers, tempDir=args.tempDir, **lookupOptions)
+        elif args.stream:
+            analysisObj = StreamingDisplayName(inputFile, outputFile, args.gsapRunId,
+                args.seqIdRegex, args.assemblyId, args.taxonId, args.sciName, logger, **lookupOptions)
+        else:
+            analysisObj = DisplayName(inputFile, outputFile, args.gsapRunId,
+                args.seqIdRegex, args.assemblyId, args.taxonId, args.sciName, logger,
+                args.useTable, args.useCache, args.workers, **lookupOptions)
+        analysisObj.writeGff3()
+
+    except:
+        import traceback
+        stackTrace = traceback.format_exc()  # + any additional info.
+        # log the error
+        logger.error(stackTrace)
+
+        raise
+
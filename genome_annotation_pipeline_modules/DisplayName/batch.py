@@ -0,0 +1,219 @@
+"""
+Run DisplayName over many GFF3 files in a pool of processes.
+
+The manifest is tab-separated, one file per line ('#' lines are comments):
+
+    input   output   runId   seqid regex   organism
+
+organism is assembly:<id>, taxon:<id> or sciname:<scientific name>. Relative
+paths are taken from the manifest's directory. Each distinct organism is
+looked up once, before any file is run, and files whose species code cannot
+be found fail without stopping the others.
+
+Every file logs to <output>.log. The summary (--summary, default
+<manifest>.summary) has one line per manifest line, in manifest order:
+status, seconds, records and ID<->Name mappings written, and the error if any.
+
+Example:
+python -m DisplayName.batch release.manifest -p 8 --table -l /temp/batch.log
+"""
+import os
+import sys
+import time
+import argparse
+import traceback
+from multiprocessing import Pool, cpu_count
+import phi.Logger
+from .DisplayName import DisplayName, StreamingDisplayName, ExternalSortDisplayName
+from .DN_Constants import DN_ANALYSIS_NAME, SPECIESCODE_CACHE_FILE, SPECIESCODE_CACHE_TTL, \
+    SERVICE_TIMEOUT, SERVICE_RETRIES
+
+MANIFEST_COLUMNS = ['input', 'output', 'runId', 'seqIdRegex', 'organism']
+SUMMARY_COLUMNS = ['input', 'output', 'runId', 'organism', 'speciesCode', 'status',
+                   'seconds', 'records', 'names', 'error']
+# organism kind -> DisplayName method looking its species code up
+ORGANISM_LOOKUPS = {'assembly': 'speciescode_by_assemblyid',
+                    'taxon': 'speciescode_by_taxonid',
+                    'sciname': 'speciescode_by_sciname'}
+# DisplayName class per batch mode
+MODE_CLASSES = {'memory': DisplayName,
+                'stream': StreamingDisplayName,
+                'external': ExternalSortDisplayName}
+
+
+def readManifest(filename):
+    """manifest lines as dicts with MANIFEST_COLUMNS keys, paths made absolute"""
+    baseDir = os.path.dirname(os.path.abspath(filename))
+    entries = []
+    with open(filename) as fh:
+        for lineNum, line in enumerate(fh, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            if len(fields) != len(MANIFEST_COLUMNS):
+                raise ValueError("Manifest {0} line {1}: expected {2} tab-separated columns ({3}), found {4}".format(
+                    filename, lineNum, len(MANIFEST_COLUMNS), ', '.join(MANIFEST_COLUMNS), len(fields)))
+            entry = dict(zip(MANIFEST_COLUMNS, [field.strip() for field in fields]))
+            kind = entry['organism'].split(':', 1)[0]
+            if kind not in ORGANISM_LOOKUPS or ':' not in entry['organism']:
+                raise ValueError("Manifest {0} line {1}: organism must be assembly:<id>, taxon:<id> or sciname:<name>, found: {2}".format(
+                    filename, lineNum, entry['organism']))
+            entry['input'] = os.path.join(baseDir, entry['input'])
+            entry['output'] = os.path.join(baseDir, entry['output'])
+            entries.append(entry)
+    return entries
+
+
+def _runEntry(task):
+    """worker: run DisplayName on one manifest entry, returns its summary line as a dict"""
+    index, entry, mode, options = task
+    summary = dict((column, entry.get(column, '')) for column in SUMMARY_COLUMNS)
+    summary.update(status='failed', seconds=0, records=0, names=0)
+    if entry.get('error'):
+        return index, summary
+    startTime = time.time()
+    try:
+        logFh = open(entry['output'] + '.log', 'a', 0)
+    except IOError as e:
+        summary['error'] = "Could not open log file: {0}".format(e)
+        return index, summary
+    logger = phi.Logger.Logger(DN_ANALYSIS_NAME, logFh)
+    try:
+        analysisObj = MODE_CLASSES[mode](entry['input'], entry['output'], entry['runId'], entry['seqIdRegex'],
+                                         logger=logger, speciesCode=entry['speciesCode'], **options)
+        analysisObj.writeGff3()
+        summary.update(status='ok', records=analysisObj.recordsWritten, names=analysisObj.namesWritten)
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        summary['error'] = str(e)
+    finally:
+        logFh.close()
+    summary['seconds'] = round(time.time() - startTime, 2)
+    return index, summary
+
+
+class DisplayNameBatch(object):
+    """runs DisplayName on every entry of a manifest - see module docstring"""
+
+    def __init__(self, manifestFile, logger, summaryFile=None, processes=None, mode='memory',
+                 options=None, lookupOptions=None):
+        self.manifestFile = manifestFile
+        self.summaryFile = summaryFile or manifestFile + '.summary'
+        self.processes = processes or cpu_count()
+        self.logger = logger # required: the DisplayName species code lookups log through it too
+        self.mode = mode # key of MODE_CLASSES
+        self.options = options or {} # DisplayName options for every file, e.g. useTable
+        self.lookupOptions = lookupOptions or {} # species code cache/service options
+        self.entries = []
+        self.summaries = []
+
+    def lookupSpeciesCodes(self):
+        """species code of every distinct organism in the manifest, each looked up once.
+           Entries whose lookup fails get an error instead."""
+        lookup = DisplayName(logger=self.logger, **self.lookupOptions)
+        codes = {}
+        for entry in self.entries:
+            organism = entry['organism']
+            if organism not in codes:
+                kind, key = organism.split(':', 1)
+                try:
+                    codes[organism] = (getattr(lookup, ORGANISM_LOOKUPS[kind])(key), '')
+                    self.logger.info("Species code for {0}: {1}".format(organism, codes[organism][0]))
+                except Exception as e:
+                    codes[organism] = ('', "Species code lookup failed for {0}: {1}".format(organism, e))
+            entry['speciesCode'], entry['error'] = codes[organism]
+        self.logger.info("Looked up {0} species codes for {1} files".format(len(codes), len(self.entries)))
+
+    def run(self):
+        """look species codes up, run all entries and write the summary. Returns the number of failed entries."""
+        self.entries = readManifest(self.manifestFile)
+        self.logger.info("{0} files in manifest: {1}".format(len(self.entries), self.manifestFile))
+        self.lookupSpeciesCodes()
+        tasks = [(index, entry, self.mode, self.options) for index, entry in enumerate(self.entries)]
+        results = [None] * len(tasks)
+        startTime = time.time()
+        if tasks:
+            pool = Pool(min(self.processes, len(tasks)))
+            try:
+                for index, summary in pool.imap_unordered(_runEntry, tasks):
+                    results[index] = summary
+                    self.logger.info("{0} {1}: {2} records in {3}s {4}".format(
+                        summary['status'], summary['input'], summary['records'], summary['seconds'], summary['error']))
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        self.summaries = results
+        self.writeSummary()
+        failed = sum(1 for summary in results if summary['status'] != 'ok')
+        self.logger.info("{0} files done, {1} failed, in {2:.1f}s with {3} processes. Summary: {4}".format(
+            len(results), failed, time.time() - startTime, self.processes, self.summaryFile))
+        return failed
+
+    def writeSummary(self):
+        """summary lines, in manifest order, to summaryFile"""
+        with open(self.summaryFile, 'w') as fh:
+            fh.write('#' + '\t'.join(SUMMARY_COLUMNS) + '\n')
+            for summary in self.summaries:
+                fh.write('\t'.join(str(summary[column]).replace('\t', ' ').replace('\n', ' ')
+                                   for column in SUMMARY_COLUMNS) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DisplayName on every GFF3 file of a manifest, in parallel")
+    parser.add_argument('manifest', help="tab-separated: input, output, runId, seqid regex, organism \
+(assembly:<id>, taxon:<id> or sciname:<name>)")
+    parser.add_argument('-p', dest='processes', type=int, default=cpu_count(),
+                        help="files run at once. Default: %(default)s.")
+    parser.add_argument('--summary', dest='summaryFile', help="summary file. Default: <manifest>.summary.")
+    parser.add_argument('-l', dest='logFile', help="batch log file, full path. Default: stderr.")
+    parser.add_argument('--table', dest='useTable', action='store_true', help="as DisplayName --table")
+    parser.add_argument('--cache', dest='useCache', action='store_true', help="as DisplayName --cache")
+    parser.add_argument('--stream', dest='stream', action='store_true', help="as DisplayName --stream")
+    parser.add_argument('--external-sort', dest='externalSort', action='store_true',
+                        help="as DisplayName --external-sort")
+    parser.add_argument('--sort-memory', dest='sortMemory', type=int, default=512,
+                        help="as DisplayName --sort-memory, per process. Default: %(default)s.")
+    parser.add_argument('--name-store', dest='nameStore', help="as DisplayName --name-store")
+    parser.add_argument('--metrics', dest='metrics', action='store_true',
+                        help="as DisplayName --metrics: <output>_metrics.json per file")
+    parser.add_argument('--species-cache', dest='speciesCacheFile', default=SPECIESCODE_CACHE_FILE,
+                        help="as DisplayName --species-cache. Default: %(default)s.")
+    parser.add_argument('--species-cache-days', dest='speciesCacheDays', type=float,
+                        default=SPECIESCODE_CACHE_TTL / 86400.0, help="as DisplayName --species-cache-days")
+    parser.add_argument('--offline', dest='offline', action='store_true', help="as DisplayName --offline")
+    parser.add_argument('--timeout', dest='serviceTimeout', type=float, default=SERVICE_TIMEOUT,
+                        help="as DisplayName --timeout")
+    parser.add_argument('--retries', dest='serviceRetries', type=int, default=SERVICE_RETRIES,
+                        help="as DisplayName --retries")
+    args = parser.parse_args()
+
+    logFh = sys.stderr if not args.logFile else open(args.logFile, 'a', 0)
+    logger = phi.Logger.Logger(DN_ANALYSIS_NAME, logFh)
+    logger.info("The command is as below (quotes might have been removed \
+when restoring the command):\n%s" % ' '.join(sys.argv))
+
+    if args.externalSort:
+        mode, options = 'external', {'memoryBudget': args.sortMemory}
+    elif args.stream:
+        mode, options = 'stream', {}
+    else:
+        mode, options = 'memory', {'useTable': args.useTable, 'useCache': args.useCache}
+    options['nameStore'] = args.nameStore
+    options['metrics'] = args.metrics
+    lookupOptions = dict(speciesCacheFile=args.speciesCacheFile,
+                         speciesCacheTtl=args.speciesCacheDays * 86400,
+                         serviceTimeout=args.serviceTimeout,
+                         serviceRetries=args.serviceRetries,
+                         offline=args.offline)
+    batch = DisplayNameBatch(args.manifest, logger, args.summaryFile, args.processes, mode, options, lookupOptions)
+    try:
+        failed = batch.run()
+    except:
+        logger.error(traceback.format_exc())
+        raise
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Benchmarks for the GFF3 parser and DisplayName.
+
+unquote: lines/sec of parse_GFF3 column tokenization and of attribute decoding,
+with and without the '%' fast path (fastUnquote).
+filter: lines/sec of a first-pass scan collecting gene coordinates, filtering
+after parsing every line (before) and with parse_GFF3(types=...) (after).
+generate: write a synthetic GFF3 file (see generate_GFF3).
+displayname: time parse_GFF3 and each DisplayName phase on its own, with
+lines/sec and peak RSS. The species code services are stubbed out.
+rename: lines/sec of renaming and formatting the named records of a file,
+decoding every attribute column (before) and rewriting the column text with
+DisplayName.renameRecord (after). Most lines of exon-heavy annotations are
+exon/CDS/UTR features, renamed from their parent's name.
+
+Example:
+python -m DisplayName.benchmark unquote annotation.gff3 -n 3
+python -m DisplayName.benchmark filter annotation.gff3 -n 3
+python -m DisplayName.benchmark generate synthetic.gff3 --genes 50000 --seed 1
+python -m DisplayName.benchmark displayname synthetic.gff3 --genes 50000 > results.json
+python -m DisplayName.benchmark rename exons.gff3 --genes 20000 --max-exons 30 -n 3
+"""
+import argparse
+import copy
+import gzip
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import time
+from .gff3parser import GFF3Record, parse_GFF3, parse_GFF_attributes, format_GFF3_line
+
+# species code returned by the stubbed species code services
+STUB_SPECIES_CODE = 'Zm'
+# DisplayName phases in call order - each calls the one before it
+DISPLAYNAME_PHASES = ['parseGff3FixDupIDs', 'buildGeneSet', 'createDisplayName', 'writeGff3']
+
+
+def time_call(func, repeat):
+    """best wall time in seconds of func() over repeat runs, and its return value"""
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def benchmark_unquote(filename, repeat=3):
+    """time parse_GFF3 and parse_GFF_attributes with fastUnquote off (before) and on (after)"""
+    def tokenize(fastUnquote):
+        recordCount = 0
+        for record in parse_GFF3(filename, fastUnquote=fastUnquote):
+            recordCount += 1
+        return recordCount
+
+    # attribute columns are read once up front, so only the decoding is timed
+    attributeStrings = [record.rawAttributes for record in parse_GFF3(filename)]
+    def decode(fastUnquote):
+        for attributeString in attributeStrings:
+            parse_GFF_attributes(attributeString, fastUnquote)
+        return len(attributeStrings)
+
+    results = {'file': filename, 'repeat': repeat}
+    for label, func in [('tokenize', tokenize), ('attributes', decode)]:
+        for mode, fastUnquote in [('before', False), ('after', True)]:
+            seconds, lineCount = time_call(lambda: func(fastUnquote), repeat)
+            results['{0}_{1}'.format(label, mode)] = {
+                'lines': lineCount,
+                'seconds': round(seconds, 3),
+                'lines_per_sec': int(lineCount / seconds) if seconds else None
+            }
+    return results
+
+
+def benchmark_filter(filename, repeat=3):
+    """time collecting (seqid, start, end, ID) of all genes with and without the types filter"""
+    openFunc = gzip.open if filename.endswith(".gz") else open
+    with openFunc(filename) as fh:
+        lineCount = sum(1 for line in fh)
+
+    def scan(filtered):
+        records = parse_GFF3(filename, types=['gene']) if filtered else \
+            (record for record in parse_GFF3(filename) if record.type == 'gene')
+        return [(record.seqid, record.start, record.end, record.getAttribute('ID')) for record in records]
+
+    results = {'file': filename, 'repeat': repeat, 'lines': lineCount}
+    for mode, filtered in [('before', False), ('after', True)]:
+        seconds, genes = time_call(lambda: scan(filtered), repeat)
+        results['gene_scan_{0}'.format(mode)] = {
+            'genes': len(genes),
+            'seconds': round(seconds, 3),
+            'lines_per_sec': int(lineCount / seconds) if seconds else None
+        }
+    return results
+
+
+def generate_GFF3(filename, genes=10000, seed=1, sequences=10, unplaced=5,
+                  maxIsoforms=4, maxExons=8, duplicateFraction=0.01, escapedFraction=0.05):
+    """
+    Write a synthetic annotation to filename (gzip if it ends in .gz) and return its line count.
+    Genes are laid out along sequences in order, as in a real annotation:
+        gene > mRNA (sometimes tRNA) isoforms > exon, CDS, five/three_prime_UTR
+    with child IDs in the parentId.exon1, parentId.cds1, parentId.utr5p1 form.
+    sequences: ZmChr01v2-style seqids matching the usual --seqid regex,
+    unplaced: scaffold seqids that do not match it.
+    duplicateFraction: genes reusing an earlier gene's ID (and so its transcript IDs).
+    escapedFraction: features with percent-escaped characters in their attributes.
+    """
+    rng = random.Random(seed)
+    seqids = ['ZmChr{0:02d}v2'.format(i + 1) for i in xrange(sequences)] + \
+        ['scaffold_{0}'.format(i + 1) for i in xrange(unplaced)]
+    # genes spread over the sequences, more on the chromosomes
+    weights = [10] * sequences + [1] * unplaced
+    counts = [0] * len(seqids)
+    for i in xrange(genes):
+        counts[_weighted_choice(rng, weights)] += 1
+    escapes = ['a%3Bb', 'x%2Cy', 'k%3Dv', 'gene%20model', '50%25']
+
+    def note():
+        if rng.random() < escapedFraction:
+            return ';Note=' + rng.choice(escapes)
+        return ''
+
+    openFunc = gzip.open if filename.endswith('.gz') else open
+    geneIds = []
+    lineCount = 1
+    with openFunc(filename, 'wb') as out:
+        out.write('##gff-version 3\n')
+        for seqid, count in zip(seqids, counts):
+            position = rng.randint(1, 5000)
+            for i in xrange(count):
+                if geneIds and rng.random() < duplicateFraction:
+                    geneId = rng.choice(geneIds)
+                else:
+                    geneId = 'GRMZM{0:07d}'.format(len(geneIds) + 1)
+                    geneIds.append(geneId)
+                strand = rng.choice('+-')
+                exonCount = rng.randint(1, maxExons)
+                exons = []
+                start = position
+                for e in xrange(exonCount):
+                    exonStart = start + rng.randint(50, 2000) if e else start
+                    exonEnd = exonStart + rng.randint(50, 600)
+                    exons.append((exonStart, exonEnd))
+                    start = exonEnd
+                geneStart, geneEnd = exons[0][0], exons[-1][1]
+                lines = ['\t'.join([seqid, 'maker', 'gene', str(geneStart), str(geneEnd), '.', strand, '.',
+                                    'ID={0};Name={0}{1}'.format(geneId, note())])]
+                for t in xrange(rng.randint(1, maxIsoforms)):
+                    transcriptId = '{0}_T{1:02d}'.format(geneId, t + 1)
+                    transcriptType = 'tRNA' if rng.random() < 0.05 else 'mRNA'
+                    # isoforms skip some of the inner exons
+                    isoform = [exon for k, exon in enumerate(exons)
+                               if k in (0, exonCount - 1) or not t or rng.random() < 0.7]
+                    lines.append('\t'.join([seqid, 'maker', transcriptType, str(isoform[0][0]), str(isoform[-1][1]),
+                                            '{0:.2f}'.format(rng.random()), strand, '.',
+                                            'ID={0};Parent={1}{2}'.format(transcriptId, geneId, note())]))
+                    lines.extend(_transcript_parts(rng, seqid, strand, transcriptId, isoform, note))
+                lines.append('')
+                out.write('\n'.join(lines))
+                lineCount += len(lines) - 1
+                position = geneEnd + rng.randint(1000, 50000)
+    return lineCount
+
+
+def _weighted_choice(rng, weights):
+    pick = rng.random() * sum(weights)
+    for i, weight in enumerate(weights):
+        pick -= weight
+        if pick < 0:
+            return i
+    return len(weights) - 1
+
+
+def _transcript_parts(rng, seqid, strand, transcriptId, exons, note):
+    """exon, CDS and UTR lines of one transcript"""
+    lines = []
+    # coding part: from inside the first exon to inside the last one
+    cdsStart = rng.randint(exons[0][0], exons[0][1])
+    cdsEnd = rng.randint(max(exons[-1][0], cdsStart), exons[-1][1])
+    leftUtr, rightUtr = ('five_prime_UTR', 'utr5p') , ('three_prime_UTR', 'utr3p')
+    if strand == '-':
+        leftUtr, rightUtr = rightUtr, leftUtr
+    phase = 0
+    for k, (exonStart, exonEnd) in enumerate(exons):
+        lines.append('\t'.join([seqid, 'maker', 'exon', str(exonStart), str(exonEnd), '.', strand, '.',
+                                'ID={0}.exon{1};Parent={0}{2}'.format(transcriptId, k + 1, note())]))
+    parts = []
+    for k, (exonStart, exonEnd) in enumerate(exons):
+        if exonStart < cdsStart:
+            parts.append((leftUtr, exonStart, min(exonEnd, cdsStart - 1)))
+        if exonEnd >= cdsStart and exonStart <= cdsEnd:
+            parts.append((('CDS', 'cds'), max(exonStart, cdsStart), min(exonEnd, cdsEnd)))
+        if exonEnd > cdsEnd:
+            parts.append((rightUtr, max(exonStart, cdsEnd + 1), exonEnd))
+    numbers = {}
+    for (featureType, suffix), start, end in parts:
+        if start > end:
+            continue
+        numbers[suffix] = numbers.get(suffix, 0) + 1
+        if featureType == 'CDS':
+            column = str(phase)
+            phase = (phase - (end - start + 1)) % 3
+        else:
+            column = '.'
+        lines.append('\t'.join([seqid, 'maker', featureType, str(start), str(end), '.', strand, column,
+                                'ID={0}.{1}{2};Parent={0}'.format(transcriptId, suffix, numbers[suffix])]))
+    return lines
+
+
+def peak_rss_mb():
+    """peak resident memory of this process so far, in MB (ru_maxrss is KB on Linux)"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def benchmark_displayname(filename, outputFile=None, seqIdRegex=r'ZmChr(?P<num>\d+)v2', **options):
+    """
+    time parse_GFF3 alone, then each DisplayName phase exclusive of the phases it calls,
+    in one run. options go to DisplayName (useTable, useCache, workers).
+    Peak RSS is the process peak at the end of each phase, so it only grows.
+    """
+    # DisplayName needs the pipeline environment (phi) - only imported for this benchmark
+    from .DisplayName import DisplayName
+
+    lineCount = 0
+    startTime = time.time()
+    for record in parse_GFF3(filename):
+        lineCount += 1
+    parseSeconds = time.time() - startTime
+    results = {'file': filename, 'records': lineCount, 'options': options,
+               'parse_GFF3': _throughput(lineCount, parseSeconds)}
+    results['parse_GFF3']['peak_rss_mb'] = peak_rss_mb()
+
+    removeOutput = outputFile is None
+    if outputFile is None:
+        fd, outputFile = tempfile.mkstemp(suffix='.gff3')
+        os.close(fd)
+    logger = logging.getLogger('displayName.benchmark')
+    logger.addHandler(logging.NullHandler())
+    analysis = DisplayName(filename, os.path.abspath(outputFile), 'bench', seqIdRegex,
+                           scientificName='Zea mays', logger=logger, **options)
+    # local stand-ins for the species code services
+    stub = lambda key: STUB_SPECIES_CODE
+    analysis.speciescode_by_assemblyid = analysis.speciescode_by_taxonid = analysis.speciescode_by_sciname = stub
+
+    phases = {}
+    running = []  # time spent in nested phases, per phase being timed
+    def timed(name, method):
+        def wrapper():
+            running.append(0.0)
+            start = time.time()
+            try:
+                return method()
+            finally:
+                elapsed = time.time() - start
+                nested = running.pop()
+                if running:
+                    running[-1] += elapsed
+                phases[name] = _throughput(lineCount, elapsed - nested)
+                phases[name]['peak_rss_mb'] = peak_rss_mb()
+        return wrapper
+    for name in DISPLAYNAME_PHASES:
+        setattr(analysis, name, timed(name, getattr(analysis, name)))
+
+    startTime = time.time()
+    try:
+        analysis.writeGff3()
+    finally:
+        if removeOutput:
+            for path in (outputFile, analysis.id2nameOutputFile, analysis.seqidOutputFile):
+                if os.path.exists(path):
+                    os.remove(path)
+    results['DisplayName'] = _throughput(lineCount, time.time() - startTime)
+    results['DisplayName']['peak_rss_mb'] = peak_rss_mb()
+    results['phases'] = phases
+    return results
+
+
+def benchmark_rename(filename, repeat=3, seqIdRegex=r'ZmChr(?P<num>\d+)v2'):
+    """
+    time renaming and formatting every record of filename once DisplayName has named its genes:
+    decoding each attribute column into a dict (before) and DisplayName.renameRecord (after).
+    Each run renames fresh copies of the records, copied outside the timing.
+    """
+    from .DisplayName import DisplayName
+    from .DN_Constants import SOURCE_COLUMN
+
+    logger = logging.getLogger('displayName.benchmark')
+    logger.addHandler(logging.NullHandler())
+    analysis = DisplayName(filename, os.path.abspath(filename + '.bench'), 'bench', seqIdRegex,
+                           scientificName='Zea mays', logger=logger)
+    stub = lambda key: STUB_SPECIES_CODE
+    analysis.speciescode_by_assemblyid = analysis.speciescode_by_taxonid = analysis.speciescode_by_sciname = stub
+    analysis.createDisplayName()
+    # in output order, duplicate ID fixes included
+    original = [record for gene in analysis.sortedGenes for record in gene.records]
+    childCount = sum(1 for record in original if record.type not in ('gene', 'mRNA', 'tRNA'))
+
+    def decoded(record):
+        record.source = SOURCE_COLUMN
+        analysis.renameAttributes(record, record.attributes)
+    modes = [('before', decoded), ('after', analysis.renameRecord)]
+
+    results = {'file': filename, 'repeat': repeat, 'records': len(original), 'child_records': childCount}
+    output = {}
+    for mode, rename in modes:
+        best = None
+        for i in range(repeat):
+            records = [GFF3Record(*[copy.copy(value) for value in record]) for record in original]
+            start = time.time()
+            formatted = []
+            for record in records:
+                rename(record)
+                formatted.append(format_GFF3_line(record))
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        output[mode] = formatted
+        results['rename_' + mode] = _throughput(len(original), best)
+    results['same_output'] = output['before'] == output['after']
+    return results
+
+
+def _throughput(lineCount, seconds):
+    return {'seconds': round(seconds, 3), 'lines_per_sec': int(lineCount / seconds) if seconds else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for gff3parser")
+    parser.add_argument("benchmark", choices=["unquote", "filter", "generate", "displayname", "rename"], help="benchmark to run")
+    parser.add_argument("file", help="The GFF3 input file (.gz allowed). generate: the file to write")
+    parser.add_argument("-n", dest="repeat", type=int, default=3, help="runs per measurement, best is reported")
+    parser.add_argument("--genes", type=int, help="generate/displayname/rename: write a synthetic file with this many genes first")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the synthetic file")
+    parser.add_argument("--max-exons", dest="maxExons", type=int, default=8,
+                        help="most exons per transcript of the synthetic file - raise for exon-heavy annotations")
+    parser.add_argument("--table", dest="useTable", action="store_true", help="displayname: DisplayName --table")
+    parser.add_argument("--cache", dest="useCache", action="store_true", help="displayname: DisplayName --cache")
+    parser.add_argument("-w", dest="workers", type=int, default=1, help="displayname: DisplayName -w")
+    args = parser.parse_args()
+    if args.genes is not None and args.benchmark in ("generate", "displayname", "rename"):
+        generated = {'genes': args.genes, 'seed': args.seed, 'max_exons': args.maxExons,
+                     'lines': generate_GFF3(args.file, args.genes, args.seed, maxExons=args.maxExons),
+                     'bytes': os.path.getsize(args.file)}
+    if args.benchmark == "generate":
+        if args.genes is None:
+            parser.error("generate needs --genes")
+        results = generated
+    elif args.benchmark == "displayname":
+        results = benchmark_displayname(args.file, useTable=args.useTable, useCache=args.useCache,
+                                        workers=args.workers)
+        if args.genes is not None:
+            results['generated'] = generated
+    elif args.benchmark == "rename":
+        results = benchmark_rename(args.file, args.repeat)
+        if args.genes is not None:
+            results['generated'] = generated
+    elif args.benchmark == "unquote":
+        results = benchmark_unquote(args.file, args.repeat)
+    elif args.benchmark == "filter":
+        results = benchmark_filter(args.file, args.repeat)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+if __name__ == "__main__":
+    main()
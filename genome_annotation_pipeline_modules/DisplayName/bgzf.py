@@ -0,0 +1,180 @@
+"""
+Minimal BGZF (blocked gzip, as written by bgzip/htslib) support.
+
+BGZF files are ordinary multi-member gzip files, so gzip.open reads them, but
+each member ("block") is at most 64 KB and records its own compressed size.
+That allows random access through virtual offsets:
+    virtual offset = (compressed offset of the block << 16) | offset within the block
+
+Example:
+reader = BgzfReader('input.gff3.gz')
+offset = reader.tell()
+line = reader.readline()
+reader.seek(offset)
+
+fh.write(compressBlocks(data))    # then fh.write(EOF_BLOCK) at the end
+"""
+import struct
+import zlib
+
+BGZF_MAGIC = '\x1f\x8b\x08\x04'
+# fixed part of a gzip member header: magic, flags, mtime, xfl, os, xlen
+GZIP_HEADER_SIZE = 12
+# crc32 + isize
+GZIP_TRAILER_SIZE = 8
+# most data per block, leaving room for incompressible data to still fit in 64 KB (same as htslib)
+MAX_BLOCK_DATA = 0xff00
+# empty block marking the end of a BGZF file
+EOF_BLOCK = BGZF_MAGIC + '\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+
+def isBgzf(filename):
+    """True if filename starts with a BGZF block"""
+    with open(filename, 'rb') as fh:
+        return _blockSize(fh.read(GZIP_HEADER_SIZE + 6)) is not None
+
+
+def makeVirtualOffset(blockStart, withinBlock):
+    return (blockStart << 16) | withinBlock
+
+
+def splitVirtualOffset(virtualOffset):
+    """(block start, offset within block)"""
+    return virtualOffset >> 16, virtualOffset & 0xFFFF
+
+
+def _blockSize(header):
+    """total size of the BGZF block starting with header, or None if it is not a BGZF block"""
+    if len(header) < GZIP_HEADER_SIZE or header[:4] != BGZF_MAGIC:
+        return None
+    xlen = struct.unpack('<H', header[10:12])[0]
+    extra = header[GZIP_HEADER_SIZE:GZIP_HEADER_SIZE + xlen]
+    # walk the extra subfields for BC
+    pos = 0
+    while pos + 4 <= len(extra):
+        si1, si2, slen = extra[pos], extra[pos + 1], struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+        if si1 == 'B' and si2 == 'C' and slen == 2:
+            return struct.unpack('<H', extra[pos + 4:pos + 6])[0] + 1
+        pos += 4 + slen
+    return None
+
+
+def iterBlocks(filename):
+    """yields (block start, block size, uncompressed size) of every BGZF block in the file,
+    reading headers and trailers only"""
+    with open(filename, 'rb') as fh:
+        blockStart = 0
+        while True:
+            fh.seek(blockStart)
+            header = fh.read(GZIP_HEADER_SIZE + 6)
+            if not header:
+                return
+            blockSize = _blockSize(header)
+            if blockSize is None:
+                raise ValueError("Not a BGZF block at offset {0} of {1}".format(blockStart, filename))
+            # ISIZE - last 4 bytes of the block
+            fh.seek(blockStart + blockSize - 4)
+            dataSize = struct.unpack('<I', fh.read(4))[0]
+            yield blockStart, blockSize, dataSize
+            blockStart += blockSize
+
+
+def compressBlock(data, level=6):
+    """one BGZF block holding data (at most MAX_BLOCK_DATA bytes)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    header = BGZF_MAGIC + '\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + \
+        struct.pack('<H', GZIP_HEADER_SIZE + 6 + len(compressed) + GZIP_TRAILER_SIZE - 1)
+    return header + compressed + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+
+
+def compressBlocks(data, level=6):
+    """data as a run of BGZF blocks. zlib releases the GIL, so this can run in a thread."""
+    return ''.join([compressBlock(data[i:i + MAX_BLOCK_DATA], level)
+                    for i in xrange(0, len(data), MAX_BLOCK_DATA)])
+
+
+class BgzfReader(object):
+    """line reader over a BGZF file with virtual offset tell/seek"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fh = open(filename, 'rb')
+        self.blockStart = 0
+        self.nextBlockStart = 0
+        self.data = ''
+        self.within = 0
+        self._loadBlock(0)
+
+    def _loadBlock(self, blockStart):
+        """decompress the block at blockStart; empty data at end of file"""
+        self.fh.seek(blockStart)
+        header = self.fh.read(GZIP_HEADER_SIZE + 6)
+        self.blockStart = blockStart
+        self.within = 0
+        if not header:
+            self.data = ''
+            self.nextBlockStart = blockStart
+            return
+        blockSize = _blockSize(header)
+        if blockSize is None:
+            raise ValueError("Not a BGZF block at offset {0} of {1}".format(blockStart, self.filename))
+        xlen = struct.unpack('<H', header[10:12])[0]
+        self.fh.seek(blockStart + GZIP_HEADER_SIZE + xlen)
+        compressed = self.fh.read(blockSize - GZIP_HEADER_SIZE - xlen - GZIP_TRAILER_SIZE)
+        self.data = zlib.decompress(compressed, -15)
+        self.nextBlockStart = blockStart + blockSize
+
+    def tell(self):
+        """virtual offset of the next byte to be read"""
+        # at the end of a block - move on to the block actually holding the next byte,
+        # so a line's offset always names the block it starts in
+        while self.within >= len(self.data) and self.nextBlockStart != self.blockStart:
+            self._loadBlock(self.nextBlockStart)
+        return makeVirtualOffset(self.blockStart, self.within)
+
+    def seek(self, virtualOffset):
+        blockStart, within = splitVirtualOffset(virtualOffset)
+        if blockStart != self.blockStart or not self.data:
+            self._loadBlock(blockStart)
+        self.within = within
+
+    def seekBlockEnd(self, blockStart):
+        """position at the last byte of the block at blockStart"""
+        self._loadBlock(blockStart)
+        self.within = max(len(self.data) - 1, 0)
+
+    def readline(self):
+        """next line including its newline, '' at end of file"""
+        pieces = []
+        while True:
+            if self.within >= len(self.data):
+                if self.nextBlockStart == self.blockStart:
+                    # end of file
+                    break
+                self._loadBlock(self.nextBlockStart)
+                continue
+            end = self.data.find('\n', self.within)
+            if end >= 0:
+                pieces.append(self.data[self.within:end + 1])
+                self.within = end + 1
+                break
+            pieces.append(self.data[self.within:])
+            self.within = len(self.data)
+        return ''.join(pieces)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self):
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,130 @@
+"""
+Persistent binary parse cache for GFF3 files.
+
+A parsed GFF3Table is saved next to its input as a sidecar directory
+(input.gff3 -> input.gff3.gff3cache/) holding one .npy file per column and a
+meta.json with the cache key: absolute path, size and mtime of the input, and
+CACHE_VERSION. Later runs memory-map the arrays instead of reparsing the text.
+
+Caches whose key does not match (input changed, parser changed) or that fail
+to load (truncated, missing files) are rebuilt automatically.
+
+Example:
+table = cachedTable('input.gff3')     # parses + writes cache the first time, mmaps afterwards
+"""
+import os
+import json
+import shutil
+import numpy as np
+from .gff3table import GFF3Table, CategoricalColumn, PackedStrings
+
+# bump when the parser or the table layout changes - invalidates all existing caches
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.gff3cache'
+CACHE_META = 'meta.json'
+# numeric columns saved as-is
+ARRAY_COLUMNS = ['start', 'end', 'score', 'strand', 'phase']
+CATEGORICAL_COLUMNS = ['seqid', 'source', 'type']
+
+
+def cachePath(filename):
+    """sidecar cache dir for a GFF3 file"""
+    return os.path.abspath(filename) + CACHE_SUFFIX
+
+
+def cacheKey(filename, version=CACHE_VERSION):
+    """what a cache (or other sidecar file) must have been built from to be valid for filename"""
+    stat = os.stat(filename)
+    return {'path': os.path.abspath(filename),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'version': version}
+
+
+def saveCache(table, filename):
+    """write table as the cache of filename. Written to a temp dir and renamed into place,
+    so readers never see a half-written cache. Returns the cache dir, or None if it
+    could not be written (e.g. input dir not writable)."""
+    path = cachePath(filename)
+    tmpPath = '{0}.tmp.{1}'.format(path, os.getpid())
+    try:
+        if os.path.exists(tmpPath):
+            shutil.rmtree(tmpPath)
+        os.mkdir(tmpPath)
+        for name in ARRAY_COLUMNS:
+            np.save(os.path.join(tmpPath, name + '.npy'), getattr(table, name))
+        for name in CATEGORICAL_COLUMNS:
+            column = getattr(table, name)
+            np.save(os.path.join(tmpPath, name + '.npy'), column.codes)
+            _savePacked(tmpPath, name + '.values', PackedStrings.fromStrings(column.values))
+        _savePacked(tmpPath, 'attributes', table.attributes.compacted())
+        meta = cacheKey(filename)
+        meta['rows'] = len(table)
+        with open(os.path.join(tmpPath, CACHE_META), 'w') as fh:
+            json.dump(meta, fh)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmpPath, path)
+    except (IOError, OSError):
+        shutil.rmtree(tmpPath, ignore_errors=True)
+        return None
+    return path
+
+
+def loadCache(filename):
+    """GFF3Table memory-mapped from the cache of filename, or None if there is no
+    valid cache. Arrays are mapped copy-on-write: rows can be changed in memory,
+    the cache files are never modified."""
+    path = cachePath(filename)
+    metaFile = os.path.join(path, CACHE_META)
+    if not os.path.exists(metaFile):
+        return None
+    try:
+        with open(metaFile) as fh:
+            meta = json.load(fh)
+        rows = meta.pop('rows')
+        if meta != cacheKey(filename):
+            # stale - input or parser changed since
+            return None
+        columns = {}
+        for name in ARRAY_COLUMNS:
+            columns[name] = _loadArray(path, name, rows)
+        for name in CATEGORICAL_COLUMNS:
+            values = _loadPacked(path, name + '.values', None)
+            columns[name] = CategoricalColumn(list(values), _loadArray(path, name, rows))
+        columns['attributes'] = _loadPacked(path, 'attributes', rows)
+    except (IOError, OSError, ValueError, KeyError):
+        # corrupt or incomplete cache
+        return None
+    return GFF3Table(**columns)
+
+
+def cachedTable(filename, **parseOptions):
+    """GFF3Table for filename, from its cache if valid, else parsed and cached"""
+    table = loadCache(filename)
+    if table is None:
+        table = GFF3Table.fromFile(filename, **parseOptions)
+        saveCache(table, filename)
+    return table
+
+
+def _savePacked(path, name, packed):
+    np.save(os.path.join(path, name + '.npy'), packed.buffer)
+    np.save(os.path.join(path, name + '.offsets.npy'), packed.offsets)
+
+
+def _loadPacked(path, name, rows):
+    offsets = _loadArray(path, name + '.offsets', None if rows is None else rows + 1)
+    buffer = _loadArray(path, name, None)
+    if len(offsets) == 0 or offsets[-1] != len(buffer):
+        raise ValueError("packed strings {0} do not match their offsets".format(name))
+    return PackedStrings(buffer, offsets)
+
+
+def _loadArray(path, name, length):
+    # np.load fails on a truncated file when mapping it.
+    # Plain ndarray view of the map: slicing an np.memmap is several times slower
+    array = np.load(os.path.join(path, name + '.npy'), mmap_mode='c').view(np.ndarray)
+    if length is not None and len(array) != length:
+        raise ValueError("cache column {0} has {1} rows, expected {2}".format(name, len(array), length))
+    return array
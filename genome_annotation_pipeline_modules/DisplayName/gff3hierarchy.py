@@ -0,0 +1,134 @@
+"""
+Parent/child index over parsed GFF3 features.
+
+Built in one pass over a list of records (parse_GFF3 output or a GFF3Table),
+without any assumption on their order: children may come before or after
+their parents, and genes may be interleaved.
+
+    rowOf(ID)             first row with that ID
+    childRows(ID)         rows whose Parent includes ID, in file order
+    parentIds(row)        the Parent IDs of a row
+    descendantRows(row)   everything below a feature, parents before children
+
+Rows are positions in the records list, so the index holds only ints and the
+ID strings - records are looked up as records[row].
+
+Example:
+records = list(parse_GFF3('input.gff3'))
+hierarchy = GFF3Hierarchy(records)
+for row in hierarchy.rowsOfType('gene'):
+    exons = [records[r] for r in hierarchy.descendantRows(row) if records[r].type == 'exon']
+"""
+from heapq import heapify, heappush, heappop
+
+
+class GFF3Hierarchy(object):
+    """ID -> row, parent -> children and feature -> descendants maps - see module docstring"""
+
+    def __init__(self, records):
+        self.records = records
+        self.ids = []            # row -> ID, None if the feature has none
+        self.idToRow = {}        # ID -> first row with that ID
+        self.children = {}       # parent ID -> child rows, in file order
+        self.parents = {}        # row -> parent IDs, only rows with a Parent attribute
+        self.roots = []          # rows without a Parent attribute
+        for row, record in enumerate(records):
+            featureId, parentAttr = record.getAttributeValues(('ID', 'Parent'))
+            self.ids.append(featureId)
+            if featureId is not None and featureId not in self.idToRow:
+                self.idToRow[featureId] = row
+            if parentAttr is None:
+                self.roots.append(row)
+                continue
+            parentIds = []
+            # Parent attribute could have multiple CSVs - a repeated one is counted once
+            for parentId in parentAttr.split(','):
+                if parentId not in parentIds:
+                    parentIds.append(parentId)
+                    self.children.setdefault(parentId, []).append(row)
+            self.parents[row] = parentIds
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rowOf(self, featureId):
+        """first row with ID featureId, None if there is none"""
+        return self.idToRow.get(featureId)
+
+    def childRows(self, featureId):
+        return self.children.get(featureId, [])
+
+    def parentIds(self, row):
+        return self.parents.get(row, [])
+
+    def parentRows(self, row):
+        """rows of the parents of row that are present"""
+        return [self.idToRow[parentId] for parentId in self.parentIds(row) if parentId in self.idToRow]
+
+    def rowsOfType(self, featureType):
+        """rows of all features of featureType, in file order"""
+        return [row for row in xrange(len(self.ids)) if self.records[row].type == featureType]
+
+    def unresolvedRows(self):
+        """rows naming a Parent ID that no feature has, in file order"""
+        return sorted(row for row, parentIds in self.parents.iteritems()
+                      if any(parentId not in self.idToRow for parentId in parentIds))
+
+    def descendantRows(self, row):
+        """all rows below row, each after all of its parents and otherwise in file order.
+        Rows caught in a Parent cycle come last, in file order."""
+        topId = self.ids[row]
+        if topId is None:
+            return []
+        # collect the subtree, following IDs (features split over several lines share one)
+        below = set()
+        subtreeIds = set([topId])
+        stack = [topId]
+        while stack:
+            for child in self.children.get(stack.pop(), ()):
+                if child == row or child in below:
+                    continue
+                below.add(child)
+                childId = self.ids[child]
+                if childId is not None and childId not in subtreeIds:
+                    subtreeIds.add(childId)
+                    stack.append(childId)
+        # file order is usually parents first already
+        order = sorted(below)
+        released = set([topId])
+        for child in order:
+            for parentId in self.parents[child]:
+                if parentId not in released and parentId in subtreeIds:
+                    return self._parentsFirst(topId, below, subtreeIds)
+            released.add(self.ids[child])
+        return order
+
+    def _parentsFirst(self, topId, below, subtreeIds):
+        """rows below topId, repeatedly taking the lowest row whose parents in the subtree are all taken"""
+        waiting = {}
+        for child in below:
+            waiting[child] = sum(1 for parentId in self.parents[child]
+                                 if parentId in subtreeIds and parentId != topId)
+        ready = [child for child, count in waiting.iteritems() if count == 0]
+        heapify(ready)
+        released = set([topId])
+        order = []
+        while ready:
+            child = heappop(ready)
+            order.append(child)
+            childId = self.ids[child]
+            if childId is None or childId in released:
+                continue
+            released.add(childId)
+            for grandChild in self.children.get(childId, ()):
+                if grandChild in waiting:
+                    waiting[grandChild] -= 1
+                    if waiting[grandChild] == 0:
+                        heappush(ready, grandChild)
+        if len(order) < len(below):
+            order.extend(sorted(below.difference(order)))
+        return order
+
+    def descendantsByRow(self, featureType='gene'):
+        """{row: descendant rows} for every feature of featureType"""
+        return dict((row, self.descendantRows(row)) for row in self.rowsOfType(featureType))
@@ -0,0 +1,198 @@
+"""
+Region-query interval index for GFF3 files, similar to tabix.
+
+Works on uncompressed GFF3 (byte offsets) and BGZF-compressed GFF3 (virtual
+offsets, see bgzf). Regular gzip cannot be seeked into - recompress with bgzip.
+
+Per seqid, features are kept sorted by start with a running maximum of their
+ends, so the features overlapping a region are found with two binary searches
+and a short scan. Features longer than LONG_FEATURE_BP (e.g. whole-sequence
+'region' lines) would make that scan long, so they are kept apart and always
+checked.
+
+The index is saved next to the file as input.gff3.gix.npz and rebuilt when the
+file changes.
+
+Example:
+index = GFF3Index.open('annotation_repeats.gff')
+for record in index.query('ZmChr01v2', 100000, 200000):
+    print(record)
+
+python -m DisplayName.gff3index query annotation_repeats.gff ZmChr01v2 100000 200000
+"""
+import os
+import json
+import urllib2
+import numpy as np
+from array import array
+from .bgzf import BgzfReader, isBgzf
+from .gff3cache import cacheKey
+from .gff3parser import parse_GFF3_line
+from .gff3table import PackedStrings
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.gix.npz'
+# features longer than this are not used for the running max end
+LONG_FEATURE_BP = 100000
+
+
+def openForIndex(filename):
+    """file object with readline/tell/seek positions usable in an index"""
+    if filename.endswith('.gz'):
+        if not isBgzf(filename):
+            raise ValueError("gzip file {0} is not BGZF - cannot be indexed. Recompress with bgzip.".format(filename))
+        return BgzfReader(filename)
+    return open(filename, 'rb')
+
+
+class GFF3Index(object):
+    """interval index over the feature lines of one GFF3 file - see module docstring"""
+
+    def __init__(self, filename, seqids, bounds, starts, ends, maxEnds, offsets):
+        self.filename = filename
+        self.seqids = seqids          # list of seqids
+        self.seqidIndex = dict((seqid, i) for i, seqid in enumerate(seqids))
+        # rows of seqid i: short features bounds[2i]:bounds[2i+1], long ones bounds[2i+1]:bounds[2i+2]
+        self.bounds = bounds
+        self.starts = starts          # sorted by start within each segment
+        self.ends = ends
+        self.maxEnds = maxEnds        # running max of ends within each segment
+        self.offsets = offsets        # file offset of the line
+        self.fh = None
+
+    @classmethod
+    def build(cls, filename):
+        """scan filename once and index every feature line with a start and end"""
+        features = {}  # seqid -> (starts, ends, offsets)
+        fh = openForIndex(filename)
+        try:
+            while True:
+                offset = fh.tell()
+                line = fh.readline()
+                if not line:
+                    break
+                if line[0] == '#' or not line.strip():
+                    continue
+                parts = line.split('\t', 5)
+                if parts[3] == '.' or parts[4] == '.':
+                    continue
+                seqid = urllib2.unquote(parts[0]) if '%' in parts[0] else parts[0]
+                if seqid not in features:
+                    features[seqid] = (array('l'), array('l'), array('l'))
+                starts, ends, offsets = features[seqid]
+                starts.append(int(parts[3]))
+                ends.append(int(parts[4]))
+                offsets.append(offset)
+        finally:
+            fh.close()
+
+        seqids = sorted(features)
+        bounds = [0]
+        segments = []
+        for seqid in seqids:
+            starts, ends, offsets = [np.array(column, dtype=np.int64) for column in features[seqid]]
+            isLong = (ends - starts) > LONG_FEATURE_BP
+            for selected in (~isLong, isLong):
+                order = np.argsort(starts[selected], kind='mergesort')
+                segment = (starts[selected][order], ends[selected][order], offsets[selected][order])
+                segments.append(segment)
+                bounds.append(bounds[-1] + len(order))
+        if segments:
+            starts, ends, offsets = [np.concatenate(columns) for columns in zip(*segments)]
+            maxEnds = np.concatenate([np.maximum.accumulate(segment[1]) if len(segment[1]) else segment[1]
+                                      for segment in segments])
+        else:
+            starts = ends = offsets = maxEnds = np.zeros(0, dtype=np.int64)
+        return cls(filename, seqids, np.array(bounds, dtype=np.int64), starts, ends, maxEnds, offsets)
+
+    @classmethod
+    def open(cls, filename, rebuild=False):
+        """index of filename, loaded from its .gix.npz if current, else built and saved"""
+        index = None if rebuild else cls.load(filename)
+        if index is None:
+            index = cls.build(filename)
+            index.save()
+        return index
+
+    def save(self):
+        """write the index next to the file. Returns the path, or None if it could not be written."""
+        path = self.filename + INDEX_SUFFIX
+        names = PackedStrings.fromStrings(self.seqids)
+        try:
+            with open(path, 'wb') as fh:
+                np.savez(fh, key=np.array(json.dumps(cacheKey(self.filename, INDEX_VERSION))),
+                         seqidBuffer=names.buffer, seqidOffsets=names.offsets, bounds=self.bounds,
+                         starts=self.starts, ends=self.ends, maxEnds=self.maxEnds, offsets=self.offsets)
+        except (IOError, OSError):
+            return None
+        return path
+
+    @classmethod
+    def load(cls, filename):
+        """saved index of filename, or None if missing, stale or unreadable"""
+        path = filename + INDEX_SUFFIX
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if json.loads(data['key'].item()) != cacheKey(filename, INDEX_VERSION):
+                    return None
+                seqids = list(PackedStrings(data['seqidBuffer'], data['seqidOffsets']))
+                return cls(filename, seqids, data['bounds'], data['starts'], data['ends'],
+                           data['maxEnds'], data['offsets'])
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def queryOffsets(self, seqid, start, end):
+        """sorted file offsets of the features on seqid overlapping start-end (1-based, inclusive)"""
+        i = self.seqidIndex.get(seqid)
+        if i is None:
+            return []
+        found = []
+        # short features: starts <= end, and from the first row whose running max end reaches start
+        lo, hi = self.bounds[2 * i], self.bounds[2 * i + 1]
+        last = lo + np.searchsorted(self.starts[lo:hi], end, 'right')
+        first = lo + np.searchsorted(self.maxEnds[lo:hi], start, 'left')
+        if first < last:
+            rows = np.arange(first, last)
+            found.append(self.offsets[rows[self.ends[first:last] >= start]])
+        # long features: few of them, check all that start in time
+        lo, hi = self.bounds[2 * i + 1], self.bounds[2 * i + 2]
+        last = lo + np.searchsorted(self.starts[lo:hi], end, 'right')
+        rows = np.arange(lo, last)
+        found.append(self.offsets[rows[self.ends[lo:last] >= start]])
+        return sorted(np.concatenate(found).tolist())
+
+    def query(self, seqid, start, end):
+        """GFF3Records on seqid overlapping start-end (1-based, inclusive), in file order"""
+        if self.fh is None:
+            self.fh = openForIndex(self.filename)
+        records = []
+        for offset in self.queryOffsets(seqid, start, end):
+            self.fh.seek(offset)
+            records.append(parse_GFF3_line(self.fh.readline()))
+        return records
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or query a GFF3 region index")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("file", help="GFF3 file, uncompressed or BGZF (.gz)")
+    parser.add_argument("region", nargs="*", help="query: seqid start end")
+    args = parser.parse_args()
+    if args.command == "build":
+        index = GFF3Index.open(args.file, rebuild=True)
+        print("Indexed {0} features on {1} sequences".format(len(index.starts), len(index.seqids)))
+    else:
+        seqid, start, end = args.region
+        for record in GFF3Index.open(args.file).query(seqid, int(start), int(end)):
+            print(record)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Multi-process parsing of large GFF3 files.
+
+The file is split into ranges of about equal size and each range is parsed in
+a worker process. A line belongs to the range its first byte falls in, so
+ranges can start and end anywhere: a worker skips the partial line at its
+start (the previous range reads it to the end) and stops at the first line
+starting past its end.
+
+Works on uncompressed GFF3 (byte ranges) and BGZF-compressed GFF3 (ranges of
+whole BGZF blocks). Regular gzip has no block boundaries to split at and is
+parsed serially.
+
+Example:
+for record in parse_GFF3_parallel('input.gff3', workers=8):
+    print(record)
+table = parse_GFF3_parallel('input.gff3.gz', workers=8, asTables=True)
+"""
+import os
+from multiprocessing import Pool
+from .bgzf import BgzfReader, isBgzf, iterBlocks, makeVirtualOffset
+from .gff3parser import parse_GFF3, parse_GFF3_line
+from .gff3table import GFF3Table
+
+# ranges per worker - smaller ranges even out workers that get slow ranges
+RANGES_PER_WORKER = 4
+# do not bother splitting below this many bytes per range
+MIN_RANGE_BYTES = 1 << 20
+
+
+def splitRanges(filename, count):
+    """about count (kind, start, end, previous) ranges covering filename.
+    Plain files: byte offsets, previous unused.
+    BGZF: block starts, end None for the last range, previous is the start of
+    the last non-empty block before start (None for the first range)."""
+    if filename.endswith('.gz'):
+        blocks = [(blockStart, dataSize) for blockStart, blockSize, dataSize in iterBlocks(filename)]
+        total = sum(dataSize for blockStart, dataSize in blocks)
+        target = max(total // max(count, 1), MIN_RANGE_BYTES)
+        ranges = []
+        rangeStart, previous, lastNonEmpty, size = 0, None, None, 0
+        for blockStart, dataSize in blocks:
+            # split only in front of a non-empty block, with the last non-empty block to look back into
+            if size >= target and dataSize and lastNonEmpty is not None:
+                ranges.append(('bgzf', rangeStart, blockStart, previous))
+                rangeStart, previous, size = blockStart, lastNonEmpty, 0
+            size += dataSize
+            if dataSize:
+                lastNonEmpty = blockStart
+        ranges.append(('bgzf', rangeStart, None, previous))
+        return ranges
+    total = os.path.getsize(filename)
+    size = max(total // max(count, 1), MIN_RANGE_BYTES)
+    bounds = range(0, total, size) + [total]
+    if len(bounds) < 2:
+        bounds = [0, total]
+    return [('plain', start, end, None) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def iterRangeLines(filename, kind, start, end, previous):
+    """the lines starting inside one range of splitRanges"""
+    if kind == 'plain':
+        with open(filename, 'rb') as fh:
+            if start > 0:
+                # the line running over start belongs to the previous range
+                fh.seek(start - 1)
+                fh.readline()
+            while fh.tell() < end:
+                line = fh.readline()
+                if not line:
+                    break
+                yield line
+        return
+    reader = BgzfReader(filename)
+    try:
+        if previous is not None:
+            # same trick on the last byte of the previous non-empty block
+            reader.seekBlockEnd(previous)
+            reader.readline()
+        endOffset = None if end is None else makeVirtualOffset(end, 0)
+        while endOffset is None or reader.tell() < endOffset:
+            line = reader.readline()
+            if not line:
+                break
+            yield line
+    finally:
+        reader.close()
+
+
+def _parseRange(task):
+    """worker: parse one range into a list of GFF3Records or a GFF3Table"""
+    filename, fastUnquote, types, seqids, asTable, span = task
+    lines = iterRangeLines(filename, *span)
+    records = (parse_GFF3_line(line, fastUnquote, types, seqids) for line in lines)
+    records = (record for record in records if record is not None)
+    if asTable:
+        return GFF3Table.fromRecords(records)
+    return list(records)
+
+
+def canSplit(filename):
+    """True if filename can be parsed in ranges (uncompressed or BGZF)"""
+    return not filename.endswith('.gz') or isBgzf(filename)
+
+
+def parse_GFF3_parallel(filename, workers=8, asTables=False, fastUnquote=True, types=None, seqids=None):
+    """
+    Parse filename in a pool of worker processes.
+    Returns a generator of GFF3Records in file order, or with asTables one
+    GFF3Table (the per-range tables concatenated in order).
+    types, seqids: filters, as in parse_GFF3.
+    Regular gzip files and workers=1 are parsed in this process.
+    """
+    if workers <= 1 or not canSplit(filename):
+        if asTables:
+            return GFF3Table.fromFile(filename, fastUnquote=fastUnquote, types=types, seqids=seqids)
+        return parse_GFF3(filename, fastUnquote=fastUnquote, types=types, seqids=seqids)
+    types = None if types is None else frozenset(types)
+    seqids = None if seqids is None else frozenset(seqids)
+    spans = splitRanges(filename, workers * RANGES_PER_WORKER)
+    tasks = [(filename, fastUnquote, types, seqids, asTables, span) for span in spans]
+    if asTables:
+        pool = Pool(min(workers, len(tasks)))
+        try:
+            return GFF3Table.concat(pool.imap(_parseRange, tasks))
+        finally:
+            pool.close()
+            pool.join()
+    return _iterParallel(tasks, workers)
+
+
+def _iterParallel(tasks, workers):
+    pool = Pool(min(workers, len(tasks)))
+    try:
+        # imap keeps the ranges in order while later ones are still being parsed
+        for records in pool.imap(_parseRange, tasks):
+            for record in records:
+                yield record
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Parse a GFF3 file in parallel and report throughput")
+    parser.add_argument("file", help="GFF3 file, uncompressed or BGZF (.gz)")
+    parser.add_argument("-w", "--workers", type=int, default=8)
+    parser.add_argument("--table", action="store_true", help="build a GFF3Table instead of records")
+    args = parser.parse_args()
+    startTime = time.time()
+    if args.table:
+        count = len(parse_GFF3_parallel(args.file, args.workers, asTables=True))
+    else:
+        count = sum(1 for _ in parse_GFF3_parallel(args.file, args.workers))
+    elapsed = time.time() - startTime
+    print("{0} records in {1:.2f}s ({2:,.0f} records/sec) with {3} workers".format(
+        count, elapsed, count / elapsed if elapsed else 0, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,414 @@
-"""
-A simple parser for the GFF3 format.
-
-Based on Uli Koehler's version.
-Updated by CFT to:
-    handle blank lines
-    cleaned up class names
-    improved string output
-Updated by GG to:
-    urllib2
-    preserve attributes order
-    handle empty attributes in string output
-    mutable record attributes
-
-Test with transcripts.gff3 from
-http://www.broadinstitute.org/annotation/gebo/help/gff3.html.
-
-Format specification source:
-http://www.sequenceontology.org/gff3.shtml
-
-Version 1.0
-"""
-from collections import OrderedDict
-from recordclass import recordclass
-import gzip
-import urllib2
-
-#Initialized GeneInfo record class.
-#Note: since namedtuple is immutable, using recordclass instead. Attributes are now mutable.
-gffInfoFields = ["seqid", "source", "type", "start", "end", "score", "strand", "phase", "attributes"]
-
-class GFF3Record(recordclass("GFF3Record", gffInfoFields)):
-    def __str__(self):
-        """Provide a more useful string output"""
-        return "\t".join(('.' if self.seqid is None else self.seqid,
-                          '.' if self.source is None else self.source,
-                          '.' if self.type is None else self.type,
-                          '.' if self.start is None else str(self.start),
-                          '.' if self.end is None else str(self.end),
-                          '.' if self.score is None else str(self.score),
-                          '.' if self.strand is None else self.strand,
-                          '.' if self.phase is None else str(self.phase),
-                          '.' if not self.attributes else ';'.join(["{}={}".format(k, v) for k, v in self.attributes.items()])))
-
-
-def parse_GFF_attributes(attributeString):
-    """Parse the GFF3 attribute column and return a dict"""#
-    if attributeString == ".": return {}
-    ret = OrderedDict()
-    for attribute in attributeString.split(";"):
-        key, value = attribute.split("=")
-        ret[urllib2.unquote(key)] = urllib2.unquote(value)
-    return ret
-
-def parse_GFF3(filename):
-    """
-    A minimalistic GFF3 format parser.
-    Yields objects that contain info about a single GFF3 feature.
-
-    Supports transparent gzip decompression.
-    """
-    #Parse with transparent decompression
-    openFunc = gzip.open if filename.endswith(".gz") else open
-    with openFunc(filename) as infile:
-        for line in infile:
-            line = line.rstrip()
-            if line.startswith("#") or not line: continue
-            parts = line.split("\t")
-            #If this fails, the file format is not standard-compatible
-            #print('len parts = {}, len fileds = {}'.format(len(parts), len(gffInfoFields)))
-            assert len(parts) == len(gffInfoFields)
-            #Normalize data
-            normalizedInfo = {
-                "seqid": None if parts[0] == "." else urllib2.unquote(parts[0]),
-                "source": None if parts[1] == "." else urllib2.unquote(parts[1]),
-                "type": None if parts[2] == "." else urllib2.unquote(parts[2]),
-                "start": None if parts[3] == "." else int(parts[3]),
-                "end": None if parts[4] == "." else int(parts[4]),
-                "score": None if parts[5] == "." else float(parts[5]),
-                "strand": None if parts[6] == "." else urllib2.unquote(parts[6]),
-                "phase": None if parts[7] == "." else int(parts[7]),
-                "attributes": parse_GFF_attributes(parts[8])
-            }
-            yield GFF3Record(**normalizedInfo)
-
-
-def main():
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument("file", help="The GFF3 input file (.gz allowed)")
-    parser.add_argument("--print-records", action="store_true", help="Print all GeneInfo objects, not only")
-    args = parser.parse_args()
-    #Execute the parser
-    recordCount = 0
-    parser = parse_GFF3(args.file)
-    for record in parser:
-        #Print record if specified by the user
-        if args.print_records:
-            print(record)
-            #Access attributes like this: my_strand = record.strand
-        recordCount += 1
-
-    print("Total records: {}".format(recordCount))
-
-if __name__ == "__main__":
+"""
+A simple parser for the GFF3 format.
+
+Based on Uli Koehler's version.
+Updated by CFT to:
+    handle blank lines
+    cleaned up class names
+    improved string output
+Updated by GG to:
+    urllib2
+    preserve attributes order
+    handle empty attributes in string output
+    mutable record attributes
+    lazy attribute decoding, verbatim output of unmodified attributes
+    skip percent-decoding on lines without any '%' escape
+    optional binary parse cache
+    type and seqid filters applied before a line is normalized
+    GFF3Writer: batched output, optionally gzip/BGZF compressed in background threads
+
+Test with transcripts.gff3 from
+http://www.broadinstitute.org/annotation/gebo/help/gff3.html.
+
+Format specification source:
+http://www.sequenceontology.org/gff3.shtml
+
+Version 1.0
+"""
+from collections import OrderedDict, deque
+from multiprocessing.pool import ThreadPool
+from recordclass import recordclass
+import gzip
+import urllib2
+import zlib
+from .bgzf import compressBlocks, EOF_BLOCK
+
+#Initialized GeneInfo record class.
+#Note: since namedtuple is immutable, using recordclass instead. Attributes are now mutable.
+gffInfoFields = ["seqid", "source", "type", "start", "end", "score", "strand", "phase", "attributes"]
+# position of the attributes column in the record
+ATTRIBUTES_INDEX = gffInfoFields.index("attributes")
+
+
+class GFF3Attributes(OrderedDict):
+    """Decoded GFF3 attribute column.
+    Remembers the raw column text it was decoded from and whether it has been
+    changed since, so unmodified attributes can be written back verbatim."""
+
+    def __init__(self, raw=None):
+        OrderedDict.__init__(self)
+        self.raw = raw
+        self.modified = False
+        # optional callback(attributes), called when an unmodified dict is first changed
+        self.onModify = None
+
+    def __setitem__(self, key, value, *args, **kwargs):
+        OrderedDict.__setitem__(self, key, value, *args, **kwargs)
+        self.touch()
+
+    def __delitem__(self, key, *args, **kwargs):
+        OrderedDict.__delitem__(self, key, *args, **kwargs)
+        self.touch()
+
+    def clear(self):
+        OrderedDict.clear(self)
+        self.touch()
+
+    def touch(self):
+        """mark as modified"""
+        if not self.modified:
+            self.modified = True
+            if self.onModify is not None:
+                self.onModify(self)
+
+    def __reduce__(self):
+        # OrderedDict's own __reduce__ passes the items to __init__ - here they are set after, then the state
+        state = {'raw': self.raw, 'modified': self.modified, 'onModify': None}
+        return (self.__class__, (), state, None, iter(self.items()))
+
+    def __str__(self):
+        """attribute column text - raw text if nothing changed since decoding"""
+        if not self.modified and self.raw is not None:
+            return self.raw
+        return '.' if not self else ';'.join(['%s=%s' % (k, self[k]) for k in self])
+
+
+class GFF3Record(recordclass("GFF3Record", gffInfoFields)):
+    """A single GFF3 feature.
+    The attributes column is kept as the raw string from the file and only decoded
+    into a GFF3Attributes dict the first time .attributes is read."""
+
+    @property
+    def attributes(self):
+        attributes = self[ATTRIBUTES_INDEX]
+        if isinstance(attributes, basestring):
+            # first access - decode and keep the dict
+            attributes = parse_GFF_attributes(attributes)
+            self[ATTRIBUTES_INDEX] = attributes
+        return attributes
+
+    @attributes.setter
+    def attributes(self, value):
+        self[ATTRIBUTES_INDEX] = value
+
+    @property
+    def rawAttributes(self):
+        """attribute column text, without decoding it if it was never read"""
+        attributes = self[ATTRIBUTES_INDEX]
+        if isinstance(attributes, basestring):
+            return attributes
+        if isinstance(attributes, GFF3Attributes):
+            return str(attributes)
+        # plain dict set by the caller
+        return '.' if not attributes else ';'.join(["{}={}".format(k, v) for k, v in attributes.items()])
+
+    @property
+    def unchangedAttributes(self):
+        """attribute column text as parsed, None if the attributes were changed since"""
+        attributes = self[ATTRIBUTES_INDEX]
+        if isinstance(attributes, basestring):
+            return attributes
+        if isinstance(attributes, GFF3Attributes) and not attributes.modified:
+            return attributes.raw
+        return None
+
+    def getAttribute(self, key, default=None):
+        """value of a single attribute.
+        Reads it straight from the raw column if attributes were never decoded,
+        so read-only lookups (ID, Parent) do not build the attributes dict."""
+        attributes = self[ATTRIBUTES_INDEX]
+        if not isinstance(attributes, basestring):
+            return attributes.get(key, default)
+        return get_GFF_attribute(attributes, key, default)
+
+    def getAttributeValues(self, keys, default=None):
+        """values of several attributes in the order of keys, in one pass over the raw column"""
+        attributes = self[ATTRIBUTES_INDEX]
+        if not isinstance(attributes, basestring):
+            return [attributes.get(key, default) for key in keys]
+        return get_GFF_attributes(attributes, keys, default)
+
+    def __str__(self):
+        """Provide a more useful string output"""
+        return format_GFF3_line(self)[:-1]
+
+
+def format_GFF3_record(record):
+    """GFF3 line (without newline) for a GFF3Record or anything with the same fields and rawAttributes"""
+    return "\t".join(('.' if record.seqid is None else record.seqid,
+                      '.' if record.source is None else record.source,
+                      '.' if record.type is None else record.type,
+                      '.' if record.start is None else str(record.start),
+                      '.' if record.end is None else str(record.end),
+                      '.' if record.score is None else str(record.score),
+                      '.' if record.strand is None else record.strand,
+                      '.' if record.phase is None else str(record.phase),
+                      record.rawAttributes or '.'))
+
+
+def format_GFF3_line(record):
+    """GFF3 line with newline - same as format_GFF3_record, faster for GFF3Records"""
+    if not isinstance(record, GFF3Record):
+        return format_GFF3_record(record) + "\n"
+    seqid, source, type, start, end, score, strand, phase, attributes = record
+    if not isinstance(attributes, basestring):
+        attributes = record.rawAttributes
+    return "%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n" % (
+        '.' if seqid is None else seqid, '.' if source is None else source, '.' if type is None else type,
+        '.' if start is None else start, '.' if end is None else end, '.' if score is None else score,
+        '.' if strand is None else strand, '.' if phase is None else phase, attributes or '.')
+
+
+def _compress_gzip(data, level):
+    """data as one gzip member - members written back to back form a valid gzip file"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class GFF3Writer(object):
+    """
+    Buffered GFF3 output.
+    Lines are collected into batches of about batchBytes and written with one
+    call each. With compression ('gzip', or 'bgzf' - gzip that gff3index can
+    seek in) batches are compressed in a pool of threads (zlib releases the
+    GIL) while the next batch is being formatted, and written in order.
+    compression='auto': bgzf for names ending in .gz, else none.
+
+    with GFF3Writer('output.gff3.gz') as writer:
+        writer.write('##gff-version 3\n')
+        writer.writeRecords(records)
+    """
+
+    def __init__(self, filename, compression='auto', threads=2, batchBytes=4 << 20, level=6):
+        if compression == 'auto':
+            compression = 'bgzf' if filename.endswith('.gz') else None
+        if compression not in (None, 'gzip', 'bgzf'):
+            raise ValueError("Unknown GFF3Writer compression: {0}".format(compression))
+        self.filename = filename
+        self.compression = compression
+        self.compress = {None: None, 'gzip': _compress_gzip, 'bgzf': compressBlocks}[compression]
+        self.level = level
+        self.batchBytes = batchBytes
+        self.fh = open(filename, 'wb')
+        self.pool = ThreadPool(threads) if compression and threads > 0 else None
+        # batches being compressed, oldest first; bounded so memory stays a few batches
+        self.inFlight = deque()
+        self.maxInFlight = 2 * max(threads, 1)
+        self.pending = []
+        self.pendingBytes = 0
+        self.recordCount = 0
+
+    def write(self, text):
+        """write text (e.g. header or comment lines, with newlines) as is"""
+        self.pending.append(text)
+        self.pendingBytes += len(text)
+        if self.pendingBytes >= self.batchBytes:
+            self.flush()
+
+    def writeRecord(self, record):
+        self.write(format_GFF3_line(record))
+        self.recordCount += 1
+
+    def writeRecords(self, records):
+        """write an iterable of records (GFF3Records or anything format_GFF3_record takes)"""
+        pending = self.pending
+        batchBytes = self.batchBytes
+        for record in records:
+            line = format_GFF3_line(record)
+            pending.append(line)
+            self.pendingBytes += len(line)
+            self.recordCount += 1
+            if self.pendingBytes >= batchBytes:
+                self.flush()
+                pending = self.pending
+
+    def flush(self):
+        """send the current batch on - written directly, or queued for compression"""
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        self.pendingBytes = 0
+        if self.compress is None:
+            self.fh.write(data)
+        elif self.pool is None:
+            self.fh.write(self.compress(data, self.level))
+        else:
+            self.inFlight.append(self.pool.apply_async(self.compress, (data, self.level)))
+            while len(self.inFlight) > self.maxInFlight:
+                self.fh.write(self.inFlight.popleft().get())
+
+    def close(self):
+        if self.fh is None:
+            return
+        try:
+            self.flush()
+            while self.inFlight:
+                self.fh.write(self.inFlight.popleft().get())
+            if self.compression == 'bgzf':
+                self.fh.write(EOF_BLOCK)
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+            self.fh.close()
+            self.fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_GFF_attribute(attributeString, key, default=None):
+    """value of a single attribute in a raw GFF3 attribute column, without decoding the rest"""
+    value = default
+    escaped = "%" in attributeString
+    for attribute in attributeString.split(";"):
+        k, sep, v = attribute.partition("=")
+        if escaped:
+            k, v = urllib2.unquote(k), urllib2.unquote(v)
+        # last one wins, same as parse_GFF_attributes
+        if sep and k == key:
+            value = v
+    return value
+
+
+def get_GFF_attributes(attributeString, keys, default=None):
+    """values of several attributes in a raw GFF3 attribute column, in the order of keys"""
+    values = dict.fromkeys(keys, default)
+    escaped = "%" in attributeString
+    for attribute in attributeString.split(";"):
+        k, sep, v = attribute.partition("=")
+        if escaped:
+            k, v = urllib2.unquote(k), urllib2.unquote(v)
+        if sep and k in values:
+            values[k] = v
+    return [values[key] for key in keys]
+
+
+def parse_GFF_attributes(attributeString, fastUnquote=True):
+    """Parse the GFF3 attribute column and return a dict
+    fastUnquote: skip urllib2.unquote when the column has no '%' escape at all"""
+    ret = GFF3Attributes(attributeString)
+    if attributeString == ".": return ret
+    if fastUnquote and "%" not in attributeString:
+        for attribute in attributeString.split(";"):
+            key, value = attribute.split("=")
+            ret[key] = value
+    else:
+        for attribute in attributeString.split(";"):
+            key, value = attribute.split("=")
+            ret[urllib2.unquote(key)] = urllib2.unquote(value)
+    ret.modified = False
+    return ret
+
+def parse_GFF3(filename, fastUnquote=True, cache=False, types=None, seqids=None):
+    """
+    A minimalistic GFF3 format parser.
+    Yields objects that contain info about a single GFF3 feature.
+
+    Supports transparent gzip decompression.
+
+    fastUnquote: check each line once for a '%' escape and skip all
+    urllib2.unquote calls on lines without one (almost all of them).
+    cache: read the records from a binary sidecar cache of the file
+    (see gff3cache), building it first if missing or stale.
+    types, seqids: only yield features of these types / on these seqids
+    (decoded values, None for '.'). Other lines are dropped right after
+    their first three columns are split out, before any conversion.
+    """
+    types = None if types is None else frozenset(types)
+    seqids = None if seqids is None else frozenset(seqids)
+    if cache:
+        from .gff3cache import cachedTable
+        # the cache always holds the whole file - filters are applied to its rows
+        table = cachedTable(filename, fastUnquote=fastUnquote)
+        rows = None if types is None and seqids is None else table.selectRows(types, seqids)
+        for record in table.toRecords(rows):
+            yield record
+        return
+    #Parse with transparent decompression
+    openFunc = gzip.open if filename.endswith(".gz") else open
+    with openFunc(filename) as infile:
+        for line in infile:
+            record = parse_GFF3_line(line, fastUnquote, types, seqids)
+            if record is not None:
+                yield record
+
+
+def _column_value(text):
+    """decoded value of a seqid/source/type column"""
+    if text == ".":
+        return None
+    return urllib2.unquote(text) if "%" in text else text
+
+
+def parse_GFF3_line(line, fastUnquote=True, types=None, seqids=None):
+    """GFF3Record for a single GFF3 line, None for comment and blank lines
+    and for features not matching the types/seqids sets (see parse_GFF3)"""
+    line = line.rstrip()
+    if line.startswith("#") or not line: return None
+    if types is not None or seqids is not None:
+        head = line.split("\t", 3)
+        # short lines fall through to the format check below
+        if len(head) > 3:
+            if types is not None and _column_value(head[2]) not in types: return None
+            if seqids is not None and _column_value(head[0]) not in seqids: return None
+    parts = line.split("\t")
+    #If this fails, the file format is not standard-compatible
+    #print('len parts = {}, len fileds = {}'.format(len(parts), len(gffInfoFields)))
+    assert len(parts) == len(gffInfoFields)
+    if fastUnquote and "%" not in line:
+        # nothing escaped on this line - columns are used as is
+        seqid, source, type, strand = parts[0], parts[1], parts[2], parts[6]
+    else:
+        unquote = urllib2.unquote
+        seqid, source, type, strand = unquote(parts[0]), unquote(parts[1]), unquote(parts[2]), unquote(parts[6])
+    #Normalize data
+    normalizedInfo = {
+        "seqid": None if parts[0] == "." else seqid,
+        "source": None if parts[1] == "." else source,
+        "type": None if parts[2] == "." else type,
+        "start": None if parts[3] == "." else int(parts[3]),
+        "end": None if parts[4] == "." else int(parts[4]),
+        "score": None if parts[5] == "." else float(parts[5]),
+        "strand": None if parts[6] == "." else strand,
+        "phase": None if parts[7] == "." else int(parts[7]),
+        # decoded lazily, on first access of record.attributes
+        "attributes": parts[8]
+    }
+    return GFF3Record(**normalizedInfo)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="The GFF3 input file (.gz allowed)")
+    parser.add_argument("--print-records", action="store_true", help="Print all GeneInfo objects, not only")
+    args = parser.parse_args()
+    #Execute the parser
+    recordCount = 0
+    parser = parse_GFF3(args.file)
+    for record in parser:
+        #Print record if specified by the user
+        if args.print_records:
+            print(record)
+            #Access attributes like this: my_strand = record.strand
+        recordCount += 1
+
+    print("Total records: {}".format(recordCount))
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,403 @@
+"""
+Columnar, in-memory table of GFF3 features.
+
+Holds a whole annotation as typed NumPy columns instead of one GFF3Record
+(plus an attributes dict) per line:
+    start, end            int64, -1 for '.'
+    score                 float64, NaN for '.'
+    phase                 int8, -1 for '.'
+    strand                int8, see STRAND_CODES
+    seqid, source, type   dictionary-encoded: int32 codes into a list of values, -1 for '.'
+    attributes            raw column text, packed into one uint8 buffer + int64 offsets
+
+GFF3Row gives a view of one row that behaves like a GFF3Record: fields can be
+read and set, .attributes decodes on access, and str() gives the GFF3 line.
+Attribute dicts are only kept for rows that were changed, until the row is
+written out again with str().
+
+Example:
+table = GFF3Table.fromFile('input.gff3')
+for record in table:
+    print(record.type, record.getAttribute('ID'))
+"""
+import numpy as np
+from array import array
+from .gff3parser import GFF3Record, GFF3Attributes, parse_GFF3, parse_GFF_attributes, \
+    get_GFF_attribute, get_GFF_attributes, format_GFF3_record
+
+# strand column encoding
+STRAND_CODES = {None: 0, '+': 1, '-': -1, '?': 2}
+STRAND_VALUES = dict((code, strand) for strand, code in STRAND_CODES.items())
+UNKNOWN_STRAND = "Unknown GFF3 strand {0!r}, expected '+', '-', '?' or '.'"
+# stands in for '.' in the integer columns
+MISSING = -1
+# rows copied out at once by GFF3Table.toRecords
+RECORD_BLOCK_ROWS = 8192
+
+
+class CategoricalColumn(object):
+    """dictionary-encoded string column: int32 codes into a list of distinct values"""
+
+    def __init__(self, values=None, codes=None):
+        self.values = list(values or [])
+        self.codeOf = dict((value, code) for code, value in enumerate(self.values))
+        self.codes = codes
+
+    def encode(self, value):
+        """code for value, adding it to the dictionary if new"""
+        if value is None:
+            return MISSING
+        code = self.codeOf.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codeOf[value] = code
+        return code
+
+    def __getitem__(self, row):
+        # .item() gives a plain int - much faster than numpy scalar indexing
+        code = self.codes.item(row)
+        return None if code == MISSING else self.values[code]
+
+    def decode(self, rows):
+        """values of rows (an index array), as a list"""
+        # MISSING (-1) picks the extra last entry
+        lookup = self.values + [None]
+        return [lookup[code] for code in self.codes[rows].tolist()]
+
+    def __setitem__(self, row, value):
+        self.codes[row] = self.encode(value)
+
+
+class PackedStrings(object):
+    """list of strings stored back to back in one uint8 buffer, with offsets.
+    Replaced strings go into a small overrides dict."""
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer      # uint8 array
+        self.offsets = offsets    # int64 array, len(strings) + 1
+        self.overrides = {}
+
+    @classmethod
+    def fromStrings(cls, strings):
+        buffer = bytearray()
+        offsets = array('l', [0])
+        for s in strings:
+            buffer.extend(s)
+            offsets.append(len(buffer))
+        return cls(np.frombuffer(buffer, dtype=np.uint8), np.array(offsets, dtype=np.int64))
+
+    def compacted(self):
+        """PackedStrings with any overrides folded back into the buffer"""
+        if not self.overrides:
+            return self
+        return PackedStrings.fromStrings(self)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i in self.overrides:
+            return self.overrides[i]
+        return self.buffer[self.offsets.item(i):self.offsets.item(i + 1)].tostring()
+
+    def __setitem__(self, i, s):
+        self.overrides[i] = s
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+
+def _categorical_property(name):
+    """GFF3Row property for a dictionary-encoded column"""
+    def getter(self):
+        return getattr(self.table, name)[self.row]
+    def setter(self, value):
+        getattr(self.table, name)[self.row] = value
+    return property(getter, setter)
+
+
+def _integer_property(name):
+    """GFF3Row property for an integer column, MISSING <-> None"""
+    def getter(self):
+        value = getattr(self.table, name).item(self.row)
+        return None if value == MISSING else value
+    def setter(self, value):
+        getattr(self.table, name)[self.row] = MISSING if value is None else value
+    return property(getter, setter)
+
+
+class GFF3Row(object):
+    """view of one GFF3Table row, usable in place of a GFF3Record"""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    seqid = _categorical_property('seqid')
+    source = _categorical_property('source')
+    type = _categorical_property('type')
+    start = _integer_property('start')
+    end = _integer_property('end')
+    phase = _integer_property('phase')
+
+    @property
+    def score(self):
+        score = self.table.score.item(self.row)
+        return None if score != score else score  # NaN
+
+    @score.setter
+    def score(self, value):
+        self.table.score[self.row] = float('nan') if value is None else value
+
+    @property
+    def strand(self):
+        return STRAND_VALUES[self.table.strand.item(self.row)]
+
+    @strand.setter
+    def strand(self, value):
+        if value not in STRAND_CODES:
+            raise ValueError(UNKNOWN_STRAND.format(value))
+        self.table.strand[self.row] = STRAND_CODES[value]
+
+    @property
+    def attributes(self):
+        return self.table.getAttributes(self.row)
+
+    @attributes.setter
+    def attributes(self, value):
+        self.table.setAttributes(self.row, value)
+
+    @property
+    def rawAttributes(self):
+        return self.table.getRawAttributes(self.row)
+
+    @property
+    def unchangedAttributes(self):
+        return self.table.getUnchangedAttributes(self.row)
+
+    def getAttribute(self, key, default=None):
+        return self.table.getAttribute(self.row, key, default)
+
+    def getAttributeValues(self, keys, default=None):
+        return self.table.getAttributeValues(self.row, keys, default)
+
+    def __str__(self):
+        return format_GFF3_record(self)
+
+    def __repr__(self):
+        return "GFF3Row({0}: {1})".format(self.row, self)
+
+
+class GFF3Table(object):
+    """GFF3 features in columnar NumPy arrays - see module docstring"""
+
+    def __init__(self, seqid, source, type, start, end, score, strand, phase, attributes):
+        self.seqid = seqid            # CategoricalColumn
+        self.source = source          # CategoricalColumn
+        self.type = type              # CategoricalColumn
+        self.start = start            # int64
+        self.end = end                # int64
+        self.score = score            # float64
+        self.strand = strand          # int8
+        self.phase = phase            # int8
+        self.attributes = attributes  # PackedStrings
+        # decoded attribute dicts that have been changed, by row - written back by getRawAttributes
+        self.modifiedAttributes = {}
+        # most recently decoded (row, attributes) - records tend to be read several times in a row
+        self._lastDecoded = (None, None)
+
+    @classmethod
+    def fromRecords(cls, records):
+        """build a table from GFF3Records, e.g. the parse_GFF3 generator"""
+        seqid, source, type = CategoricalColumn(), CategoricalColumn(), CategoricalColumn()
+        seqidCodes, sourceCodes, typeCodes = array('i'), array('i'), array('i')
+        start, end, score = array('l'), array('l'), array('d')
+        strand, phase = array('b'), array('b')
+        # attribute text is packed as it comes, no per-row string objects are kept
+        attributeBuffer, attributeOffsets = bytearray(), array('l', [0])
+        nan = float('nan')
+        for record in records:
+            seqidCodes.append(seqid.encode(record.seqid))
+            sourceCodes.append(source.encode(record.source))
+            typeCodes.append(type.encode(record.type))
+            start.append(MISSING if record.start is None else record.start)
+            end.append(MISSING if record.end is None else record.end)
+            score.append(nan if record.score is None else record.score)
+            try:
+                strand.append(STRAND_CODES[record.strand])
+            except KeyError:
+                raise ValueError((UNKNOWN_STRAND + " in record {1}: {2}:{3}-{4} {5}").format(
+                    record.strand, len(start), record.seqid, record.start, record.end, record.type))
+            phase.append(MISSING if record.phase is None else record.phase)
+            attributeBuffer.extend(record.rawAttributes)
+            attributeOffsets.append(len(attributeBuffer))
+        seqid.codes = np.array(seqidCodes, dtype=np.int32)
+        source.codes = np.array(sourceCodes, dtype=np.int32)
+        type.codes = np.array(typeCodes, dtype=np.int32)
+        return cls(seqid, source, type,
+                   np.array(start, dtype=np.int64), np.array(end, dtype=np.int64),
+                   np.array(score, dtype=np.float64), np.array(strand, dtype=np.int8),
+                   np.array(phase, dtype=np.int8),
+                   PackedStrings(np.frombuffer(attributeBuffer, dtype=np.uint8),
+                                 np.array(attributeOffsets, dtype=np.int64)))
+
+    @classmethod
+    def fromFile(cls, filename, **parseOptions):
+        """parse a GFF3 file (.gz allowed) into a table; parseOptions go to parse_GFF3"""
+        return cls.fromRecords(parse_GFF3(filename, **parseOptions))
+
+    @classmethod
+    def concat(cls, tables):
+        """one table with the rows of tables, in order - e.g. chunks parsed in parallel"""
+        tables = list(tables)
+        columns = {}
+        for name in ('seqid', 'source', 'type'):
+            merged = CategoricalColumn()
+            codes = []
+            for table in tables:
+                column = getattr(table, name)
+                # old code -> merged code; MISSING (-1) maps through the extra last entry
+                recode = np.array([merged.encode(value) for value in column.values] + [MISSING], dtype=np.int32)
+                codes.append(recode[column.codes])
+            merged.codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int32)
+            columns[name] = merged
+        for name, dtype in (('start', np.int64), ('end', np.int64), ('score', np.float64),
+                            ('strand', np.int8), ('phase', np.int8)):
+            arrays = [getattr(table, name) for table in tables]
+            columns[name] = np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+        buffers, offsets, base = [], [np.zeros(1, dtype=np.int64)], 0
+        for table in tables:
+            # pending attribute changes are written back before packing
+            for row in list(table.modifiedAttributes):
+                table.getRawAttributes(row)
+            packed = table.attributes.compacted()
+            buffers.append(packed.buffer)
+            offsets.append(packed.offsets[1:] + base)
+            base += len(packed.buffer)
+        columns['attributes'] = PackedStrings(
+            np.concatenate(buffers) if buffers else np.zeros(0, dtype=np.uint8), np.concatenate(offsets))
+        return cls(**columns)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("GFF3Table row out of range: {}".format(row))
+        return GFF3Row(self, row)
+
+    def __iter__(self):
+        for row in xrange(len(self)):
+            yield GFF3Row(self, row)
+
+    def selectRows(self, types=None, seqids=None):
+        """row numbers, in order, of the features of these types / on these seqids (None: any)"""
+        mask = np.ones(len(self), dtype=bool)
+        for column, wanted in ((self.type, types), (self.seqid, seqids)):
+            if wanted is not None:
+                codes = [column.codeOf[value] for value in wanted if value in column.codeOf]
+                if None in wanted:
+                    codes.append(MISSING)
+                mask &= np.in1d(column.codes, codes)
+        return np.flatnonzero(mask).tolist()
+
+    def getAttributes(self, row):
+        """decoded attributes of a row; changes to the dict are kept by the table"""
+        if row in self.modifiedAttributes:
+            return self.modifiedAttributes[row]
+        lastRow, attributes = self._lastDecoded
+        if lastRow != row:
+            attributes = parse_GFF_attributes(self.attributes[row])
+            attributes.onModify = lambda attributes: self.modifiedAttributes.__setitem__(row, attributes)
+            self._lastDecoded = (row, attributes)
+        return attributes
+
+    def setAttributes(self, row, attributes):
+        self.modifiedAttributes.pop(row, None)
+        self._lastDecoded = (None, None)
+        if isinstance(attributes, basestring):
+            self.attributes[row] = attributes
+        elif isinstance(attributes, GFF3Attributes):
+            self.attributes[row] = str(attributes)
+        else:
+            self.attributes[row] = '.' if not attributes else ';'.join(["{}={}".format(k, v) for k, v in attributes.items()])
+
+    def getRawAttributes(self, row):
+        """attribute column text of a row. Pending changes are written back
+        into the packed column and the decoded dict is dropped."""
+        attributes = self.modifiedAttributes.pop(row, None)
+        if attributes is not None:
+            raw = str(attributes)
+            self.attributes[row] = raw
+            # a later change registers the dict again
+            attributes.raw = raw
+            attributes.modified = False
+            return raw
+        return self.attributes[row]
+
+    def getUnchangedAttributes(self, row):
+        """attribute column text of a row, None if it has pending changes"""
+        if row in self.modifiedAttributes:
+            return None
+        return self.attributes[row]
+
+    def getAttribute(self, row, key, default=None):
+        """value of a single attribute, without decoding the row if it is unchanged"""
+        if row in self.modifiedAttributes:
+            return self.modifiedAttributes[row].get(key, default)
+        return get_GFF_attribute(self.attributes[row], key, default)
+
+    def getAttributeValues(self, row, keys, default=None):
+        """values of several attributes in the order of keys, without decoding the row if it is unchanged"""
+        if row in self.modifiedAttributes:
+            attributes = self.modifiedAttributes[row]
+            return [attributes.get(key, default) for key in keys]
+        return get_GFF_attributes(self.attributes[row], keys, default)
+
+    def toRecord(self, row):
+        """standalone GFF3Record copy of a row"""
+        view = GFF3Row(self, row)
+        return GFF3Record(view.seqid, view.source, view.type, view.start, view.end,
+                          view.score, view.strand, view.phase, view.rawAttributes)
+
+    def toRecords(self, rows=None):
+        """standalone GFF3Record copies of rows (row numbers in increasing order, default: all).
+        Columns are read RECORD_BLOCK_ROWS rows at a time instead of field by field."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        buffer, offsets = self.attributes.buffer, self.attributes.offsets
+        pending = set(self.modifiedAttributes).union(self.attributes.overrides)
+        for blockStart in xrange(0, len(rows), RECORD_BLOCK_ROWS):
+            block = rows[blockStart:blockStart + RECORD_BLOCK_ROWS]
+            first, last = block.item(0), block.item(len(block) - 1)
+            if last - first < 4 * len(block):
+                # one copy of the block's attribute text, sliced per row
+                base = offsets.item(first)
+                text = buffer[base:offsets.item(last + 1)].tostring()
+                attributes = [text[start:end] for start, end in
+                              zip((offsets[block] - base).tolist(), (offsets[block + 1] - base).tolist())]
+            else:
+                # few rows spread over the table
+                attributes = [self.attributes[row] for row in block.tolist()]
+            if pending:
+                for row in pending.intersection(block.tolist()):
+                    attributes[int(np.searchsorted(block, row))] = self.getRawAttributes(row)
+            for fields in zip(self.seqid.decode(block), self.source.decode(block), self.type.decode(block),
+                              [None if value == MISSING else value for value in self.start[block].tolist()],
+                              [None if value == MISSING else value for value in self.end[block].tolist()],
+                              [None if value != value else value for value in self.score[block].tolist()],
+                              [STRAND_VALUES[value] for value in self.strand[block].tolist()],
+                              [None if value == MISSING else value for value in self.phase[block].tolist()],
+                              attributes):
+                yield GFF3Record(*fields)
+
+    def nbytes(self):
+        """approximate memory held by the columns, in bytes"""
+        return sum(column.nbytes for column in (
+            self.seqid.codes, self.source.codes, self.type.codes, self.start, self.end,
+            self.score, self.strand, self.phase, self.attributes.buffer, self.attributes.offsets))
@@ -0,0 +1,168 @@
+"""
+Indexed ID<->Name store (SQLite) for DisplayName runs.
+
+The _id2nameMap text files have to be read whole to translate a few IDs. The
+store keeps the mappings of any number of GSAP runs in one SQLite file,
+indexed by ID, by name and by (seqid number, gene number), so lookups read a
+few pages. Each run is loaded in one transaction and replaces an earlier
+load of the same run id.
+
+Example:
+store = NameStore('names.db')
+store.loadMapFile('20', 'output.gff3_id2nameMap')
+store.toNames(['G00001', 'G00001-T1'])          # {'G00001': 'dpzm01g00100.20', ...}
+store.toIds(['dpzm01g00100.20'])
+store.namesInRange(1, 100, 500)                  # [(ID, name), ...] of genes 100-500 on seqid 1
+
+python -m DisplayName.namestore names.db --load 20 output.gff3_id2nameMap
+python -m DisplayName.namestore names.db --ids G00001 G00002
+"""
+import re
+import sqlite3
+import time
+from .DN_Constants import DP_PREFIX
+
+# display name parts: seqnum, genenum - see DisplayName.formatGeneName
+GENE_NAME_PATTERN = re.compile(r'^{0}\D*?(\d+)g(\d+)\.'.format(DP_PREFIX))
+# most values in one query - SQLite allows 999 parameters
+QUERY_BATCH = 500
+# seconds to wait for a store locked by another process
+STORE_TIMEOUT = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    runId TEXT PRIMARY KEY,
+    loaded REAL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS names (
+    runId TEXT,
+    featureId TEXT,
+    name TEXT,
+    seqnum INTEGER,
+    genenum INTEGER,
+    PRIMARY KEY (runId, featureId)
+);
+CREATE INDEX IF NOT EXISTS names_featureId ON names (featureId);
+CREATE INDEX IF NOT EXISTS names_name ON names (name);
+CREATE INDEX IF NOT EXISTS names_gene ON names (seqnum, genenum);
+"""
+
+
+def nameNumbers(name):
+    """(seqid number, gene number) of a display name, (None, None) if it is not one"""
+    match = GENE_NAME_PATTERN.match(name)
+    if match is None:
+        return None, None
+    return int(match.group(1)), int(match.group(2))
+
+
+class NameStore(object):
+    """ID<->Name mappings of GSAP runs in an SQLite file - see module docstring"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        # wait for other runs (e.g. a batch) loading into the same store
+        self.connection = sqlite3.connect(filename, timeout=STORE_TIMEOUT)
+        self.connection.text_factory = str
+        self.connection.executescript(SCHEMA)
+
+    def loadRun(self, runId, mappings, source=''):
+        """store (ID, name) pairs as run runId, replacing any earlier load of it. One transaction."""
+        rows = ((runId, featureId, name) + nameNumbers(name) for featureId, name in mappings)
+        with self.connection:
+            self.connection.execute("DELETE FROM names WHERE runId = ?", (runId,))
+            self.connection.executemany("INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?)", (runId, time.time(), source))
+        return self.countNames(runId)
+
+    def loadMapFile(self, runId, mapFile):
+        """store an _id2nameMap file as run runId"""
+        with open(mapFile) as fh:
+            return self.loadRun(runId, (line.rstrip('\n').split('\t') for line in fh), mapFile)
+
+    def runs(self):
+        """run ids, oldest load first"""
+        return [row[0] for row in self.connection.execute("SELECT runId FROM runs ORDER BY loaded")]
+
+    def latestRun(self):
+        runs = self.runs()
+        return runs[-1] if runs else None
+
+    def countNames(self, runId):
+        return self.connection.execute("SELECT COUNT(*) FROM names WHERE runId = ?", (runId,)).fetchone()[0]
+
+    def _batchQuery(self, column, values, runId):
+        """(featureId, name) rows of runId whose column is in values"""
+        values = list(values)
+        for i in xrange(0, len(values), QUERY_BATCH):
+            batch = values[i:i + QUERY_BATCH]
+            query = "SELECT featureId, name FROM names WHERE runId = ? AND {0} IN ({1})".format(
+                column, ','.join('?' * len(batch)))
+            for row in self.connection.execute(query, [runId] + batch):
+                yield row
+
+    def toNames(self, featureIds, runId=None):
+        """{ID: name} for the IDs found in run runId (default: the latest loaded)"""
+        runId = runId or self.latestRun()
+        return dict(self._batchQuery('featureId', featureIds, runId))
+
+    def toIds(self, names, runId=None):
+        """{name: ID} for the names found in run runId (default: the latest loaded)"""
+        runId = runId or self.latestRun()
+        return dict((name, featureId) for featureId, name in self._batchQuery('name', names, runId))
+
+    def namesInRange(self, seqnum, startGenenum=None, endGenenum=None, runId=None):
+        """[(ID, name)] of the genes and their transcripts on seqid number seqnum with gene numbers
+           from startGenenum to endGenenum (inclusive, None: open), in gene number order"""
+        runId = runId or self.latestRun()
+        query = "SELECT featureId, name FROM names WHERE runId = ? AND seqnum = ?"
+        params = [runId, seqnum]
+        if startGenenum is not None:
+            query += " AND genenum >= ?"
+            params.append(startGenenum)
+        if endGenenum is not None:
+            query += " AND genenum <= ?"
+            params.append(endGenenum)
+        return self.connection.execute(query + " ORDER BY genenum, name", params).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Load and query a DisplayName ID<->Name store")
+    parser.add_argument("store", help="SQLite store file, created if missing")
+    parser.add_argument("--load", nargs=2, metavar=('RUNID', 'MAPFILE'), help="load an _id2nameMap file as a run")
+    parser.add_argument("--run", help="run id to query. Default: latest loaded")
+    parser.add_argument("--ids", nargs='+', help="print the names of these IDs")
+    parser.add_argument("--names", nargs='+', help="print the IDs of these names")
+    parser.add_argument("--seqnum", type=int, help="print the names on this seqid number")
+    parser.add_argument("--genes", nargs=2, type=int, metavar=('FROM', 'TO'), help="--seqnum: gene number range")
+    args = parser.parse_args()
+    with NameStore(args.store) as store:
+        if args.load:
+            count = store.loadMapFile(args.load[0], args.load[1])
+            print("{0} mappings loaded as run {1}".format(count, args.load[0]))
+        if args.ids:
+            found = store.toNames(args.ids, args.run)
+            for featureId in args.ids:
+                print("{0}\t{1}".format(featureId, found.get(featureId, '')))
+        if args.names:
+            found = store.toIds(args.names, args.run)
+            for name in args.names:
+                print("{0}\t{1}".format(found.get(name, ''), name))
+        if args.seqnum is not None:
+            startGenenum, endGenenum = args.genes or (None, None)
+            for featureId, name in store.namesInRange(args.seqnum, startGenenum, endGenenum, args.run):
+                print("{0}\t{1}".format(featureId, name))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Per-phase timing and memory of a DisplayName run.
+
+Each phase records wall time, CPU time (this process and finished worker
+processes), the peak RSS at its end and any counts the phase adds, with rates
+per second. Phases may nest: an outer phase's times exclude the phases run
+inside it, and a phase run more than once adds up. Each phase is logged when
+it ends, and all of them can be written as JSON. With profileDir, each phase
+is also run under its own cProfile (nested phases excluded, as for the times)
+and dumped to <profileDir>/<phase>.prof - read it with pstats.
+
+Example:
+metrics = PhaseMetrics(logger, profileDir='/temp/prof')
+with metrics.phase('parse'):
+    records = list(parse_GFF3('input.gff3'))
+    metrics.count('records', len(records))
+metrics.writeJson('output.gff3_metrics.json')
+"""
+import os
+import json
+import time
+import resource
+import cProfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """peak resident memory so far, in MB (ru_maxrss is KB on Linux)"""
+    return round(resource.getrusage(who).ru_maxrss / 1024.0, 1)
+
+
+def cpu_seconds():
+    """user + system CPU time of this process and its waited-for children"""
+    return sum(os.times()[:4])
+
+
+class PhaseMetrics(object):
+    """wall/CPU time, peak RSS and counts per phase - see module docstring"""
+
+    def __init__(self, logger=None, profileDir=None):
+        self.logger = logger
+        self.profileDir = profileDir
+        self.phases = OrderedDict() # phase name -> metrics, in the order phases first ended
+        self.running = [] # per running phase, innermost last: time of its nested phases, counts
+        self.profilers = {} # phase name -> cProfile.Profile, with profileDir
+
+    @contextmanager
+    def phase(self, name):
+        """time the with block as phase name"""
+        if self.running and self.running[-1]['profiler'] is not None:
+            self.running[-1]['profiler'].disable()
+        profiler = None
+        if self.profileDir:
+            profiler = self.profilers.setdefault(name, cProfile.Profile())
+        current = {'nestedWall': 0.0, 'nestedCpu': 0.0, 'counts': OrderedDict(), 'profiler': profiler}
+        self.running.append(current)
+        startWall, startCpu = time.time(), cpu_seconds()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall, cpu = time.time() - startWall, cpu_seconds() - startCpu
+            self.running.pop()
+            if self.running:
+                self.running[-1]['nestedWall'] += wall
+                self.running[-1]['nestedCpu'] += cpu
+            self.record(name, wall - current['nestedWall'], cpu - current['nestedCpu'], current['counts'])
+            if profiler is not None:
+                self.dumpProfile(name)
+            if self.running and self.running[-1]['profiler'] is not None:
+                self.running[-1]['profiler'].enable()
+
+    def count(self, key, value):
+        """add value to count key (e.g. 'records') of the innermost running phase"""
+        if self.running:
+            counts = self.running[-1]['counts']
+            counts[key] = counts.get(key, 0) + value
+
+    def record(self, name, wall, cpu, counts):
+        metrics = self.phases.setdefault(name, OrderedDict([('wall_sec', 0.0), ('cpu_sec', 0.0)]))
+        metrics['wall_sec'] = round(metrics['wall_sec'] + wall, 3)
+        metrics['cpu_sec'] = round(metrics['cpu_sec'] + cpu, 3)
+        metrics['peak_rss_mb'] = peak_rss_mb()
+        metrics['peak_rss_children_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+        for key, value in counts.items():
+            metrics[key] = metrics.get(key, 0) + value
+            metrics[key + '_per_sec'] = round(metrics[key] / metrics['wall_sec'], 1) if metrics['wall_sec'] else None
+        if self.logger is not None:
+            rates = ''.join(", {0} {1} ({2:,.0f}/s)".format(value, key, value / wall if wall else 0)
+                            for key, value in counts.items())
+            self.logger.info("Phase {0}: {1:.2f}s wall, {2:.2f}s CPU, peak RSS {3} MB{4}".format(
+                name, wall, cpu, metrics['peak_rss_mb'], rates))
+
+    def dumpProfile(self, name):
+        if not os.path.isdir(self.profileDir):
+            os.makedirs(self.profileDir)
+        self.profilers[name].dump_stats(os.path.join(self.profileDir, name + '.prof'))
+
+    def toDict(self):
+        return OrderedDict([('phases', self.phases),
+                            ('wall_sec', round(sum(m['wall_sec'] for m in self.phases.values()), 3)),
+                            ('cpu_sec', round(sum(m['cpu_sec'] for m in self.phases.values()), 3)),
+                            ('peak_rss_mb', peak_rss_mb()),
+                            ('peak_rss_children_mb', peak_rss_mb(resource.RUSAGE_CHILDREN))])
+
+    def writeJson(self, filename):
+        with open(filename, 'w') as fh:
+            json.dump(self.toDict(), fh, indent=2)
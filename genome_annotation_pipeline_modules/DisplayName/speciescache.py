@@ -0,0 +1,114 @@
+"""
+On-disk cache of species code lookups.
+
+DisplayName asks two web services for the species code: the GAIA Genome Repo
+(assembly id -> taxon id) and the species code service (taxon id or scientific
+name -> code). Answers are kept in a small JSON file, so repeated runs for the
+same organism make no network calls:
+
+    {"assembly": {"219": {"value": 4577, "time": 1444000000.0}},
+     "taxon":    {"4577": {"value": "Zm", "time": 1444000000.0}},
+     "sciname":  {"Zea mays": {"value": "Zm", "time": 1444000000.0}}}
+
+Entries older than ttl seconds are looked up again; a stale entry is still
+used when the service cannot be reached. Writes go to a temp file renamed into
+place and merge with what other runs wrote meanwhile, so runs can share a cache.
+
+Example:
+cache = SpeciesCodeCache('~/.displayName_speciescode.json', ttl=30 * 24 * 3600)
+code = cache.get('taxon', 4577)
+if code is None:
+    code = fetchJson(SPECIESCODE_TAXON_API + '4577', timeout=30, retries=3)['SpeciesCode']
+    cache.put('taxon', 4577, code)
+"""
+import os
+import json
+import time
+import socket
+import urllib2
+
+
+class SpeciesCodeCache(object):
+    """kind -> key -> value lookup cache in a JSON file, entries expiring after ttl seconds"""
+
+    def __init__(self, filename, ttl=None):
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        self.ttl = ttl # None: entries never expire
+        self.entries = self._load()
+
+    def _load(self):
+        """cache file contents, empty if there is none or it cannot be read"""
+        try:
+            with open(self.filename) as fh:
+                entries = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def get(self, kind, key, allowStale=False):
+        """cached value, None if missing or (unless allowStale) expired"""
+        entry = self.entries.get(kind, {}).get(_cacheKey(key))
+        if not entry:
+            return None
+        if not allowStale and self.ttl is not None and time.time() - entry.get('time', 0) > self.ttl:
+            return None
+        value = entry.get('value')
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return value
+
+    def put(self, kind, key, value):
+        """store value and write the cache file. Returns False if it could not be written,
+        the value is then kept for this run only."""
+        entry = {'value': value, 'time': time.time()}
+        self.entries.setdefault(kind, {})[_cacheKey(key)] = entry
+        # keep what other runs added since we loaded
+        entries = self._load()
+        entries.setdefault(kind, {})[_cacheKey(key)] = entry
+        tmpFile = '{0}.tmp.{1}'.format(self.filename, os.getpid())
+        try:
+            with open(tmpFile, 'w') as fh:
+                json.dump(entries, fh, indent=1, sort_keys=True)
+            os.rename(tmpFile, self.filename)
+        except (IOError, OSError):
+            if os.path.exists(tmpFile):
+                os.remove(tmpFile)
+            return False
+        self.entries = entries
+        return True
+
+
+def _cacheKey(key):
+    """JSON object keys are unicode - ids and names are stored as text"""
+    if isinstance(key, str):
+        return key.decode('utf-8')
+    return unicode(key)
+
+
+def fetchJson(url, timeout=30, retries=3, backoff=1.0, logger=None):
+    """GET url and parse the JSON answer.
+    Connection errors, timeouts and 5xx answers are retried up to retries more times,
+    waiting backoff, 2*backoff, ... seconds in between. Other HTTP errors are raised at once."""
+    attempt = 0
+    while True:
+        try:
+            response = urllib2.urlopen(urllib2.Request(url), timeout=timeout)
+            try:
+                return json.loads(response.read().decode())
+            finally:
+                response.close()
+        except urllib2.HTTPError as e:
+            if e.code < 500 or attempt >= retries:
+                raise
+            error = "Error Code: {0}. Reason: {1}".format(e.code, e.reason)
+        except (urllib2.URLError, socket.timeout, socket.error) as e:
+            if attempt >= retries:
+                raise
+            error = getattr(e, 'reason', e)
+        wait = backoff * (2 ** attempt)
+        attempt += 1
+        if logger is not None:
+            logger.warn("Request {0} failed: {1}. Retry {2} of {3} in {4:.1f}s".format(url, error, attempt, retries, wait))
+        time.sleep(wait)
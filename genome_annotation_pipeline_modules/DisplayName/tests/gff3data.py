@@ -0,0 +1,57 @@
+"""
+Small synthetic GFF3 annotations for the DisplayName tests.
+
+Genes on a few ZmChr<NN>v2 seqids and a scaffold, each followed by its
+mRNA/tRNA, exon and CDS lines, as a gene prediction pipeline writes them.
+Some gene IDs are repeated and some attributes are escaped.
+"""
+import random
+from ..bgzf import compressBlock, EOF_BLOCK
+
+SEQIDS = ['ZmChr01v2', 'ZmChr02v2', 'ZmChr10v2', 'scaffold_7']
+SEQID_REGEX = r'ZmChr(?P<num>\d+)v2'
+
+
+def gff3Text(genes=60, seed=1, region=False):
+    """GFF3 file contents with this many genes. region adds a whole-sequence region line."""
+    rand = random.Random(seed)
+    lines = ['##gff-version 3']
+    if region:
+        lines.append('\t'.join([SEQIDS[0], 'maker', 'region', '1', '2000000', '.', '.', '.', 'ID=chr01']))
+    ids = []
+    for gene in xrange(genes):
+        seqid = rand.choice(SEQIDS)
+        start = rand.randint(1, 1000000)
+        geneId = 'G%05d' % gene if rand.random() > 0.05 or not ids else rand.choice(ids)
+        ids.append(geneId)
+        strand = rand.choice('+-?')
+        name = 'gene%20name' if rand.random() < 0.1 else 'gn%d' % gene
+        lines.append('\t'.join([seqid, 'maker', 'gene', str(start), str(start + 3000), '.', strand, '.',
+                                'ID=%s;Name=%s' % (geneId, name)]))
+        for transcript in xrange(rand.randint(1, 3)):
+            transcriptId = '%s-T%d' % (geneId, transcript + 1)
+            kind = 'mRNA' if rand.random() > 0.1 else 'tRNA'
+            lines.append('\t'.join([seqid, 'maker', kind, str(start), str(start + 3000), '0.5', strand, '.',
+                                    'ID=%s;Parent=%s;Note=a%%3Bb' % (transcriptId, geneId)]))
+            for exon in xrange(rand.randint(1, 4)):
+                exonStart, exonEnd = str(start + exon * 500), str(start + exon * 500 + 200)
+                lines.append('\t'.join([seqid, 'maker', 'exon', exonStart, exonEnd, '.', strand, '.',
+                                        'ID=%s.exon%d;Parent=%s' % (transcriptId, exon + 1, transcriptId)]))
+                lines.append('\t'.join([seqid, 'maker', 'CDS', exonStart, exonEnd, '.', strand, str(exon % 3),
+                                        'ID=%s.cds%d;Parent=%s' % (transcriptId, exon + 1, transcriptId)]))
+    return '\n'.join(lines) + '\n'
+
+
+def writeGff3(filename, text):
+    with open(filename, 'w') as fh:
+        fh.write(text)
+    return filename
+
+
+def writeBgzf(filename, text, blockSize=997):
+    """text as BGZF in blocks of blockSize bytes, so lines run over block ends"""
+    with open(filename, 'wb') as fh:
+        for i in xrange(0, len(text), blockSize):
+            fh.write(compressBlock(text[i:i + blockSize]))
+        fh.write(EOF_BLOCK)
+    return filename
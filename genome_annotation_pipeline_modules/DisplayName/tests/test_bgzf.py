@@ -0,0 +1,57 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from ..bgzf import BgzfReader, isBgzf, iterBlocks, compressBlocks, makeVirtualOffset, \
+    splitVirtualOffset, EOF_BLOCK
+from .gff3data import gff3Text, writeBgzf
+
+
+class BgzfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.text = gff3Text()
+        self.bgzfFile = writeBgzf(os.path.join(self.tempDir, 'input.gff3.gz'), self.text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testGzipCompatible(self):
+        self.assertTrue(isBgzf(self.bgzfFile))
+        self.assertEqual(gzip.open(self.bgzfFile).read(), self.text)
+        plainGzip = os.path.join(self.tempDir, 'plain.gz')
+        with gzip.open(plainGzip, 'wb') as fh:
+            fh.write(self.text)
+        self.assertFalse(isBgzf(plainGzip))
+
+    def testCompressBlocks(self):
+        blocked = os.path.join(self.tempDir, 'blocks.gz')
+        text = self.text * 20
+        with open(blocked, 'wb') as fh:
+            fh.write(compressBlocks(text) + EOF_BLOCK)
+        self.assertGreater(len(list(iterBlocks(blocked))), 2)
+        self.assertEqual(gzip.open(blocked).read(), text)
+
+    def testVirtualOffsets(self):
+        self.assertEqual(splitVirtualOffset(makeVirtualOffset(123456, 789)), (123456, 789))
+        reader = BgzfReader(self.bgzfFile)
+        offsets, lines = [], []
+        while True:
+            offset = reader.tell()
+            line = reader.readline()
+            if not line:
+                break
+            offsets.append(offset)
+            lines.append(line)
+        self.assertEqual(''.join(lines), self.text)
+        # lines run over block ends, and are read back from their offsets in any order
+        for i in reversed(xrange(0, len(lines), 7)):
+            reader.seek(offsets[i])
+            self.assertEqual(reader.readline(), lines[i])
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import random
+import unittest
+from ..gff3parser import parse_GFF3_line
+from ..gff3hierarchy import GFF3Hierarchy
+from .gff3data import gff3Text
+
+
+class GFF3HierarchyTest(unittest.TestCase):
+
+    def setUp(self):
+        lines = [line for line in gff3Text().splitlines() if line and not line.startswith('#')]
+        self.records = [parse_GFF3_line(line) for line in lines]
+
+    def checkParentsFirst(self, hierarchy, records):
+        for row in hierarchy.rowsOfType('gene'):
+            seen = set([records[row].getAttribute('ID')])
+            for below in hierarchy.descendantRows(row):
+                for parentId in hierarchy.parentIds(below):
+                    self.assertIn(parentId, seen)
+                seen.add(records[below].getAttribute('ID'))
+
+    def testFileOrder(self):
+        hierarchy = GFF3Hierarchy(self.records)
+        self.assertEqual(hierarchy.unresolvedRows(), [])
+        placed = sum(1 + len(rows) for rows in hierarchy.descendantsByRow('gene').values())
+        self.assertGreaterEqual(placed, len(self.records))
+        self.checkParentsFirst(hierarchy, self.records)
+
+    def testShuffled(self):
+        records = list(self.records)
+        random.Random(4).shuffle(records)
+        hierarchy = GFF3Hierarchy(records)
+        self.assertEqual(hierarchy.unresolvedRows(), [])
+        self.checkParentsFirst(hierarchy, records)
+        row = hierarchy.rowOf('G00003')
+        self.assertEqual(sorted(records[child].getAttribute('ID') for child in hierarchy.childRows('G00003')),
+                         sorted(record.getAttribute('ID') for record in records
+                                if record.getAttribute('Parent') == 'G00003'))
+        self.assertEqual(records[row].type, 'gene')
+
+    def testUnresolved(self):
+        records = self.records + [parse_GFF3_line('ZmChr01v2\tmaker\texon\t1\t9\t.\t+\t.\tID=e;Parent=nowhere')]
+        self.assertEqual(GFF3Hierarchy(records).unresolvedRows(), [len(records) - 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
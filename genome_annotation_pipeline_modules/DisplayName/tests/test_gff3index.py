@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ..gff3parser import parse_GFF3
+from ..gff3index import GFF3Index, INDEX_SUFFIX
+from .gff3data import gff3Text, writeGff3, writeBgzf, SEQIDS
+
+
+class GFF3IndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.text = gff3Text(region=True)
+        self.records = list(parse_GFF3(writeGff3(os.path.join(self.tempDir, 'records.gff3'), self.text)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def expected(self, seqid, start, end):
+        return [str(record) for record in self.records
+                if record.seqid == seqid and record.start <= end and record.end >= start]
+
+    def checkQueries(self, filename):
+        index = GFF3Index.open(filename)
+        for seqid in SEQIDS + ['missing']:
+            for start, end in ((1, 1000000), (200000, 300000), (500000, 500000), (999000, 2000000)):
+                self.assertEqual([str(record) for record in index.query(seqid, start, end)],
+                                 self.expected(seqid, start, end))
+        index.close()
+
+    def testPlain(self):
+        self.checkQueries(writeGff3(os.path.join(self.tempDir, 'input.gff3'), self.text))
+
+    def testBgzf(self):
+        self.checkQueries(writeBgzf(os.path.join(self.tempDir, 'input.gff3.gz'), self.text))
+
+    def testSavedIndex(self):
+        filename = writeGff3(os.path.join(self.tempDir, 'input.gff3'), self.text)
+        GFF3Index.open(filename)
+        self.assertTrue(os.path.exists(filename + INDEX_SUFFIX))
+        self.assertIsNotNone(GFF3Index.load(filename))
+        self.checkQueries(filename)
+        writeGff3(filename, gff3Text(genes=5, seed=3))
+        self.assertIsNone(GFF3Index.load(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
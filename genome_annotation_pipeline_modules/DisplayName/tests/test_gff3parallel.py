@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+from .. import gff3parallel
+from ..gff3parallel import parse_GFF3_parallel, splitRanges
+from ..gff3parser import parse_GFF3
+from .gff3data import gff3Text, writeGff3, writeBgzf
+
+
+class ParallelParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.text = gff3Text(genes=150)
+        # split a small file into many ranges
+        self.minRangeBytes = gff3parallel.MIN_RANGE_BYTES
+        gff3parallel.MIN_RANGE_BYTES = 1000
+
+    def tearDown(self):
+        gff3parallel.MIN_RANGE_BYTES = self.minRangeBytes
+        shutil.rmtree(self.tempDir)
+
+    def checkSameAsSerial(self, filename):
+        self.assertGreater(len(splitRanges(filename, 2 * gff3parallel.RANGES_PER_WORKER)), 4)
+        serial = [str(record) for record in parse_GFF3(filename)]
+        self.assertEqual([str(record) for record in parse_GFF3_parallel(filename, workers=2)], serial)
+        table = parse_GFF3_parallel(filename, workers=2, asTables=True)
+        self.assertEqual([str(row) for row in table], serial)
+        filtered = parse_GFF3_parallel(filename, workers=2, types=['gene'])
+        self.assertEqual([str(record) for record in filtered],
+                         [str(record) for record in parse_GFF3(filename, types=['gene'])])
+
+    def testPlain(self):
+        self.checkSameAsSerial(writeGff3(os.path.join(self.tempDir, 'input.gff3'), self.text))
+
+    def testBgzf(self):
+        self.checkSameAsSerial(writeBgzf(os.path.join(self.tempDir, 'input.gff3.gz'), self.text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ..gff3parser import parse_GFF3
+from ..gff3table import GFF3Table
+from ..gff3cache import cachePath, saveCache, loadCache, cachedTable
+from .gff3data import gff3Text, writeGff3
+
+
+class GFF3TableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.text = gff3Text()
+        self.inputFile = writeGff3(os.path.join(self.tempDir, 'input.gff3'), self.text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def assertSameRecords(self, table, records):
+        self.assertEqual(len(table), len(records))
+        self.assertEqual([str(row) for row in table], [str(record) for record in records])
+
+    def testRoundTrip(self):
+        table = GFF3Table.fromFile(self.inputFile)
+        lines = [line for line in self.text.splitlines() if line and not line.startswith('#')]
+        self.assertEqual([str(row) for row in table], lines)
+        self.assertSameRecords(table, list(parse_GFF3(self.inputFile)))
+
+    def testToRecords(self):
+        table = GFF3Table.fromFile(self.inputFile)
+        self.assertEqual([str(record) for record in table.toRecords()], [str(row) for row in table])
+        rows = [0, 5, 7, len(table) - 1]
+        self.assertEqual([str(record) for record in table.toRecords(rows)], [str(table[row]) for row in rows])
+
+    def testSetFields(self):
+        table = GFF3Table.fromFile(self.inputFile)
+        row = table[1]
+        row.strand = '-'
+        row.score = None
+        row.attributes['Name'] = 'renamed'
+        self.assertEqual(row.strand, '-')
+        self.assertEqual(row.getAttribute('Name'), 'renamed')
+        self.assertEqual(str(row).split('\t')[5:7], ['.', '-'])
+
+    def testUnknownStrand(self):
+        lines = self.text.splitlines()
+        fields = lines[2].split('\t')
+        fields[6] = 'x'
+        lines[2] = '\t'.join(fields)
+        writeGff3(self.inputFile, '\n'.join(lines) + '\n')
+        self.assertRaises(ValueError, GFF3Table.fromFile, self.inputFile)
+        table = GFF3Table.fromFile(writeGff3(self.inputFile, self.text))
+        with self.assertRaises(ValueError):
+            table[0].strand = 'x'
+
+    def testConcat(self):
+        table = GFF3Table.fromFile(self.inputFile)
+        records = list(parse_GFF3(self.inputFile))
+        parts = [GFF3Table.fromRecords(records[:10]), GFF3Table.fromRecords(records[10:])]
+        self.assertSameRecords(GFF3Table.concat(parts), records)
+
+
+class GFF3CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.inputFile = writeGff3(os.path.join(self.tempDir, 'input.gff3'), gff3Text())
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testRoundTrip(self):
+        self.assertIsNone(loadCache(self.inputFile))
+        table = cachedTable(self.inputFile)
+        self.assertTrue(os.path.isdir(cachePath(self.inputFile)))
+        cached = loadCache(self.inputFile)
+        self.assertEqual([str(row) for row in cached], [str(row) for row in table])
+
+    def testChangedInputIsReparsed(self):
+        cachedTable(self.inputFile)
+        writeGff3(self.inputFile, gff3Text(genes=10, seed=2))
+        # mtime may not move within the same second - the size does
+        self.assertIsNone(loadCache(self.inputFile))
+        self.assertEqual([str(row) for row in cachedTable(self.inputFile)],
+                         [str(record) for record in parse_GFF3(self.inputFile)])
+
+    def testTruncatedCacheIsRebuilt(self):
+        saveCache(GFF3Table.fromFile(self.inputFile), self.inputFile)
+        with open(os.path.join(cachePath(self.inputFile), 'start.npy'), 'r+b') as fh:
+            fh.truncate(100)
+        self.assertIsNone(loadCache(self.inputFile))
+        self.assertEqual(len(cachedTable(self.inputFile)), len(list(parse_GFF3(self.inputFile))))
+
+    def testChangesStayInMemory(self):
+        cachedTable(self.inputFile)
+        cached = loadCache(self.inputFile)
+        original = str(cached[0])
+        cached[0].start = 1
+        self.assertEqual(str(loadCache(self.inputFile)[0]), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
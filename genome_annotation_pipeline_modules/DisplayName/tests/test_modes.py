@@ -0,0 +1,127 @@
+"""Every DisplayName mode writes the same files as the in-memory path. Needs phi."""
+import os
+import shutil
+import tempfile
+import unittest
+from .gff3data import gff3Text, writeGff3, writeBgzf, SEQID_REGEX
+
+try:
+    import phi.Logger
+    from ..DisplayName import DisplayName, StreamingDisplayName, ExternalSortDisplayName, \
+        ShardedDisplayName, IncrementalDisplayName
+    from ..batch import DisplayNameBatch
+except ImportError:
+    phi = None
+
+OUTPUT_SUFFIXES = ['', '_id2nameMap', '_seqidMap']
+
+
+@unittest.skipIf(phi is None, "phi is not installed")
+class ModeEquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.logger = phi.Logger.Logger('DisplayNameTest', open(os.devnull, 'w'))
+        self.inputFile = writeGff3(os.path.join(self.tempDir, 'input.gff3'), gff3Text(genes=120))
+        self.expected = self.runMode(DisplayName, 'memory.gff3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def runMode(self, cls, outputName, inputFile=None, **options):
+        """output file contents of one run, by file suffix"""
+        outputFile = os.path.join(self.tempDir, outputName)
+        analysis = cls(inputFile or self.inputFile, outputFile, '20', SEQID_REGEX, None, None,
+                       'Zea mays', self.logger, speciesCode='Zm', speciesCacheFile=None, **options)
+        analysis.writeGff3()
+        contents = {}
+        for suffix in OUTPUT_SUFFIXES:
+            with open(outputFile + suffix) as fh:
+                contents[suffix] = fh.read()
+        return contents
+
+    def assertSameOutput(self, contents):
+        for suffix in OUTPUT_SUFFIXES:
+            self.assertEqual(contents[suffix], self.expected[suffix], 'output' + suffix + ' differs')
+
+    def testNamesWritten(self):
+        self.assertIn('Name=dpzm', self.expected[''])
+        self.assertTrue(self.expected['_id2nameMap'])
+
+    def testTable(self):
+        self.assertSameOutput(self.runMode(DisplayName, 'table.gff3', useTable=True))
+
+    def testCache(self):
+        self.assertSameOutput(self.runMode(DisplayName, 'cache1.gff3', useTable=True, useCache=True))
+        self.assertSameOutput(self.runMode(DisplayName, 'cache2.gff3', useTable=True, useCache=True))
+        self.assertSameOutput(self.runMode(DisplayName, 'cache3.gff3', useCache=True))
+
+    def testWorkers(self):
+        self.assertSameOutput(self.runMode(DisplayName, 'workers.gff3', workers=2))
+
+    def testBgzfInput(self):
+        bgzfFile = writeBgzf(self.inputFile + '.gz', open(self.inputFile).read())
+        self.assertSameOutput(self.runMode(DisplayName, 'bgzf.gff3', inputFile=bgzfFile))
+
+    def testStreaming(self):
+        self.assertSameOutput(self.runMode(StreamingDisplayName, 'stream.gff3'))
+
+    def testExternalSort(self):
+        # a tiny memory budget, so the gene blocks are spilled in several runs
+        self.assertSameOutput(self.runMode(ExternalSortDisplayName, 'external.gff3', memoryBudget=0,
+                                       tempDir=self.tempDir))
+
+    def testSharded(self):
+        self.assertSameOutput(self.runMode(ShardedDisplayName, 'sharded.gff3', workers=2, tempDir=self.tempDir))
+
+    def testIncrementalUnchanged(self):
+        previous = os.path.join(self.tempDir, 'memory.gff3')
+        self.assertSameOutput(self.runMode(IncrementalDisplayName, 'incremental.gff3', previousOutput=previous))
+
+    def testIncrementalKeepsNames(self):
+        # the first 100 of the 120 genes: none are renamed
+        previous = os.path.join(self.tempDir, 'memory.gff3')
+        fewerGenes = writeGff3(os.path.join(self.tempDir, 'fewer.gff3'), gff3Text(genes=100))
+        contents = self.runMode(IncrementalDisplayName, 'fewer.out.gff3', inputFile=fewerGenes,
+                                previousOutput=previous)
+        previousNames = set(self.expected['_id2nameMap'].splitlines())
+        names = contents['_id2nameMap'].splitlines()
+        self.assertTrue(names)
+        self.assertTrue(previousNames.issuperset(names))
+
+
+@unittest.skipIf(phi is None, "phi is not installed")
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.logger = phi.Logger.Logger('DisplayNameTest', open(os.devnull, 'w'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testManifest(self):
+        for seed in (1, 2):
+            writeGff3(os.path.join(self.tempDir, 'input%d.gff3' % seed), gff3Text(genes=30, seed=seed))
+        manifest = os.path.join(self.tempDir, 'release.manifest')
+        with open(manifest, 'w') as fh:
+            fh.write('#input\toutput\trunId\tseqid regex\torganism\n')
+            for seed in (1, 2):
+                fh.write('\t'.join(['input%d.gff3' % seed, os.path.join(self.tempDir, 'output%d.gff3' % seed),
+                                    '20', SEQID_REGEX, 'sciname:Zea mays']) + '\n')
+        speciesCache = os.path.join(self.tempDir, 'speciescode.json')
+        with open(speciesCache, 'w') as fh:
+            fh.write('{"sciname": {"Zea mays": {"value": "Zm", "time": 0}}}')
+        batch = DisplayNameBatch(manifest, self.logger, processes=2,
+                                 lookupOptions={'speciesCacheFile': speciesCache, 'offline': True})
+        self.assertEqual(batch.run(), 0)
+        self.assertEqual([summary['status'] for summary in batch.summaries], ['ok', 'ok'])
+        expected = DisplayName(os.path.join(self.tempDir, 'input2.gff3'), os.path.join(self.tempDir, 'single.gff3'),
+                               '20', SEQID_REGEX, None, None, 'Zea mays', self.logger, speciesCode='Zm')
+        expected.writeGff3()
+        with open(os.path.join(self.tempDir, 'single.gff3')) as fh:
+            self.assertEqual(open(os.path.join(self.tempDir, 'output2.gff3')).read(), fh.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
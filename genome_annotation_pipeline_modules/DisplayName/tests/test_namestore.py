@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ..namestore import NameStore, nameNumbers
+
+
+class NameStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.store = NameStore(os.path.join(self.tempDir, 'names.db'))
+        self.mappings = [('G00001', 'dpzm01g00100.20'), ('G00001-T1', 'dpzm01g00100.20.1'),
+                         ('G00002', 'dpzm01g00200.20'), ('G00003', 'dpzm02g00100.20'),
+                         ('G00004', 'dpzm00g00100.20')]
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempDir)
+
+    def testNameNumbers(self):
+        self.assertEqual(nameNumbers('dpzm01g00100.20'), (1, 100))
+        self.assertEqual(nameNumbers('dpzm01g00100.20.1'), (1, 100))
+        self.assertEqual(nameNumbers('G00001'), (None, None))
+
+    def testLookups(self):
+        self.assertEqual(self.store.loadRun('20', self.mappings), len(self.mappings))
+        self.assertEqual(self.store.toNames(['G00001', 'G00003', 'missing']),
+                         {'G00001': 'dpzm01g00100.20', 'G00003': 'dpzm02g00100.20'})
+        self.assertEqual(self.store.toIds(['dpzm01g00200.20']), {'dpzm01g00200.20': 'G00002'})
+        self.assertEqual(self.store.namesInRange(1, 100, 150),
+                         [('G00001', 'dpzm01g00100.20'), ('G00001-T1', 'dpzm01g00100.20.1')])
+        self.assertEqual([name for featureId, name in self.store.namesInRange(1)],
+                         ['dpzm01g00100.20', 'dpzm01g00100.20.1', 'dpzm01g00200.20'])
+
+    def testRuns(self):
+        self.store.loadRun('20', self.mappings)
+        self.store.loadRun('21', [('G00001', 'dpzm01g00100.21')])
+        self.assertEqual(self.store.latestRun(), '21')
+        self.assertEqual(self.store.toNames(['G00001']), {'G00001': 'dpzm01g00100.21'})
+        self.assertEqual(self.store.toNames(['G00001'], runId='20'), {'G00001': 'dpzm01g00100.20'})
+        # loading a run again replaces it
+        self.store.loadRun('20', self.mappings[:1])
+        self.assertEqual(self.store.countNames('20'), 1)
+
+    def testManyIds(self):
+        mappings = [('G%05d' % i, 'dpzm01g%05d.20' % i) for i in xrange(1200)]
+        self.store.loadRun('20', mappings)
+        self.assertEqual(self.store.toNames([featureId for featureId, name in mappings]), dict(mappings))
+
+    def testMapFile(self):
+        mapFile = os.path.join(self.tempDir, 'output.gff3_id2nameMap')
+        with open(mapFile, 'w') as fh:
+            fh.write(''.join('{0}\t{1}\n'.format(*mapping) for mapping in self.mappings))
+        self.assertEqual(self.store.loadMapFile('20', mapFile), len(self.mappings))
+        self.assertEqual(self.store.toIds(['dpzm00g00100.20']), {'dpzm00g00100.20': 'G00004'})
+
+
+if __name__ == '__main__':
+    unittest.main()
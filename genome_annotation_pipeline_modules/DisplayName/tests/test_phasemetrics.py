@@ -0,0 +1,47 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from ..phasemetrics import PhaseMetrics
+
+
+class PhaseMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testNestedPhases(self):
+        metrics = PhaseMetrics()
+        with metrics.phase('outer'):
+            time.sleep(0.05)
+            with metrics.phase('inner'):
+                time.sleep(0.1)
+                metrics.count('records', 10)
+            with metrics.phase('inner'):
+                metrics.count('records', 5)
+        phases = metrics.toDict()['phases']
+        self.assertEqual(phases.keys(), ['inner', 'outer'])
+        self.assertEqual(phases['inner']['records'], 15)
+        self.assertGreaterEqual(phases['inner']['wall_sec'], 0.1)
+        # the outer phase excludes the time of the inner ones
+        self.assertLess(phases['outer']['wall_sec'], 0.1)
+
+    def testJsonAndProfiles(self):
+        profileDir = os.path.join(self.tempDir, 'prof')
+        metrics = PhaseMetrics(profileDir=profileDir)
+        with metrics.phase('parse'):
+            sum(xrange(1000))
+        metricsFile = os.path.join(self.tempDir, 'metrics.json')
+        metrics.writeJson(metricsFile)
+        with open(metricsFile) as fh:
+            self.assertIn('parse', json.load(fh)['phases'])
+        self.assertTrue(os.path.exists(os.path.join(profileDir, 'parse.prof')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib2
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from ..speciescache import SpeciesCodeCache, fetchJson
+
+
+class SpeciesCodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cacheFile = os.path.join(self.tempDir, 'speciescode.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testPutGet(self):
+        cache = SpeciesCodeCache(self.cacheFile)
+        self.assertIsNone(cache.get('taxon', 4577))
+        self.assertTrue(cache.put('taxon', 4577, 'Zm'))
+        self.assertTrue(cache.put('sciname', 'Zea mays', 'Zm'))
+        reloaded = SpeciesCodeCache(self.cacheFile)
+        self.assertEqual(reloaded.get('taxon', '4577'), 'Zm')
+        self.assertEqual(reloaded.get('sciname', 'Zea mays'), 'Zm')
+
+    def testExpiry(self):
+        SpeciesCodeCache(self.cacheFile).put('taxon', 4577, 'Zm')
+        with open(self.cacheFile) as fh:
+            entries = json.load(fh)
+        entries['taxon']['4577']['time'] = time.time() - 100
+        with open(self.cacheFile, 'w') as fh:
+            json.dump(entries, fh)
+        cache = SpeciesCodeCache(self.cacheFile, ttl=10)
+        self.assertIsNone(cache.get('taxon', 4577))
+        self.assertEqual(cache.get('taxon', 4577, allowStale=True), 'Zm')
+
+    def testConcurrentWriters(self):
+        first, second = SpeciesCodeCache(self.cacheFile), SpeciesCodeCache(self.cacheFile)
+        first.put('taxon', 4577, 'Zm')
+        second.put('taxon', 3702, 'At')
+        reloaded = SpeciesCodeCache(self.cacheFile)
+        self.assertEqual((reloaded.get('taxon', 4577), reloaded.get('taxon', 3702)), ('Zm', 'At'))
+
+    def testUnreadableFile(self):
+        with open(self.cacheFile, 'w') as fh:
+            fh.write('not json')
+        self.assertIsNone(SpeciesCodeCache(self.cacheFile).get('taxon', 4577))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # answers with 503 this many times before the JSON answer
+    failures = 0
+
+    def do_GET(self):
+        if _Handler.failures > 0:
+            _Handler.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(json.dumps({'SpeciesCode': 'Zm', 'path': self.path}))
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchJsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}/taxon/'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def testRetries(self):
+        _Handler.failures = 2
+        result = fetchJson(self.url + '4577', timeout=5, retries=2, backoff=0.01)
+        self.assertEqual(result, {'SpeciesCode': 'Zm', 'path': '/taxon/4577'})
+
+    def testGivesUp(self):
+        _Handler.failures = 3
+        with self.assertRaises(urllib2.HTTPError):
+            fetchJson(self.url + '4577', timeout=5, retries=1, backoff=0.01)
+        _Handler.failures = 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,7 +26,7 @@ LSF_MAX_JOB_TOTAL = 300   # default is only 300.
 
 # max memory usage noted is 16000MB - new GMAP versions
 LSF_RESOURCES_GMAP = '-R "rusage[mem=20000,scr=100]"'
-LSF_DELAY_TIME_GMAP = 120 # in seconds.
+LSF_DELAY_TIME_GMAP = 120 # in seconds. Max wait for files to appear on the cluster nodes/submission host.
 LSF_GMAP_PROJECT_NAME = 'gtdi-gsap-gmap'
 
 GMAP_ANALYSIS_PARAMETERS = '-F -n 20 -K 50000 --min-identity=0.95 --min-trimmed-coverage=0.90'
@@ -39,12 +39,16 @@ from phi.LSF.Constants import DEFAULT_MAX_DISK_CHECK_FREQUENCY, \
     DEFAULT_MIN_FREE_SPACE_TO_WARN, DEFAULT_MIN_FREE_SPACE_TO_PAUSE
 import phi.LSF.Managers.ManyConcurrent
 import phi.DiskSpaceWarning
+from phi.Analyses.LSFFiles.FileWait import waitForFiles, waitForFileCommand
+from phi.Analyses.LSFFiles.LSFFiles_Constants import LSF_POLL_INTERVAL, \
+    LSF_POLL_MAX_INTERVAL
 from .Gmap_Constants import GMAP_ANALYSIS_NAME, \
     GMAP_ANALYSIS_PARAMETERS, LSF_DIR_GMAPDB, \
     GMAP_INDEX_FASTA, GMAP_INDEX_FAS, GMAP_INDEX_FA, \
     GMAP_INDEX_DBFILES, GMAP_TRANSCRIPT_TYPE, GMAP_GFF3_FIELD2, \
     GMAP_OUTPUT_FORMAT_GFF3, LSF_GMAP_PROJECT_NAME, LSF_MAX_JOB_TOTAL, \
-    LSF_DELAY_TIME_GMAP, LSF_RESOURCES_GMAP, GMAP_INDEX_GFF3, \
+    LSF_DELAY_TIME_GMAP, \
+    LSF_RESOURCES_GMAP, GMAP_INDEX_GFF3, \
     LSF_BIN_GMAP_V1, LSF_BIN_GMAP_BUILD_V1, \
     LSF_BIN_GMAP_V2, LSF_BIN_GMAP_BUILD_V2, LOCAL_BIN_GMAP_V2
 from phi.Parse import cleanFastaNSplit
@@ -125,7 +129,9 @@ class Gmap_LSF_manyconc(phi.Analyses.LSF.Analysis.Analysis):
             phi.Utils.getUniqueStringFromHostnameTimePid()
         self.interimOutputDir = interimOutputDir or childInputFileDir
         self.needConcatenateOutput = needConcatenateOutput # this module, it is single one.
-        self.lsfDelayTime = LSF_DELAY_TIME_GMAP # for testing, use 30.
+        self.lsfDelayTime = LSF_DELAY_TIME_GMAP # max wait for files to appear. for testing, use 30.
+        self.lsfPollInterval = LSF_POLL_INTERVAL # first wait, doubled each time files are still missing
+        self.lsfPollMaxInterval = LSF_POLL_MAX_INTERVAL
         self.jobNames = []    # Will be set after splitting files
         self.commands = []
         self.gff3files = []    # only useful for filtering the raw output to the gff3 files.
@@ -302,10 +308,11 @@ Should be one of the gff formats: %s" % (self.outputFormat, GMAP_OUTPUT_FORMAT_G
         self.checkInputs()
 
         # give SONAS some time to let the newly created file to appear on the cluster nodes.
+        # The input files were written here, so listing them on the submission host tells
+        # nothing about the nodes: each job command waits for its own input file instead.
         if self.verboseLevel > 0:
-            self.logger.info("give SONAS %d seconds to let the newly created \
-files to appear on the cluster nodes" % self.lsfDelayTime)
-        time.sleep(self.lsfDelayTime)
+            self.logger.info("each job waits up to %d seconds on its cluster node for its \
+input file to appear" % self.lsfDelayTime)
 
         # check space:
         # causing python subprocess os.fork() memory issues; too much trouble for a minor benign check
@@ -344,6 +351,8 @@ files to appear on the cluster nodes" % self.lsfDelayTime)
             # /anno/gsap/benchmark/ATH_EST_sequences_20101108.fas > AT_EST_TAIR10.gff3
             command = ' '.join([
                 BIN_SET_PIPEFAIL,
+                waitForFileCommand(inputFile, self.lsfDelayTime),
+                '&&',
                 'cd ' + self.interimOutputDir,
                 '&&',
                 LSF_BIN_GMAP,
@@ -370,9 +379,10 @@ files to appear on the cluster nodes" % self.lsfDelayTime)
         # run LSF jobs.
         lsfManager.checkManyJobsUntilAllDone()
         if self.verboseLevel > 0:
-            self.logger.info("give SONAS %d seconds to let the newly created \
+            self.logger.info("give SONAS up to %d seconds to let the newly created \
 output files to appear on the submission host." % self.lsfDelayTime)
-        time.sleep(self.lsfDelayTime)
+        waitForFiles(self.outputFiles, self.lsfDelayTime, self.logger, "output",
+                     self.lsfPollInterval, self.lsfPollMaxInterval, self.verboseLevel > 0)
 
         # print out stats.
         self.logsObj = lsfManager.setLogsObj()
@@ -614,8 +624,9 @@ For special options only such as resources, not for queue, \
 project name, job name etc. Do not use it if you are not sure.''')
     parser.add_argument(
         '-ld', dest='lsfDelayTime', type=float, default=LSF_DELAY_TIME_GMAP,
-        help="LSF delay time in seconds. Wait this long before \
-LSF job submission and after LSF job completion.")
+        help="LSF delay time in seconds. Each job waits up to this long on its \
+cluster node for its input file to appear, and after LSF job completion the output files \
+are waited for up to this long on the submission host, checking with exponential backoff.")
     parser.add_argument(
         '-q', dest='queue', default=LSF_DEFAULT_QUEUE, help="lsf queue name")
     parser.add_argument(
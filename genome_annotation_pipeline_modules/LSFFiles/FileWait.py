@@ -0,0 +1,65 @@
+# by Guna
+
+"""Waiting for files to appear on SONAS, shared by the LSF analyses.
+
+waitForFiles polls from the submission host, e.g. for job outputs.
+waitForFileCommand returns a shell prefix for a job command, so the wait for
+the job's input happens on the cluster node that runs it.
+"""
+
+import os
+import time
+import math
+
+from .LSFFiles_Constants import LSF_POLL_INTERVAL, LSF_POLL_MAX_INTERVAL, \
+    LSF_NODE_POLL_INTERVAL
+
+
+def waitForFiles(files, maxWait, logger, kind, pollInterval=LSF_POLL_INTERVAL,
+                 pollMaxInterval=LSF_POLL_MAX_INTERVAL, verbose=False):
+    """poll until all files are visible, for at most maxWait seconds.
+    Waits pollInterval seconds at first, doubling up to pollMaxInterval.
+    Directories are listed rather than each file stat'ed, which also gets around
+    cached "no such file" answers. Returns the files still missing."""
+    startTime = time.time()
+    interval = pollInterval
+    missing = list(files)
+    checks = 0
+    while True:
+        checks += 1
+        dirFiles = {}
+        for f in missing:
+            dirFiles.setdefault(os.path.dirname(f), []).append(f)
+        stillMissing = []
+        for fileDir, dirMissing in dirFiles.items():
+            try:
+                visible = set(os.listdir(fileDir))
+            except OSError:
+                visible = set()
+            stillMissing.extend(f for f in dirMissing if os.path.basename(f) not in visible)
+        missing = stillMissing
+        waited = time.time() - startTime
+        if not missing or waited >= maxWait:
+            break
+        time.sleep(min(interval, maxWait - waited))
+        interval = min(interval * 2, pollMaxInterval)
+
+    if missing:
+        logger.warn("%d of %d %s files still not visible after %.1f seconds (max %d), \
+%d checks. Continuing. First missing: %s" % (len(missing), len(files), kind, waited,
+                                             maxWait, checks, missing[0]))
+    elif verbose:
+        logger.info("all %d %s files visible after %.1f seconds, %d checks" % (
+            len(files), kind, waited, checks))
+    return missing
+
+
+def waitForFileCommand(fileName, maxWait, pollInterval=LSF_NODE_POLL_INTERVAL):
+    """shell commands that wait on the cluster node for fileName, for at most
+    about maxWait seconds, and fail the job if it is still missing.
+    The directory is listed on each check to refresh its cached entries.
+    Meant to be joined with '&&' in front of the job's own command."""
+    checks = max(1, int(math.ceil(float(maxWait) / pollInterval)))
+    fileDir = os.path.dirname(fileName) or '.'
+    return ('for i in $(seq %d); do ls %s > /dev/null 2>&1; test -e %s && break; '
+            'sleep %d; done; test -e %s' % (checks, fileDir, fileName, pollInterval, fileName))
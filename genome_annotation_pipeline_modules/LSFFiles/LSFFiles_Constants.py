@@ -0,0 +1,9 @@
+# by Guna
+
+"""constants for waiting on SONAS files in LSF analyses"""
+
+# file visibility polling: first check after this many seconds, doubling up to the max interval.
+LSF_POLL_INTERVAL = 2 # in seconds.
+LSF_POLL_MAX_INTERVAL = 30 # in seconds.
+# on the cluster nodes, each job checks for its input file every this many seconds.
+LSF_NODE_POLL_INTERVAL = 5 # in seconds.
@@ -0,0 +1,55 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from ..FileWait import waitForFiles, waitForFileCommand
+
+logger = logging.getLogger('FileWaitTest')
+logger.addHandler(logging.NullHandler())
+
+
+class FileWaitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.files = [os.path.join(self.tempDir, '%d.fa' % i) for i in xrange(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def touch(self, filename):
+        open(filename, 'w').close()
+
+    def testAllVisible(self):
+        for f in self.files:
+            self.touch(f)
+        self.assertEqual(waitForFiles(self.files, 5, logger, 'input'), [])
+
+    def testAppearWhileWaiting(self):
+        timer = threading.Timer(0.3, self.touch, [self.files[1]])
+        timer.start()
+        self.touch(self.files[0])
+        startTime = time.time()
+        missing = waitForFiles(self.files[:2], 5, logger, 'output', pollInterval=0.1, pollMaxInterval=0.2)
+        self.assertEqual(missing, [])
+        self.assertLess(time.time() - startTime, 2)
+        timer.join()
+
+    def testGivesUp(self):
+        self.touch(self.files[0])
+        missing = waitForFiles(self.files, 0.3, logger, 'output', pollInterval=0.1, pollMaxInterval=0.1)
+        self.assertEqual(missing, self.files[1:])
+
+    def testJobCommand(self):
+        command = waitForFileCommand(self.files[0], 2, pollInterval=1) + ' && echo ran'
+        self.assertNotEqual(subprocess.call(['bash', '-c', command], stdout=open(os.devnull, 'w')), 0)
+        self.touch(self.files[0])
+        self.assertEqual(subprocess.check_output(['bash', '-c', command]), 'ran\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,7 +26,7 @@ LSF_MAX_JOB_TOTAL = 300   # default is only 300.
 
 # max memory usage noted is 5612MB - Wengang's PHIv2.1 tests
 LSF_RESOURCES_RM = '-R "rusage[mem=7000,scr=500]"'
-LSF_DELAY_TIME_RM = 120 # in seconds.
+LSF_DELAY_TIME_RM = 120 # in seconds. Max wait for files to appear on the cluster nodes/submission host.
 LSF_RM_PROJECT_NAME = 'gtdi-gsap-repeatmasker'
 
 # this is for local, on submission host.
@@ -35,6 +35,16 @@ BIN_RM = BIN_DIR + '/RepeatMasker'
 
 RM_ANALYSIS_PARAMETERS = '-nolow'
 
+# -c auto: slice size picked from the genome size, job slots and a target job runtime
+RM_CHUNK_SIZE_AUTO = 'auto'
+RM_AUTO_JOB_TIME = 3600 # in seconds. target runtime of one job.
+RM_AUTO_BP_PER_SECOND = 20000 # rough RepeatMasker speed of one job. Only the job count depends on it.
+RM_AUTO_MIN_CHUNK = 100000 # in bp. smaller slices cost more in merging than they save.
+RM_AUTO_CHUNK_ROUND = 10000 # in bp. auto chunk sizes are rounded up to this.
+# bp shared by consecutive slices (-co), so repeats across a slice end are found whole.
+# 0: slices do not overlap. Should be longer than most repeats, e.g. 20000.
+RM_SLICE_OVERLAP = 0
+
 
 # RM output files - that should be deleted
 RM_INDEX_OUTFILES_UNWANTED = ['.alert', '.cat', '.cat.gz', '.ori.out', '.out', '.tbl']
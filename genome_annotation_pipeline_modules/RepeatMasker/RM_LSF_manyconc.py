@@ -38,11 +38,20 @@ from phi.LSF.Constants import DEFAULT_MIN_FREE_SPACE_TO_WARN, \
      DEFAULT_MIN_FREE_SPACE_TO_PAUSE
 import phi.LSF.Managers.ManyConcurrent
 import phi.DiskSpaceWarning
+from phi.Analyses.LSFFiles.FileWait import waitForFiles, waitForFileCommand
+from phi.Analyses.LSFFiles.LSFFiles_Constants import LSF_POLL_INTERVAL, \
+    LSF_POLL_MAX_INTERVAL
 from .RM_Constants import RM_ANALYSIS_NAME, RM_ANALYSIS_PARAMETERS, \
     LSF_RM_PROJECT_NAME, LSF_MAX_JOB_TOTAL, LSF_BIN_RM, LSF_MAX_JOB_TOTAL, \
-    LSF_DELAY_TIME_RM, LSF_RESOURCES_RM, RM_INDEX_FASTA, RM_INDEX_OUT_MASKED, \
-    RM_INDEX_OUT_GFF, RM_INDEX_OUTFILES_UNWANTED
-from phi.Parse import cleanFastaNSplit, mergeSeqSlices
+    LSF_DELAY_TIME_RM, \
+    LSF_RESOURCES_RM, RM_INDEX_FASTA, RM_INDEX_OUT_MASKED, \
+    RM_INDEX_OUT_GFF, RM_INDEX_OUTFILES_UNWANTED, RM_CHUNK_SIZE_AUTO, RM_AUTO_JOB_TIME, \
+    RM_AUTO_BP_PER_SECOND, RM_AUTO_MIN_CHUNK, RM_AUTO_CHUNK_ROUND, RM_SLICE_OVERLAP
+from phi.Parse import cleanFastaNSplit
+from .RM_Partition import indexFasta, partitionByLength, writePartition, \
+    imbalance, fastaLengths, chooseChunkSize, mergeMasked, compareLengths, \
+    sequenceName, SLICE_NAME, writeOverlappingSlices, partitionInOrder, reconcileOverlapHits, \
+    gffLinesInOrder
 
 class RM_LSF_manyconc(phi.Analyses.LSF.Analysis.Analysis):
     """ Basically inheriting/extending two classes:
@@ -76,7 +85,8 @@ class RM_LSF_manyconc(phi.Analyses.LSF.Analysis.Analysis):
             jobTotal=LSF_MAX_JOB_TOTAL,
             concurrentJobTotal=LSF_MAX_CONCURRENT_JOB_TOTAL,
             checkExistingStdoutFiles=True,
-            requeueable=False
+            requeueable=False,
+            balanceJobs=False
         ):
         #######################################################
         # must declare/define it before setting the super class.
@@ -102,7 +112,10 @@ class RM_LSF_manyconc(phi.Analyses.LSF.Analysis.Analysis):
         # Parent's properties are set by above init() call
         # dbFile, outputDir are set through above init() call
         # split fasta sequences into smaller chunks. default: 0. Merging also changes based on this.
+        # RM_CHUNK_SIZE_AUTO: picked in checkInputs, see autoChunkSize
         self.chunkSize = chunkSize
+        self.targetJobTime = RM_AUTO_JOB_TIME # auto chunk size: target runtime of one job, in seconds
+        self.sliceOverlap = RM_SLICE_OVERLAP # bp shared by consecutive slices, if sliced
         # -species option for RepeatMasker if using repeat masker's inbuilt libraries
         self.species = species
         # -gff option for RepeatMasker creates additional gff file
@@ -125,12 +138,19 @@ class RM_LSF_manyconc(phi.Analyses.LSF.Analysis.Analysis):
         childInputFileDir = LSF_DEFAULT_OUTPUT_DIR + '/' + \
             phi.Utils.getUniqueStringFromHostnameTimePid()
         self.interimOutputDir = interimOutputDir or childInputFileDir
-        self.lsfDelayTime = LSF_DELAY_TIME_RM # for testing, use 30.
+        self.lsfDelayTime = LSF_DELAY_TIME_RM # max wait for files to appear. for testing, use 30.
+        self.lsfPollInterval = LSF_POLL_INTERVAL # first wait, doubled each time files are still missing
+        self.lsfPollMaxInterval = LSF_POLL_MAX_INTERVAL
         self.jobNames = []    # Will be set after splitting files
         self.commands = []
         self.gff3file = ''     # output gff3 file only if -gff option is given.
         self.gff3files = []    # child gff3 files only if -gff option is given.
         self.toDeleteFiles = []    # Add any temporary files to this array, that are SURE to go.
+        # bin-pack sequences/slices into jobs by bp length instead of splitting by count. See RM_Partition
+        self.balanceJobs = balanceJobs
+        self.sequenceOrder = []    # balanceJobs: record headers in input order, for concatenation
+        self.sequenceLengths = {}    # bp of each input sequence (end of its last slice), to check the merge
+        self.jobBp = []    # balanceJobs: bp per job
         self.logger = phi.Logger.Logger(name, logFh)
 
         # for LSF manager
@@ -261,12 +281,29 @@ executable. I need both to be able to write to it" % self.interimOutputDir)
             self.minFreeSpaceToPause, self.name, EMAIL_SENDER,
             self.emails, DEFAULT_MAX_DISK_CHECK_FREQUENCY, self.logFh)
 
+        if self.chunkSize == RM_CHUNK_SIZE_AUTO:
+            self.chunkSize = self.autoChunkSize()
+        if self.chunkSize <= 0:
+            self.sliceOverlap = 0
+        elif self.sliceOverlap < 0 or self.sliceOverlap >= self.chunkSize:
+            self.logger.error("Slice overlap %d must be from 0 to less than the chunk size %d" % (
+                self.sliceOverlap, self.chunkSize))
+            raise Exception, "Slice overlap %d must be from 0 to less than the chunk size %d" % (
+                self.sliceOverlap, self.chunkSize)
+
         # Parsing & Splitting the input file
+        # overlapping slices are cut here, from the cleaned input
         if self.verboseLevel > 0:
             self.logger.info("Trying to split input seq file %s up to %d \
 files at %s" % (self.inputFile, self.jobTotal, self.interimOutputDir))
         self.inputFiles = cleanFastaNSplit(
-            self.inputFile, self.jobTotal, None, self.chunkSize, self.interimOutputDir, None, self.logger)
+            self.inputFile, 1 if self.balanceJobs or self.sliceOverlap else self.jobTotal, None,
+            0 if self.sliceOverlap else self.chunkSize, self.interimOutputDir, None, self.logger)
+        if self.sliceOverlap and self.inputFiles:
+            self.inputFiles = self.sliceInputFiles(self.inputFiles)
+        inputIndex = self.indexInputFiles()
+        if self.balanceJobs and self.inputFiles:
+            self.inputFiles = self.balanceInputFiles(inputIndex)
 
 
         if len(self.inputFiles) == 0:
@@ -297,16 +334,92 @@ files at %s" % (self.inputFile, self.jobTotal, self.interimOutputDir))
         return
 
 
+    def autoChunkSize(self):
+        """chunk size from the input sequence lengths, jobTotal, concurrentJobTotal and
+        targetJobTime - see RM_Partition.chooseChunkSize"""
+        lengths = fastaLengths(self.inputFile)
+        chunkSize, jobs, jobBp = chooseChunkSize(
+            lengths, self.jobTotal, self.concurrentJobTotal, self.targetJobTime,
+            RM_AUTO_BP_PER_SECOND, RM_AUTO_MIN_CHUNK, RM_AUTO_CHUNK_ROUND)
+        if lengths:
+            self.logger.info("Auto chunk size: %d sequences, %d bp, longest %d bp. %d jobs (up to %d, \
+%d at once) of ~%d bp for ~%ds per job at ~%d bp/s => chunk size %d%s" % (
+                len(lengths), sum(lengths), max(lengths), jobs, self.jobTotal, self.concurrentJobTotal,
+                jobBp, self.targetJobTime, RM_AUTO_BP_PER_SECOND, chunkSize,
+                " (no sequence longer than a job's share: not slicing)" if not chunkSize else ""))
+        return chunkSize
+
+
+    def sliceInputFiles(self, cleanFiles):
+        """cut the sequences of the cleaned input files into chunkSize slices sharing sliceOverlap
+        bp with the next one, then split the records, in order, into up to jobTotal files of
+        near-equal bp (one file with balanceJobs - it is bin-packed later). Returns the files."""
+        slicedFile = os.path.join(self.interimOutputDir, self.outputFilePrefix + '_sliced.fa')
+        recordTotal = writeOverlappingSlices(cleanFiles, slicedFile, self.chunkSize, self.sliceOverlap)
+        for f in cleanFiles:
+            os.remove(f)
+        if self.verboseLevel > 0:
+            self.logger.info("Sliced input sequences into %d records: %d bp slices, %d bp overlap" % (
+                recordTotal, self.chunkSize, self.sliceOverlap))
+        if self.balanceJobs:
+            return [slicedFile]
+        index = indexFasta(slicedFile)
+        bins, loads = partitionInOrder([bp for header, offset, size, bp in index], self.jobTotal)
+        slicedFiles = writePartition([(slicedFile, offset, size) for header, offset, size, bp in index],
+                                     bins, self.interimOutputDir, self.outputFilePrefix + '_sliced')
+        os.remove(slicedFile)
+        return slicedFiles
+
+
+    def indexInputFiles(self):
+        """index the cleaned (and sliced) input files: record headers in input order and
+        bp per sequence (the end of its last slice). Returns [(file, header, offset, bytes, bp)]."""
+        inputIndex = []
+        self.sequenceOrder = []
+        self.sequenceLengths = {}
+        for f in self.inputFiles:
+            for header, offset, size, bp in indexFasta(f):
+                inputIndex.append((f, header, offset, size, bp))
+                self.sequenceOrder.append(header)
+                name = sequenceName(header)
+                match = SLICE_NAME.match(name)
+                if match:
+                    name, bp = match.group(1), int(match.group(3))
+                self.sequenceLengths[name] = max(self.sequenceLengths.get(name, 0), bp)
+        return inputIndex
+
+
+    def balanceInputFiles(self, inputIndex):
+        """bin-pack the records of the cleaned (and sliced) input files into up to jobTotal
+        files of near-equal bp, longest record first. Returns the new files."""
+        records = [(f, offset, size) for f, header, offset, size, bp in inputIndex]
+        lengths = [bp for f, header, offset, size, bp in inputIndex]
+        if not lengths:
+            return []
+        bins, self.jobBp = partitionByLength(lengths, self.jobTotal)
+        balancedFiles = writePartition(
+            records, bins, self.interimOutputDir, self.outputFilePrefix + '_balanced')
+        for f in self.inputFiles:
+            os.remove(f)
+        if self.verboseLevel > 0:
+            self.logger.info("Bin-packed %d sequences/slices, %d bp, into %d files by length: \
+%d to %d bp per job, predicted imbalance (max/mean bp) %.2f" % (
+                len(lengths), sum(lengths), len(balancedFiles), min(self.jobBp), max(self.jobBp),
+                imbalance(self.jobBp)))
+        return balancedFiles
+
+
     def run(self):
         """run the analysis"""
 
         self.checkInputs()
 
         # give SONAS some time to let the newly created file to appear on the cluster nodes.
+        # The input files were written here, so listing them on the submission host tells
+        # nothing about the nodes: each job command waits for its own input file instead.
         if self.verboseLevel > 0:
-            self.logger.info("give SONAS %d seconds to let the newly created \
-files to appear on the cluster nodes" % self.lsfDelayTime)
-        time.sleep(self.lsfDelayTime)
+            self.logger.info("each job waits up to %d seconds on its cluster node for its \
+input file to appear" % self.lsfDelayTime)
 
         # check space: in temp dir as RepeatMasker output goes there first
         phi.DiskSpaceWarning.checkDiskSpace(
@@ -351,7 +464,8 @@ files to appear on the cluster nodes" % self.lsfDelayTime)
             # -gff -x -nolow -dir /ngsprod/gsap/RunPrograms/RepeatMasker/PHIv2.1
             # /ngsprod/gsap/genomes/ZmChr1v2.fas
             command = ' '.join([
-                BIN_SET_PIPEFAIL, 'cd ' + self.interimOutputDir, '&&',
+                BIN_SET_PIPEFAIL, waitForFileCommand(inputFile, self.lsfDelayTime), '&&',
+                'cd ' + self.interimOutputDir, '&&',
                 LSF_BIN_RM, self.analysisParameters, '-dir', inputDir, inputFile])
 
             self.logger.info(command)
@@ -366,9 +480,10 @@ files to appear on the cluster nodes" % self.lsfDelayTime)
         # run LSF jobs.
         lsfManager.checkManyJobsUntilAllDone()
         if self.verboseLevel > 0:
-            self.logger.info("give SONAS %d seconds to let the newly created \
+            self.logger.info("give SONAS up to %d seconds to let the newly created \
 output files to appear on the submission host." % self.lsfDelayTime)
-        time.sleep(self.lsfDelayTime)
+        waitForFiles(self.outputFiles + self.gff3files, self.lsfDelayTime, self.logger,
+                     "output", self.lsfPollInterval, self.lsfPollMaxInterval, self.verboseLevel > 0)
 
         # print out stats.
         self.logsObj = lsfManager.setLogsObj()
@@ -380,6 +495,12 @@ output files to appear on the submission host." % self.lsfDelayTime)
         self.logger.info("Memory max: %d MB" % self.logsObj.maxMemory)
         self.logger.info("Memory min: %d MB" % self.logsObj.minMemory)
         self.logger.info("Memory ave: %s MB" % self.logsObj.aveMemoryStr)
+        if self.balanceJobs and self.jobBp and self.logsObj.sumCpuTime:
+            # CPU max over CPU ave: how far the longest job is from an even split.
+            # Averaged over the jobs submitted - fewer than -j if there were fewer records
+            self.logger.info("Job imbalance (max/mean): predicted %.2f by bp, actual %.2f by CPU time" % (
+                imbalance(self.jobBp),
+                self.logsObj.maxCpuTime / (float(self.logsObj.sumCpuTime) / len(self.jobBp))))
 
         # concatenation, only for masked fasta & gff3.
         # check space as the output size will be doubled temporarily.
@@ -410,15 +531,19 @@ before. All stdout files look ok. The output file %s is present. No rerun at \
                 return
 
         # checking & concatenating output files (.masked fasta files)
+        # RepeatMasker writes no .masked file when it finds no repeats: the job's input
+        # is then its masked output, and is merged in its place
         missingOutputFileTotal = 0
-        command = 'cat'
-        for f in self.outputFiles:
+        mergeFiles = []
+        for f, inputFile in zip(self.outputFiles, self.inputFiles):
             if not os.path.exists(f):
-                self.logger.warn("Missing one of the output files %s at %s. \
-Will continue merging the rest into %s." % (f, phi.Utils.getTimeStampString(), self.outputFile))
+                self.logger.warn("Missing one of the output files %s at %s (no repeats found?). \
+Will merge its input %s unmasked into %s." % (f, phi.Utils.getTimeStampString(), inputFile,
+                                              self.outputFile))
                 missingOutputFileTotal += 1
+                mergeFiles.append(inputFile)
             else:
-                command = command + ' ' + f
+                mergeFiles.append(f)
         # check if no output files are created at all
         if missingOutputFileTotal == len(self.outputFiles):
             self.logger.error("No output files found from Repeat Masker. \
@@ -426,33 +551,34 @@ Check dir: %s" % self.interimOutputDir)
             raise Exception("No output files found from Repeat Masker. \
 Check dir: %s" % self.interimOutputDir)
 
-        command = ' '.join([command, '>', self.outputFile])
+        # one pass: job outputs read in order (input order if jobs were balanced - jobs hold
+        # records from all over the input), sequence slices, if any, stitched back on the fly.
+        # Run regardless of slicing, for consistent FASTA line width.
+        if self.verboseLevel > 0:
+            self.logger.info("Merging %d output files%s into %s, sequence slices stitched back" % (
+                len(self.outputFiles), " in input sequence order" if self.balanceJobs else "",
+                self.outputFile))
+        lengths, gaps = mergeMasked(mergeFiles, self.outputFile,
+                                    self.sequenceOrder if self.balanceJobs else None,
+                                    overlap=self.sliceOverlap)
+        for name, expectedStart, start in gaps:
+            self.logger.warn("Sequence %s: slice starting at %d where %d was expected" % (
+                name, start, expectedStart))
+        missing, mismatched = compareLengths(lengths, self.sequenceLengths)
+        if missing:
+            self.logger.warn("%d of %d input sequences not found in the output files. First: %s" % (
+                len(missing), len(self.sequenceLengths), missing[0]))
+        if mismatched:
+            for name, expectedBp, bp in mismatched[:10]:
+                self.logger.error("Sequence %s: %d bp in the merged output, %s bp in the input" % (
+                    name, bp, expectedBp))
+            self.logger.error("Merge Failed. %d sequences of %s differ in length from the input" % (
+                len(mismatched), self.outputFile))
+            raise Exception("Merge Failed. %d sequences of %s differ in length from the input" % (
+                len(mismatched), self.outputFile))
         if self.verboseLevel > 0:
-            self.logger.info("Running concatenate command: %s" % command)
-        returnCode = os.system(command)
-        if returnCode != 0:
-            self.logger.error("Concatenation Failed. command %s did not \
-return 0: %d" % (command, returnCode))
-            raise Exception("Concatenation Failed. command %s did not \
-return 0: %d" % (command, returnCode))
-        
-        # check if sequences were sliced into chunks - if so we need to merge back
-        # if (self.chunkSize > 0): - no need to check, run through mergeSeqSlices regardless
-        # for consistent FASTA format, as it will ONLY merge slices
-        self.logger.info("Sequence slices in output fasta file, if any, \
-need to be merged back: %s" % self.outputFile)
-        mergedFile = mergeSeqSlices(self.outputFile, self.logger)
-        if mergedFile:
-            # Overwriting output file with merged result
-            command = ' '.join(['mv', mergedFile, self.outputFile])
-            if self.verboseLevel > 0:
-                self.logger.info("Overwriting output file with new merged file: %s" % command)
-            returnCode = os.system(command)
-            if returnCode != 0:
-                self.logger.error("Overwriting Failed. command %s did not \
-return 0: %d" % (command, returnCode))
-                raise Exception("Overwriting Failed. command %s did not \
-return 0: %d" % (command, returnCode))
+            self.logger.info("Merged %d sequences, %d bp, lengths match the input" % (
+                len(lengths), sum(lengths.values())))
 
         # merging the GFF files
         if self.outputGff:
@@ -462,14 +588,24 @@ file %s at %s" % (self.gff3file, phi.Utils.getTimeStampString()))
             
             # in case of slices
             slice_id = re.compile(r'(.+)_slice:(\d+)-(\d+)').match
-
-            # not simple
-            for f in self.gff3files:
+            # overlapping slices: lines of a sequence are held until it ends, hits in the
+            # shared bp are reconciled - see writeSequenceGff
+            currentSeq = None
+            sequenceLines = []
+            overlapHits = []
+            overlapHitTotal = reconciledTotal = 0
+
+            if self.balanceJobs:
+                # jobs hold records from all over the input - lines put back in input order,
+                # as the masked fasta file
+                gffInputs = [gffLinesInOrder(self.gff3files, dict(
+                    (sequenceName(header), rank) for rank, header in enumerate(self.sequenceOrder)))]
+            else:
                 # if no repeats found, no output at all - possible
-                if not os.path.exists(f):
-                    continue
+                gffInputs = (open(f) for f in self.gff3files if os.path.exists(f))
 
-                fhIn = open(f)
+            # not simple
+            for fhIn in gffInputs:
                 for line in fhIn:
                     if line[0] == '#':
                         # comment lines: just copy it.
@@ -495,6 +631,7 @@ file %s at %s" % (self.gff3file, phi.Utils.getTimeStampString()))
 # look for slices and correct the seq_id, start, end values (the latter being absolute values)
 #CTL1_GR2HT_1ctg_v3_slice:1500001-2000000        RepeatMasker    similarity      498999  500000  16.8 ...
 #CTL1_GR2HT_1ctg_v3_slice:2000001-2500000        RepeatMasker    similarity      1       1268    20.6 ... 
+                        inOverlap = False
                         if (self.chunkSize > 0):
                             slice_match = slice_id(seq_id)
                             if (slice_match):
@@ -509,11 +646,35 @@ file %s at %s" % (self.gff3file, phi.Utils.getTimeStampString()))
                                         within the slice boundaries: {2}".format(start, end, row[0]))
                                     self.logger.warn("Skipping line: %s" % line.strip())
                                     continue
+                                sliceStart, sliceEnd = int(slice_match.group(2)), int(slice_match.group(3))
+                                inOverlap = self.sliceOverlap and (
+                                    (sliceStart > 1 and start < sliceStart + self.sliceOverlap) or
+                                    (sliceEnd < self.sequenceLengths.get(seq_id, 0) and
+                                     end > sliceEnd - self.sliceOverlap))
                         newLine = '\t'.join([
                             seq_id, row[1], row[2], str(start), str(end),
                             row[5], row[6], row[7], target_id])
+                        if self.sliceOverlap:
+                            # slices of a sequence come one after the other
+                            if seq_id != currentSeq:
+                                reconciledTotal += self.writeSequenceGff(fhOut, sequenceLines, overlapHits)
+                                overlapHitTotal += len(overlapHits)
+                                currentSeq, sequenceLines, overlapHits = seq_id, [], []
+                            if inOverlap:
+                                # type, strand, repeat
+                                overlapHits.append((seq_id, start, end, (row[2], row[6], target_attr[1]),
+                                                    sliceStart, (row, target_id)))
+                            else:
+                                sequenceLines.append((start, newLine))
+                            continue
                         fhOut.write(newLine)
                 fhIn.close()
+            if self.sliceOverlap:
+                reconciledTotal += self.writeSequenceGff(fhOut, sequenceLines, overlapHits)
+                overlapHitTotal += len(overlapHits)
+                if self.verboseLevel > 0:
+                    self.logger.info("%d GFF hits in slice overlaps reconciled into %d" % (
+                        overlapHitTotal, reconciledTotal))
             fhOut.close()
 
         self.endTime = time.ctime()
@@ -522,6 +683,21 @@ file %s at %s" % (self.gff3file, phi.Utils.getTimeStampString()))
         self.postProcess()
 
 
+    def writeSequenceGff(self, fhOut, sequenceLines, overlapHits):
+        """write the GFF lines of one sequence - [(start, line)] - and its overlap hits,
+        reconciled, in position order. Returns the number of reconciled hits."""
+        reconciled = reconcileOverlapHits(overlapHits)
+        for seq_id, start, end, (row, target_id) in reconciled:
+            sequenceLines.append((start, '\t'.join([
+                seq_id, row[1], row[2], str(start), str(end),
+                row[5], row[6], row[7], target_id])))
+        # stable: lines starting at the same position keep their order
+        sequenceLines.sort(key=lambda startLine: startLine[0])
+        for start, line in sequenceLines:
+            fhOut.write(line)
+        return len(reconciled)
+
+
     def postProcess(self):
         """post process"""
 
@@ -622,6 +798,17 @@ class CustomAction(argparse.Action):
         parser.exit()
 
 
+def chunkSizeArg(value):
+    """-c value: bp or auto"""
+    if value == RM_CHUNK_SIZE_AUTO:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("chunk size must be a number of bp or %s: %s" % (
+            RM_CHUNK_SIZE_AUTO, value))
+
+
 def run():
     """run the analysis"""
 
@@ -669,11 +856,25 @@ See repeatmasker -help for more info. **REQUIRED** unless -lib option is used.")
         help="Output files created in outputDir will start with \
 this prefix name. Default: input file name prefix.")
     parser.add_argument(
-        '-c', dest='chunkSize', type=int, default=0,
+        '-c', dest='chunkSize', type=chunkSizeArg, default=0,
         help="sequence chunk size in bp. Input sequences will be \
 sliced into smaller chunks of this size, if option given. Particularly \
 useful for large genomes so smaller sequences can be processed in parallel \
-(Ex: -c 500000 for 500 kb chunks). By default, sequences are not sliced up.")
+(Ex: -c 500000 for 500 kb chunks). By default, sequences are not sliced up. \
+'auto': picked from the genome size, -j, -n and -t, and logged - best with -b.")
+    parser.add_argument(
+        '-co', dest='sliceOverlap', type=int, default=RM_SLICE_OVERLAP,
+        help="with -c: bp shared by consecutive slices, so repeats across a slice \
+end are found whole - hits found twice are merged. Should be longer than most \
+repeats (Ex: -co 20000). Makes smaller chunks safe. Default: %(default)s.")
+    parser.add_argument(
+        '-t', dest='targetJobTime', type=float, default=RM_AUTO_JOB_TIME,
+        help="-c auto: target runtime of one job in seconds.")
+    parser.add_argument(
+        '-b', dest='balanceJobs', action='store_true',
+        help="balance jobs by sequence length: sequences (or -c slices) are bin-packed, longest \
+first, into jobs of near-equal bp instead of being split by count. The masked output keeps the \
+input sequence order.")
     parser.add_argument(
         '-gff', dest='outputGff', action='store_true',
         help="Creates an additional Gene Feature Finding format output.")
@@ -699,8 +900,9 @@ only such as resources, not for queue, project name, job name etc. \
 Do not use it if you are not sure.''')
     parser.add_argument(
         '-ld', dest='lsfDelayTime', type=float, default=LSF_DELAY_TIME_RM,
-        help="LSF delay time in seconds. Wait this long before LSF job \
-submission and after LSF job completion.")
+        help="LSF delay time in seconds. Each job waits up to this long on its \
+cluster node for its input file to appear, and after LSF job completion the output files \
+are waited for up to this long on the submission host, checking with exponential backoff.")
     parser.add_argument('-q', dest='queue', default=LSF_DEFAULT_QUEUE, help="lsf queue name")
     parser.add_argument(
         '-P', dest='projectName',
@@ -779,6 +981,9 @@ resubmit to avoid the redundant LSF jobs.")
 
     outputFilePrefix = args.outputFilePrefix
     chunkSize = args.chunkSize
+    targetJobTime = args.targetJobTime
+    sliceOverlap = args.sliceOverlap
+    balanceJobs = args.balanceJobs
     outputGff = args.outputGff
     maskWithX = args.maskWithX
     maskWithSmall = args.maskWithSmall
@@ -829,10 +1034,12 @@ when restoring the command):\n%s\n" % ' '.join(sys.argv))
             outputDir, chunkSize, outputGff, maskWithX, maskWithSmall, outputDir,
             childInputFileDir, logFh, needEmail, emails, verboseLevel, queue,
             projectName, jobName, lsfParameters, maxLsfJob,
-            maxConcurrentLsfJob, checkExistingStdoutFiles, requeueable)
+            maxConcurrentLsfJob, checkExistingStdoutFiles, requeueable, balanceJobs)
         analysisObj.minFreeSpaceToWarn = minFreeSpaceToWarn
         analysisObj.minFreeSpaceToPause = minFreeSpaceToPause
         analysisObj.lsfDelayTime = lsfDelayTime
+        analysisObj.targetJobTime = targetJobTime
+        analysisObj.sliceOverlap = sliceOverlap
         analysisObj.lsfManager.bsubInterval = bsubInterval
 
         analysisObj.commandLine = ' '.join(sys.argv)
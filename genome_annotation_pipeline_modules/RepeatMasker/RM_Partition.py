@@ -0,0 +1,506 @@
+"""
+Splitting a FASTA file into LSF job inputs, and merging the jobs' masked outputs.
+
+Splitting by sequence count gives jobs of very unequal size: one job holding
+a 300 Mb chromosome runs long after hundreds of small ones are done. Here the
+records (whole sequences, or slices if sequences were sliced with -c) are
+bin-packed by base pairs, longest first, each into the job with the fewest bp
+so far, so every job gets a near-equal load.
+
+chooseChunkSize picks the slice size for -c auto from the sequence lengths
+alone (fastaLengths reads a .fai index when there is one).
+
+mergeMasked writes the final masked FASTA in one pass over the job outputs:
+records are read in job order or, as bin-packed jobs no longer hold
+consecutive records, in input order. Consecutive <name>_slice:<start>-<end>
+records are stitched back into <name> on the fly and sequence lines are
+rewrapped to FASTA_LINE_WIDTH. compareLengths checks the stitched lengths
+against the input's. gffLinesInOrder does the same for the jobs' GFF files.
+
+With an overlap, writeOverlappingSlices cuts sequences into slices sharing
+overlap bp with the next one, so a repeat across a slice end is seen whole by
+one of them. Stitching takes the union of the masking of both slices in the
+shared bp, and reconcileOverlapHits merges the hits both slices report there.
+
+Example:
+index = indexFasta('genome_clean.fa')
+bins, loads = partitionByLength([bp for header, offset, size, bp in index], 300)
+records = [('genome_clean.fa', offset, size) for header, offset, size, bp in index]
+files = writePartition(records, bins, '/temp/interim', 'genome')
+...
+lengths, gaps = mergeMasked([f + '.masked' for f in files], 'genome_masked.fa', [header for header, offset, size, bp in index])
+missing, mismatched = compareLengths(lengths, fastaNameLengths('genome.fa'))
+"""
+import os
+import re
+import math
+import heapq
+import itertools
+from collections import OrderedDict
+
+# bytes copied at once
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+# sequence line width of merged output - as RepeatMasker's .masked files
+FASTA_LINE_WIDTH = 50
+# lines written at once while holding back a slice overlap
+STITCH_FLUSH_LINES = 1000
+# sequence name of a slice made by cleanFastaNSplit (1-based, inclusive)
+SLICE_NAME = re.compile(r'^(.+)_slice:(\d+)-(\d+)$')
+
+
+def indexFasta(fastaFile):
+    """[(header line, file offset, bytes, bp)] of each record, in file order"""
+    index = []
+    header = None
+    offset = 0
+    start = 0
+    bp = 0
+    with open(fastaFile, 'rb') as fh:
+        for line in fh:
+            if line.startswith('>'):
+                if header is not None:
+                    index.append((header, start, offset - start, bp))
+                header = line.rstrip()
+                start = offset
+                bp = 0
+            else:
+                bp += len(line.rstrip())
+            offset += len(line)
+    if header is not None:
+        index.append((header, start, offset - start, bp))
+    return index
+
+
+def partitionByLength(lengths, binTotal):
+    """longest first, each length into the bin with the smallest total so far.
+    Returns the bins (lists of indexes into lengths, in index order) and their totals.
+    Empty bins are dropped when there are fewer lengths than bins."""
+    binTotal = max(1, min(binTotal, len(lengths)))
+    heap = [(0, i) for i in range(binTotal)]
+    bins = [[] for i in range(binTotal)]
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        load, binIndex = heapq.heappop(heap)
+        bins[binIndex].append(i)
+        heapq.heappush(heap, (load + lengths[i], binIndex))
+    loads = [0] * binTotal
+    for load, binIndex in heap:
+        loads[binIndex] = load
+    bins = [sorted(indexes) for indexes in bins]
+    return bins, loads
+
+
+def sequenceName(header):
+    """sequence name of a header line: its first word"""
+    fields = header[1:].split(None, 1)
+    return fields[0] if fields else ''
+
+
+def _writeFasta(fhOut, header, seq, lineWidth):
+    fhOut.write(header + '\n')
+    fhOut.write(''.join(seq[i:i + lineWidth] + '\n' for i in xrange(0, len(seq), lineWidth)))
+
+
+def writeOverlappingSlices(fastaFiles, outputFile, chunkSize, overlap, lineWidth=FASTA_LINE_WIDTH):
+    """write the records of fastaFiles to outputFile, sequences longer than chunkSize + overlap
+    cut into slices <name>_slice:<start>-<end> of chunkSize + overlap bp, one starting every
+    chunkSize bp (the last one is shorter), so consecutive slices share overlap bp.
+    Returns the number of records written."""
+    sliceBp = chunkSize + overlap
+    count = 0
+    with open(outputFile, 'wb') as fhOut:
+        for f in fastaFiles:
+            with open(f, 'rb') as fh:
+                header = None
+                for line in itertools.chain(fh, ['>']):
+                    if line.startswith('>'):
+                        if header is not None:
+                            data = ''.join(pending)
+                            if start > 1:
+                                header = '>%s_slice:%d-%d' % (name, start, start + len(data) - 1)
+                            _writeFasta(fhOut, header, data, lineWidth)
+                            count += 1
+                        header, name = line.rstrip(), sequenceName(line)
+                        pending, pendingBp, start = [], 0, 1
+                        continue
+                    if header is None:
+                        continue
+                    seq = line.strip()
+                    pending.append(seq)
+                    pendingBp += len(seq)
+                    if pendingBp > sliceBp:
+                        data = ''.join(pending)
+                        while len(data) > sliceBp:
+                            _writeFasta(fhOut, '>%s_slice:%d-%d' % (name, start, start + sliceBp - 1),
+                                        data[:sliceBp], lineWidth)
+                            count += 1
+                            data = data[chunkSize:]
+                            start += chunkSize
+                        pending, pendingBp = [data], len(data)
+    return count
+
+
+def fastaNameLengths(fastaFile):
+    """{sequence name: bp}, in file order - from the samtools faidx .fai file if there is an
+    up to date one, else by reading the FASTA file"""
+    faiFile = fastaFile + '.fai'
+    if os.path.exists(faiFile) and os.path.getmtime(faiFile) >= os.path.getmtime(fastaFile):
+        with open(faiFile) as fh:
+            return OrderedDict((fields[0], int(fields[1]))
+                               for fields in (line.split('\t') for line in fh if line.strip()))
+    return OrderedDict((sequenceName(header), bp) for header, offset, size, bp in indexFasta(fastaFile))
+
+
+def fastaLengths(fastaFile):
+    """bp of each record, in file order - see fastaNameLengths"""
+    return fastaNameLengths(fastaFile).values()
+
+
+def chooseChunkSize(lengths, jobTotal, concurrentJobTotal, targetJobTime, bpPerSecond,
+                    minChunk, chunkRound):
+    """slice size for sequences of these lengths: 0 if no sequence is longer than a job's share.
+    Jobs are sized to take about targetJobTime at bpPerSecond, but there are at least as many
+    as can run at once (no idle slots) and at most jobTotal. Slices are a job's share of the bp,
+    rounded up to chunkRound and no smaller than minChunk.
+    Returns (chunk size, job count, bp per job)."""
+    total = sum(lengths)
+    if not total:
+        return 0, 0, 0
+    slots = max(1, min(jobTotal, concurrentJobTotal))
+    jobs = int(math.ceil(total / float(bpPerSecond * targetJobTime)))
+    jobs = max(slots, min(jobs, jobTotal))
+    jobBp = int(math.ceil(total / float(jobs)))
+    if max(lengths) <= jobBp:
+        return 0, jobs, jobBp
+    chunk = int(math.ceil(jobBp / float(chunkRound))) * chunkRound
+    return max(chunk, minChunk), jobs, jobBp
+
+
+def partitionInOrder(lengths, binTotal):
+    """consecutive runs of lengths with near-equal totals, as the bins of partitionByLength.
+    Bins are filled in order up to their share of what is left, so a long record does not
+    leave bins empty: there are min(binTotal, len(lengths)) bins."""
+    if not lengths:
+        return [], []
+    binTotal = max(1, min(binTotal, len(lengths)))
+    bins, loads = [[]], [0]
+    remaining = sum(lengths)
+    share = remaining / float(binTotal)
+    for i, bp in enumerate(lengths):
+        binsLeft = binTotal - len(bins)
+        # next bin once this one has its share, or when each bin left needs one of the records left
+        if bins[-1] and binsLeft and (loads[-1] >= share or len(lengths) - i <= binsLeft):
+            remaining -= loads[-1]
+            share = remaining / float(binsLeft)
+            bins.append([])
+            loads.append(0)
+        bins[-1].append(i)
+        loads[-1] += bp
+    return bins, loads
+
+
+def imbalance(loads):
+    """largest load over the mean load: 1.0 is perfectly balanced"""
+    loads = [load for load in loads if load is not None]
+    if not loads or not sum(loads):
+        return 1.0
+    return max(loads) / (float(sum(loads)) / len(loads))
+
+
+def _copyBytes(fhIn, offset, size, fhOut):
+    fhIn.seek(offset)
+    while size > 0:
+        data = fhIn.read(min(size, COPY_BUFFER_SIZE))
+        if not data:
+            break
+        fhOut.write(data)
+        size -= len(data)
+
+
+def writePartition(records, bins, outputDir, prefix):
+    """write the records - (FASTA file, offset, bytes) - of each bin to its own file
+    <outputDir>/<prefix>_<n>.fa, returns the files"""
+    files = []
+    handles = {}
+    try:
+        for n, indexes in enumerate(bins):
+            partFile = os.path.join(outputDir, '%s_%d.fa' % (prefix, n + 1))
+            with open(partFile, 'wb') as fhOut:
+                for i in indexes:
+                    fastaFile, offset, size = records[i]
+                    if fastaFile not in handles:
+                        handles[fastaFile] = open(fastaFile, 'rb')
+                    _copyBytes(handles[fastaFile], offset, size, fhOut)
+            files.append(partFile)
+    finally:
+        for fh in handles.values():
+            fh.close()
+    return files
+
+
+def _locateRecords(fastaFiles):
+    """{header: (file, offset, bytes)} of the records of fastaFiles, and [(file, offset, bytes)]
+    of repeated headers. Missing files are skipped."""
+    located = {}
+    extra = []
+    for f in fastaFiles:
+        if not os.path.exists(f):
+            continue
+        for header, offset, size, bp in indexFasta(f):
+            if header in located:
+                extra.append((f, offset, size))
+            else:
+                located[header] = (f, offset, size)
+    return located, extra
+
+
+def _recordLines(fh, offset, size):
+    fh.seek(offset)
+    while size > 0:
+        line = fh.readline()
+        if not line:
+            break
+        size -= len(line)
+        yield line
+
+
+def _gffRuns(gffFiles, order):
+    """(rank, file index, offset, bytes) of each run of lines with one seqid in gffFiles,
+    in rank order. Comment lines go with the run they are in, leading ones first."""
+    runs = []
+    last = len(order)
+    for fileIndex, f in enumerate(gffFiles):
+        if not os.path.exists(f):
+            continue
+        offset = runStart = 0
+        runRank = -1
+        with open(f, 'rb') as fh:
+            for line in fh:
+                if line[0] != '#':
+                    rank = order.get(line.split('\t', 1)[0], last)
+                    if rank != runRank:
+                        if offset > runStart:
+                            runs.append((runRank, fileIndex, runStart, offset - runStart))
+                        runStart, runRank = offset, rank
+                offset += len(line)
+        if offset > runStart:
+            runs.append((runRank, fileIndex, runStart, offset - runStart))
+    runs.sort()
+    return runs
+
+
+def gffLinesInOrder(gffFiles, order):
+    """lines of gffFiles, the lines of each seqid in the order of order ({seqid: rank}) -
+    for jobs holding records from all over the input. Lines of a seqid keep their order,
+    seqids not in order go last. Missing files are skipped."""
+    handles = {}
+    try:
+        for rank, fileIndex, offset, size in _gffRuns(gffFiles, order):
+            if fileIndex not in handles:
+                handles[fileIndex] = open(gffFiles[fileIndex], 'rb')
+            for line in _recordLines(handles[fileIndex], offset, size):
+                yield line
+    finally:
+        for fh in handles.values():
+            fh.close()
+
+
+def isMasked(base):
+    """masked base: lower case (-xsmall), X (-x) or N"""
+    return base.islower() or base in 'NX'
+
+
+def unionMask(seq1, seq2):
+    """the same bp from two slices, each base masked if it is masked in either"""
+    if seq1 == seq2:
+        return seq1
+    return ''.join(base2 if isMasked(base2) and not isMasked(base1) else base1
+                   for base1, base2 in zip(seq1, seq2))
+
+
+class SliceStitcher(object):
+    """writes FASTA lines fed to it to fhOut, joining consecutive slices of a sequence
+    (<name>_slice:<start>-<end>) into one record <name>. Sequence lines are rewrapped
+    to lineWidth. Slices may share up to overlap bp with the previous one: the shared bp
+    are written once, masked as in either slice (see unionMask).
+    lengths: {name: bp written}. gaps: [(name, expected start, slice start)]
+    of slices that do not follow on from the previous one."""
+
+    def __init__(self, fhOut, lineWidth=FASTA_LINE_WIDTH, overlap=0):
+        self.fhOut = fhOut
+        self.lineWidth = lineWidth
+        self.overlap = overlap
+        self.lengths = OrderedDict()
+        self.gaps = []
+        self.name = None # sequence being written
+        self.sliceEnd = None # end of its last slice, None if it is not sliced
+        self.bp = 0
+        self.pending = [] # sequence not written yet: less than a line, or the overlap held back
+        self.pendingBp = 0
+        self.overlapTail = None # previous slice's shared bp, until the next slice's are read
+        self.overlapNew = []
+        self.overlapNewBp = 0
+
+    def header(self, line):
+        name = sequenceName(line)
+        match = SLICE_NAME.match(name)
+        if match is None:
+            self.finish()
+            self.name, self.sliceEnd = name, None
+            self.fhOut.write(line if line.endswith('\n') else line + '\n')
+            return
+        name, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+        if name == self.name and self.sliceEnd is not None:
+            shared = self.sliceEnd - start + 1
+            if 0 < shared <= min(self.overlap, self.pendingBp):
+                self.startOverlap(shared)
+            elif start != self.sliceEnd + 1:
+                self.gaps.append((name, self.sliceEnd + 1, start))
+            self.sliceEnd = end
+            return
+        self.finish()
+        if start != 1:
+            self.gaps.append((name, 1, start))
+        self.name, self.sliceEnd = name, end
+        self.fhOut.write('>' + name + '\n')
+
+    def startOverlap(self, shared):
+        """take the last shared bp back from pending, to be merged with the next slice's"""
+        data = ''.join(self.pending)
+        self.overlapTail = data[-shared:]
+        self.pending = [data[:-shared]]
+        self.pendingBp -= shared
+        self.bp -= shared
+        self.overlapNew, self.overlapNewBp = [], 0
+
+    def endOverlap(self):
+        """the shared bp merged, followed by the rest of the next slice read so far"""
+        tail, new = self.overlapTail, ''.join(self.overlapNew)
+        self.overlapTail, self.overlapNew, self.overlapNewBp = None, [], 0
+        if len(new) < len(tail):
+            return unionMask(tail[:len(new)], new) + tail[len(new):]
+        return unionMask(tail, new[:len(tail)]) + new[len(tail):]
+
+    def sequence(self, line):
+        seq = line.strip()
+        if not seq:
+            return
+        if self.overlapTail is not None:
+            self.overlapNew.append(seq)
+            self.overlapNewBp += len(seq)
+            if self.overlapNewBp < len(self.overlapTail):
+                return
+            seq = self.endOverlap()
+        self.bp += len(seq)
+        if not self.pendingBp and len(seq) == self.lineWidth and not (self.overlap and self.sliceEnd):
+            self.fhOut.write(seq + '\n')
+            return
+        self.pending.append(seq)
+        self.pendingBp += len(seq)
+        if self.overlap and self.sliceEnd:
+            if self.pendingBp >= self.overlap + self.lineWidth * STITCH_FLUSH_LINES:
+                self.flush(False)
+        elif self.pendingBp >= self.lineWidth:
+            self.flush(False)
+
+    def flush(self, final):
+        """write the pending sequence in full lines, and the last partial line if final.
+        Keeps the last overlap bp of a sliced sequence, unless final."""
+        data = ''.join(self.pending)
+        width = self.lineWidth
+        if final:
+            cut = len(data)
+        else:
+            cut = len(data) - (self.overlap if self.sliceEnd else 0)
+            cut -= cut % width
+        self.fhOut.write(''.join(data[i:i + width] + '\n' for i in xrange(0, cut, width)))
+        self.pending = [data[cut:]] if cut < len(data) else []
+        self.pendingBp = len(data) - cut
+
+    def feed(self, lines):
+        for line in lines:
+            if line.startswith('>'):
+                self.header(line)
+            elif self.name is not None:
+                self.sequence(line)
+
+    def finish(self):
+        """end the record being written"""
+        if self.name is None:
+            return
+        if self.overlapTail is not None:
+            seq = self.endOverlap()
+            self.bp += len(seq)
+            self.pending.append(seq)
+        self.flush(True)
+        self.lengths[self.name] = self.lengths.get(self.name, 0) + self.bp
+        self.name, self.sliceEnd, self.bp = None, None, 0
+
+
+def mergeMasked(fastaFiles, outputFile, headers=None, lineWidth=FASTA_LINE_WIDTH, overlap=0):
+    """write the records of fastaFiles to outputFile in one pass, slices stitched back
+    into whole sequences - see SliceStitcher. Records are taken in file order or, with
+    headers, in the order of headers (records not in headers go last).
+    Missing files are skipped. Returns the stitched {name: bp} and the slice gaps."""
+    with open(outputFile, 'wb') as fhOut:
+        stitcher = SliceStitcher(fhOut, lineWidth, overlap)
+        if headers is None:
+            for f in fastaFiles:
+                if os.path.exists(f):
+                    with open(f, 'rb') as fh:
+                        stitcher.feed(fh)
+        else:
+            located, extra = _locateRecords(fastaFiles)
+            records = [located.pop(header) for header in headers if header in located]
+            records.extend(extra)
+            records.extend(sorted(located.values()))
+            handles = {}
+            try:
+                for f, offset, size in records:
+                    if f not in handles:
+                        handles[f] = open(f, 'rb')
+                    stitcher.feed(_recordLines(handles[f], offset, size))
+            finally:
+                for fh in handles.values():
+                    fh.close()
+        stitcher.finish()
+    return stitcher.lengths, stitcher.gaps
+
+
+def compareLengths(lengths, expectedLengths):
+    """names of expectedLengths not in lengths, and [(name, expected bp, bp)] of those
+    whose length differs (or that are not expected)"""
+    missing = [name for name in expectedLengths if name not in lengths]
+    mismatched = [(name, expectedLengths.get(name), bp) for name, bp in lengths.items()
+                  if expectedLengths.get(name) != bp]
+    return missing, mismatched
+
+
+def reconcileOverlapHits(hits):
+    """hits in the bp shared by overlapping slices: (seqid, start, end, key, slice start, data),
+    coordinates on the whole sequence. Overlapping hits with the same seqid and key (e.g. type,
+    strand and repeat) from different slices are one hit seen by both, whole or cut at a slice
+    end: each such cluster is merged into one hit spanning it, with the data of its longest hit.
+    Clusters from one slice only are kept as they are. Returns [(seqid, start, end, data)], sorted."""
+    groups = {}
+    for hit in hits:
+        groups.setdefault((hit[0], hit[3]), []).append(hit)
+    reconciled = []
+    for group in groups.values():
+        group.sort(key=lambda hit: (hit[1], hit[2]))
+        cluster = []
+        clusterEnd = None
+        for hit in group + [None]:
+            if hit is not None and cluster and hit[1] <= clusterEnd:
+                cluster.append(hit)
+                clusterEnd = max(clusterEnd, hit[2])
+                continue
+            if len(set(sliceStart for seqId, start, end, key, sliceStart, data in cluster)) > 1:
+                longest = max(cluster, key=lambda h: h[2] - h[1])
+                reconciled.append((longest[0], cluster[0][1], clusterEnd, longest[5]))
+            else:
+                reconciled.extend((seqId, start, end, data)
+                                  for seqId, start, end, key, sliceStart, data in cluster)
+            if hit is not None:
+                cluster, clusterEnd = [hit], hit[2]
+    reconciled.sort()
+    return reconciled
@@ -0,0 +1,184 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from ..RM_Partition import indexFasta, partitionByLength, partitionInOrder, imbalance, \
+    writePartition, writeOverlappingSlices, mergeMasked, compareLengths, fastaNameLengths, \
+    chooseChunkSize, gffLinesInOrder, reconcileOverlapHits, FASTA_LINE_WIDTH
+
+
+def randomSequence(rand, bp):
+    """bases with some soft-masked runs and N gaps"""
+    seq = []
+    total = 0
+    while total < bp:
+        run = ''.join(rand.choice('ACGT') for i in xrange(rand.randint(1, 300)))
+        kind = rand.random()
+        seq.append(run.lower() if kind < 0.2 else 'N' * len(run) if kind < 0.25 else run)
+        total += len(run)
+    return ''.join(seq)[:bp]
+
+
+def fastaText(sequences, lineWidth=FASTA_LINE_WIDTH):
+    return ''.join('>%s description\n' % name +
+                   ''.join(seq[i:i + lineWidth] + '\n' for i in xrange(0, len(seq), lineWidth))
+                   for name, seq in sequences)
+
+
+class PartitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        rand = random.Random(1)
+        self.sequences = [('chr%02d' % i, randomSequence(rand, rand.choice([30, 700, 5000, 23456])))
+                          for i in xrange(1, 13)]
+        self.inputFile = os.path.join(self.tempDir, 'genome.fa')
+        self.text = fastaText(self.sequences)
+        with open(self.inputFile, 'w') as fh:
+            fh.write(self.text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def read(self, filename):
+        with open(filename) as fh:
+            return fh.read()
+
+    def testPartitionByLength(self):
+        lengths = [300, 10, 250, 40, 40, 100, 5]
+        bins, loads = partitionByLength(lengths, 3)
+        self.assertEqual(sorted(i for indexes in bins for i in indexes), range(len(lengths)))
+        self.assertEqual(loads, [sum(lengths[i] for i in indexes) for indexes in bins])
+        # the longest record alone sets the largest load
+        self.assertEqual(max(loads), 300)
+        self.assertLess(imbalance(loads), 300 / (sum(lengths) / 3.0) + 1e-9)
+        self.assertEqual(len(partitionByLength(lengths, 20)[0]), len(lengths))
+
+    def testPartitionInOrder(self):
+        for lengths, binTotal in (([1000, 1, 1, 1, 1], 4), ([5, 5, 5, 5, 5, 5], 3),
+                                  ([1, 1, 1, 1000], 4), ([7], 5), (range(1, 50), 6)):
+            bins, loads = partitionInOrder(lengths, binTotal)
+            self.assertEqual(len(bins), min(binTotal, len(lengths)))
+            self.assertEqual([i for indexes in bins for i in indexes], range(len(lengths)))
+            self.assertTrue(all(bins))
+            self.assertEqual(loads, [sum(lengths[i] for i in indexes) for indexes in bins])
+        self.assertEqual(partitionInOrder([], 3), ([], []))
+
+    def testChooseChunkSize(self):
+        self.assertEqual(chooseChunkSize([], 300, 100, 3600, 20000, 100000, 10000), (0, 0, 0))
+        # everything fits in a job's share: no slicing
+        self.assertEqual(chooseChunkSize([1000] * 10, 300, 5, 3600, 20000, 100000, 10000)[0], 0)
+        chunk, jobs, jobBp = chooseChunkSize([300000000, 1000], 300, 100, 3600, 20000, 100000, 10000)
+        self.assertEqual(jobs, 100)
+        self.assertGreaterEqual(chunk, jobBp)
+        self.assertEqual(chunk % 10000, 0)
+
+    def testMergeReproducesInput(self):
+        index = indexFasta(self.inputFile)
+        self.assertEqual([bp for header, offset, size, bp in index], [len(seq) for name, seq in self.sequences])
+        bins, loads = partitionByLength([bp for header, offset, size, bp in index], 4)
+        records = [(self.inputFile, offset, size) for header, offset, size, bp in index]
+        files = writePartition(records, bins, self.tempDir, 'genome')
+        self.assertEqual(len(files), 4)
+        outputFile = os.path.join(self.tempDir, 'merged.fa')
+        # the jobs hold records from all over the input: headers give the input order back
+        lengths, gaps = mergeMasked(files, outputFile, [header for header, offset, size, bp in index])
+        self.assertEqual(self.read(outputFile), self.text)
+        self.assertEqual(gaps, [])
+        self.assertEqual(compareLengths(lengths, fastaNameLengths(self.inputFile)), ([], []))
+
+    def testMergeRewraps(self):
+        rewrapped = os.path.join(self.tempDir, 'wide.fa')
+        with open(rewrapped, 'w') as fh:
+            fh.write(fastaText(self.sequences, lineWidth=73))
+        outputFile = os.path.join(self.tempDir, 'merged.fa')
+        mergeMasked([rewrapped], outputFile)
+        self.assertEqual(self.read(outputFile), self.text)
+
+    def checkSlicesStitched(self, overlap):
+        slicedFile = os.path.join(self.tempDir, 'sliced.fa')
+        writeOverlappingSlices([self.inputFile], slicedFile, 1000, overlap)
+        index = indexFasta(slicedFile)
+        self.assertGreater(len(index), len(self.sequences))
+        bins, loads = partitionInOrder([bp for header, offset, size, bp in index], 5)
+        files = writePartition([(slicedFile, offset, size) for header, offset, size, bp in index],
+                               bins, self.tempDir, 'sliced')
+        outputFile = os.path.join(self.tempDir, 'merged.fa')
+        lengths, gaps = mergeMasked(files, outputFile, overlap=overlap)
+        self.assertEqual(gaps, [])
+        self.assertEqual(compareLengths(lengths, fastaNameLengths(self.inputFile)), ([], []))
+        self.assertEqual(self.read(outputFile).replace(' description', ''),
+                         self.text.replace(' description', ''))
+
+    def testSlices(self):
+        self.checkSlicesStitched(0)
+
+    def testOverlappingSlices(self):
+        self.checkSlicesStitched(150)
+
+    def testOverlapMaskUnion(self):
+        # each slice masks part of the shared bp 101-120: the merged sequence has both parts masked
+        seq = 'ACGT' * 50
+        slices = [('s_slice:1-120', seq[:100] + seq[100:110].lower() + seq[110:120]),
+                  ('s_slice:101-200', seq[100:105] + seq[105:130].lower() + seq[130:200])]
+        slicedFile = os.path.join(self.tempDir, 'sliced.fa')
+        with open(slicedFile, 'w') as fh:
+            fh.write(fastaText(slices))
+        outputFile = os.path.join(self.tempDir, 'merged.fa')
+        lengths, gaps = mergeMasked([slicedFile], outputFile, overlap=20)
+        self.assertEqual(lengths, {'s': 200})
+        merged = ''.join(self.read(outputFile).splitlines()[1:])
+        self.assertEqual(merged, seq[:100] + seq[100:130].lower() + seq[130:])
+
+    def testMissingOutputSkipped(self):
+        index = indexFasta(self.inputFile)
+        files = writePartition([(self.inputFile, offset, size) for header, offset, size, bp in index],
+                               [[0, 1], [2]], self.tempDir, 'part')
+        outputFile = os.path.join(self.tempDir, 'merged.fa')
+        lengths, gaps = mergeMasked(files + [os.path.join(self.tempDir, 'missing.fa')], outputFile)
+        missing, mismatched = compareLengths(lengths, fastaNameLengths(self.inputFile))
+        self.assertEqual(missing, [name for name, seq in self.sequences[3:]])
+        self.assertEqual(mismatched, [])
+
+
+class GffMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def writeGff(self, name, seqids):
+        filename = os.path.join(self.tempDir, name)
+        with open(filename, 'w') as fh:
+            fh.write('##gff-version 3\n')
+            for seqid, start in seqids:
+                fh.write('\t'.join([seqid, 'RepeatMasker', 'similarity', str(start), str(start + 9),
+                                    '1', '+', '.', 'Target=Copia']) + '\n')
+        return filename
+
+    def testLinesInOrder(self):
+        files = [self.writeGff('1.gff', [('chr03', 1), ('chr03', 50), ('chr01', 5)]),
+                 self.writeGff('2.gff', [('chr02', 7), ('scaffold', 3)]),
+                 os.path.join(self.tempDir, 'missing.gff')]
+        order = {'chr01': 0, 'chr02': 1, 'chr03': 2}
+        lines = [line.split('\t')[:4] for line in gffLinesInOrder(files, order) if not line.startswith('#')]
+        self.assertEqual([(seqid, start) for seqid, source, type, start in lines],
+                         [('chr01', '5'), ('chr02', '7'), ('chr03', '1'), ('chr03', '50'), ('scaffold', '3')])
+
+    def testReconcileOverlapHits(self):
+        hits = [('chr01', 990, 1010, 'Copia', 1, 'first'),     # cut at the end of slice 1
+                ('chr01', 985, 1020, 'Copia', 1001, 'second'),  # seen whole by slice 2
+                ('chr01', 995, 1000, 'Gypsy', 1, 'other'),      # another repeat
+                ('chr01', 1012, 1015, 'Copia', 1001, 'inside'), # also in the cluster
+                ('chr01', 1100, 1110, 'Copia', 1, 'alone1'),    # two hits of one slice only
+                ('chr01', 1105, 1120, 'Copia', 1, 'alone2')]
+        self.assertEqual(reconcileOverlapHits(hits),
+                         [('chr01', 985, 1020, 'second'), ('chr01', 995, 1000, 'other'),
+                          ('chr01', 1100, 1110, 'alone1'), ('chr01', 1105, 1120, 'alone2')])
+
+
+if __name__ == '__main__':
+    unittest.main()